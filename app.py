@@ -3,8 +3,6 @@
 # =========================================================
 import streamlit as st
 import pandas as pd
-import numpy as np
-import yfinance as yf
 import altair as alt
 import sys
 import os
@@ -25,7 +23,7 @@ st.set_page_config(page_title="阿勳簡易版股票分析", layout="wide", page
 
 sys.path.append(os.getcwd())
 try:
-    from stock_risk_tool import config, utils, indicators, signals, backtest, report
+    from stock_risk_tool import config, backtest, report, store, instrument, cache, pipeline, parallel
     importlib.reload(config)
 except ImportError:
     st.error("❌ 找不到模組")
@@ -58,117 +56,123 @@ st.caption("🚀 策略升級：區分「高檔獲利了結(紫點)」與「防
 st.sidebar.header("設定")
 tickers_text = st.sidebar.text_area("股票代號", value=config.STOCK_LIST_TEXT.strip(), height=200)
 start_date = st.sidebar.date_input("分析起始日", pd.to_datetime(config.P["START"]), disabled=True)
+profile_on = st.sidebar.checkbox("⏱️ 效能分析模式", value=False)
 run_btn = st.sidebar.button("🚀 開始分析", type="primary")
 
+@st.cache_resource
+def get_result_cache():
+    # 跨 session 共用,依 TTL 與總容量淘汰
+    return cache.ResultCache(
+        ttl=config.CACHE_TTL_SECONDS,
+        max_bytes=config.CACHE_MAX_MB * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_staged_pipeline():
+    # 各階段結果依參數子集快取,修改 config 後只重算受影響的下游階段
+    return pipeline.StagedPipeline()
+
+def build_outputs(t, df, manual_type):
+    """由訊號表產生繪圖標記,回傳 (摘要列, 繪圖資料)"""
+    # --- 繪圖資料準備 ---
+    # 此流程不跑回測,標記由 add_trade_markers 重跑與 backtest_fsm 相同的狀態機產生 (含出場冷卻期)
+    with instrument.stage("markers", t):
+        df = backtest.add_trade_markers(df, config.P, honor_cooldown=True)
+
+    last_day = df.iloc[-1]
+    score = last_day["Tech_Score"]
+    score_details = explain_score_oldwang(last_day)
+
+    if score >= 60: advice, color = "🔥 多頭", "red"
+    elif score <= 30: advice, color = "❄️ 空頭", "green"
+    else: advice, color = "⚠️ 震盪", "orange"
+
+    display_name = get_smart_name(t)
+    stop_col = "MA20"
+    if manual_type == "MOMENTUM": stop_col = "MA10"
+    elif manual_type == "FINANCE": stop_col = "MA60"
+
+    row = {
+        "股票": t, "顯示名稱": display_name, "類別": manual_type,
+        "技術評分": int(score), "評分細節": score_details,
+        "建議": advice, "color": color,
+        "最新收盤": f"{last_day['Close']:.1f}",
+        "生命線": stop_col
+    }
+
+    df_plot = df.tail(150).reset_index()
+    if 'Date' not in df_plot.columns: df_plot.rename(columns={'index': 'Date'}, inplace=True)
+    if 'Date' not in df_plot.columns: df_plot['Date'] = df_plot.iloc[:, 0]
+    return row, df_plot
+
 if run_btn:
     input_list = tickers_text.split()
     monitor_list = [f"{x}.TW" if not x.endswith(".TW") else x for x in input_list if x.strip()]
     st.info(f"正在分析 {len(monitor_list)} 檔股票...")
+    # 紀錄器只屬於本次執行 (其他 session 的紀錄不受影響)
+    instrument.disable()
+    recorder = instrument.enable() if profile_on else None
 
-    try:
-        raw = yf.download(monitor_list, start=str(start_date), group_by='ticker', auto_adjust=True, progress=False)
-        if isinstance(raw.columns, pd.MultiIndex):
-            price_fields = {"Open","High","Low","Close","Volume"}
-            if len(set(raw.columns.get_level_values(0)) & price_fields) >= 4:
-                raw = raw.swaplevel(axis=1).sort_index(axis=1)
-    except Exception as e:
-        st.error(f"下載失敗: {e}")
-        st.stop()
-
-    results = []
-    stock_dfs = {}
+    # 快取鍵: 股票 + 日期區間 + 參數雜湊 (參數或股票分類變動時自動失效)
+    result_cache = get_result_cache()
+    start_str, end_str = str(start_date), config.P["END"]
     params = config.P
+    p_key = cache.params_hash(params, config.TICKERS_CONFIG)
+    cache_keys = {t: ("ticker", t, start_str, end_str, p_key) for t in monitor_list}
+    outputs = {t: result_cache.get(cache_keys[t]) for t in monitor_list}
+    todo = [t for t in monitor_list if outputs[t] is None]
 
-    bar = st.progress(0)
+    price_data = {}
+    if todo:
+        try:
+            # 本地倉儲只補抓缺少的日期,其餘直接讀檔
+            with instrument.stage("load_prices"):
+                price_store = store.PriceStore(config.DATA_DIR)
+                price_data = price_store.load_many(todo, start_str, end_str)
+        except Exception as e:
+            st.error(f"下載失敗: {e}")
+            st.stop()
+        for t, reason in price_store.failed.items():
+            st.warning(f"{t} 下載失敗 (下次執行會重新下載): {reason}")
 
-    for i, t in enumerate(monitor_list):
-        bar.progress((i+1)/len(monitor_list))
+    bar = st.progress(0)
+    n_cached = len(monitor_list) - len(todo)
+    bar.progress(n_cached / len(monitor_list) if monitor_list else 0)
+
+    # 逐檔流程交給工作池,完成一檔就更新進度;結果依輸入順序回傳
+    jobs = [t for t in todo if t in price_data]
+    job_types = {t: config.TICKERS_CONFIG.get(t, "DEFAULT") for t in jobs}
+    # 分階段快取只在同一行程內有效,行程池模式不使用;
+    # 資料鍵以內容雜湊,倉儲補上最新一天時會自動重算
+    stages = get_staged_pipeline() if config.PIPELINE_EXECUTOR != "process" else None
+    job_outputs = parallel.map_ordered(
+        pipeline.analyze_ticker,
+        [(price_data[t], params, job_types[t], t, stages) for t in jobs],
+        executor=config.PIPELINE_EXECUTOR,
+        max_workers=config.PIPELINE_WORKERS,
+        on_done=lambda done, total: bar.progress((n_cached + done) / len(monitor_list)),
+    )
+
+    for t, (df, err) in zip(jobs, job_outputs):
         try:
-            if t not in raw.columns:
-                 if isinstance(raw.columns, pd.MultiIndex) and t in raw.columns.get_level_values(1):
-                     df0 = raw.xs(t, level=1, axis=1)
-                 else: continue
-            else:
-                 df0 = raw[t].copy() if isinstance(raw, pd.DataFrame) else raw[t]
-
-            manual_type = config.TICKERS_CONFIG.get(t, "DEFAULT")
-
-            df = utils.ensure_ohlcv(df0)
-            df = utils.ensure_schema(df)
-            df = indicators.add_indicators(df, params)
-            df = signals.generate_signals(df, params, mode="OldWang", stock_type=manual_type)
-
-            # --- 繪圖資料準備 ---
-            pos = 0
-            buy_markers = []
-            sell_profit_markers = [] # 獲利了結點
-            sell_stop_markers = []   # 停損點
-            protect_markers = []
-
-            buys = df["Buy_Signal"].values
-            sells = df["Sell_Signal"].values
-            reasons = df["Sell_Reason_Raw"].values
-            protects = df["In_Protection"].values
-            closes = df["Close"].values
-
-            for k in range(len(df)):
-                c_buy = np.nan
-                c_sell_profit = np.nan
-                c_sell_stop = np.nan
-                c_protect = np.nan
-
-                if pos == 0:
-                    if buys[k]:
-                        pos = 1
-                        c_buy = closes[k]
-                elif pos == 1:
-                    if sells[k]:
-                        pos = 0
-                        # 區分賣出類型
-                        if reasons[k] == "TAKE_PROFIT":
-                            c_sell_profit = closes[k]
-                        else:
-                            c_sell_stop = closes[k]
-                    elif protects[k]:
-                        c_protect = closes[k]
-
-                buy_markers.append(c_buy)
-                sell_profit_markers.append(c_sell_profit)
-                sell_stop_markers.append(c_sell_stop)
-                protect_markers.append(c_protect)
-
-            df["Buy_Marker"] = buy_markers
-            df["Sell_Profit_Marker"] = sell_profit_markers
-            df["Sell_Stop_Marker"] = sell_stop_markers
-            df["Protect_Marker"] = protect_markers
-
-            last_day = df.iloc[-1]
-            score = last_day["Tech_Score"]
-            score_details = explain_score_oldwang(last_day)
-
-            if score >= 60: advice, color = "🔥 多頭", "red"
-            elif score <= 30: advice, color = "❄️ 空頭", "green"
-            else: advice, color = "⚠️ 震盪", "orange"
-
-            display_name = get_smart_name(t)
-            stop_col = "MA20"
-            if manual_type == "MOMENTUM": stop_col = "MA10"
-            elif manual_type == "FINANCE": stop_col = "MA60"
-
-            results.append({
-                "股票": t, "顯示名稱": display_name, "類別": manual_type,
-                "技術評分": int(score), "評分細節": score_details,
-                "建議": advice, "color": color,
-                "最新收盤": f"{last_day['Close']:.1f}",
-                "生命線": stop_col
-            })
-            stock_dfs[t] = df.tail(150)
+            if err is not None: raise err
+            outputs[t] = build_outputs(t, df, job_types[t])
+            result_cache.put(cache_keys[t], outputs[t])
 
         except Exception as e:
             st.warning(f"{t} 錯誤: {e}")
 
     bar.empty()
 
+    # 結果存在 session 中,切換分頁 / 展開詳解等重新執行時不必重算
+    st.session_state["analysis"] = [outputs[t] for t in monitor_list if outputs[t] is not None]
+    st.session_state["profile"] = recorder
+
+analysis = st.session_state.get("analysis")
+if analysis is not None:
+    results = [row for row, _ in analysis]
+    plot_frames = {row["股票"]: df_plot for row, df_plot in analysis}
+
     if results:
         st.subheader("🔔 分析結果摘要")
         cols = st.columns(4)
@@ -196,11 +200,9 @@ if run_btn:
             r = results[idx]
             t = r["股票"]
             stop_col = r["生命線"]
-            df_plot = stock_dfs[t].copy().reset_index()
-            if 'Date' not in df_plot.columns: df_plot.rename(columns={'index': 'Date'}, inplace=True)
-            if 'Date' not in df_plot.columns: df_plot['Date'] = df_plot.iloc[:, 0]
+            df_plot = plot_frames[t]
 
-            with tab:
+            with tab, instrument.stage("render", t):
                 base = alt.Chart(df_plot).encode(x='Date:T')
 
                 line = base.mark_line(color='#AAAAAA', strokeWidth=2).encode(
@@ -242,3 +244,7 @@ if run_btn:
 
     else:
         st.warning("無數據")
+
+    # 圖表畫完才停止紀錄,render 階段也會被計入
+    instrument.disable()
+    instrument.render_streamlit(st.session_state.get("profile"), st)
@@ -0,0 +1,8 @@
+# 效能基準測試
+#
+# - synthetic.py: 台股合成 OHLCV 產生器 (不需連網)
+# - run.py: 各階段計時,結果存成 JSON 供不同 commit 比較
+#
+# 用法:
+#   python -m benchmarks.run
+#   python -m benchmarks.run --bars 250 1000 --tickers 1 10 --compare old.json
@@ -0,0 +1,207 @@
+# =========================================================
+# 效能基準測試 - 各階段計時
+#
+# 兩組掃描:
+# 1. K 棒數 (單檔): 250 -> 50,000
+# 2. 股票檔數 (固定 750 根): 1 -> 2,000
+# 結果存成 JSON,可用 --compare 與舊結果比較
+# =========================================================
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from stock_risk_tool import config, indicators, signals, backtest, report
+from benchmarks.synthetic import generate_universe
+
+DEFAULT_BARS = [250, 1000, 5000, 50000]
+DEFAULT_TICKERS = [1, 10, 100, 2000]
+DEFAULT_TICKER_BARS = 750
+STAGES = [
+    "add_indicators",
+    "generate_signals",
+    "detect_sell_before_rise",
+    "backtest_fsm",
+    "build_suitability_report",
+]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_case(n_bars, n_tickers, p, repeat=3, seed=0):
+    """
+    單一組合 (K 棒數 × 檔數) 的各階段耗時
+
+    每個階段跑 repeat 次取最小值 (排除雜訊),
+    時間為所有股票加總。
+
+    Returns:
+        dict: {階段名稱: 秒數}
+    """
+    data, types = generate_universe(n_tickers, n_bars, seed=seed)
+    timings = {}
+
+    def best_of(fn):
+        best = np.inf
+        out = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        return best, out
+
+    timings["add_indicators"], ind = best_of(
+        lambda: {t: indicators.add_indicators(df, p) for t, df in data.items()}
+    )
+    timings["generate_signals"], sig = best_of(
+        lambda: {t: signals.generate_signals(ind[t], p, "OldWang", types[t]) for t in data}
+    )
+    timings["detect_sell_before_rise"], _ = best_of(
+        lambda: [signals.detect_sell_before_rise(df) for df in sig.values()]
+    )
+    timings["backtest_fsm"], bt = best_of(
+        lambda: {t: backtest.backtest_fsm(sig[t], p, types[t]) for t in data}
+    )
+
+    rows = [{
+        "股票": t,
+        "技術評分": sig[t]["Tech_Score"].iloc[-1],
+        "交易筆數": r["trades"],
+        "勝率": r["winrate"],
+        "profit_factor": r["profit_factor"],
+        "策略報酬": r["total_return"],
+    } for t, r in bt.items()]
+    timings["build_suitability_report"], _ = best_of(
+        lambda: report.build_suitability_report(rows)
+    )
+    return timings
+
+
+def run_benchmarks(bars=None, tickers=None, ticker_bars=DEFAULT_TICKER_BARS,
+                   repeat=3, p=None, full_grid=False, log=print):
+    """
+    執行所有基準測試組合
+
+    Args:
+        bars: K 棒數列表 (單檔掃描)
+        tickers: 股票檔數列表 (固定 ticker_bars 根)
+        ticker_bars: 檔數掃描時每檔的 K 棒數
+        repeat: 每階段重複次數
+        p: 參數字典 (預設 config.P)
+        full_grid: True 時跑 bars × tickers 全部組合
+        log: 進度輸出函數
+
+    Returns:
+        dict: 含環境資訊與每個組合結果的報告
+    """
+    p = p or config.P
+    bars = bars or DEFAULT_BARS
+    tickers = tickers or DEFAULT_TICKERS
+
+    if full_grid:
+        cases = [(b, t) for b in bars for t in tickers]
+    else:
+        cases = [(b, 1) for b in bars] + [(ticker_bars, t) for t in tickers if t != 1]
+
+    results = []
+    for n_bars, n_tickers in cases:
+        t0 = time.perf_counter()
+        timings = run_case(n_bars, n_tickers, p, repeat=repeat)
+        results.append({"bars": n_bars, "tickers": n_tickers, "seconds": timings})
+        log(f"bars={n_bars:>6} tickers={n_tickers:>5}  "
+            + "  ".join(f"{k}={v:.4f}s" for k, v in timings.items())
+            + f"  (總計 {time.perf_counter() - t0:.1f}s)")
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "backtest_engine": p.get("BACKTEST_ENGINE", "python"),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(old, new):
+    """
+    比較兩份報告 (新 / 舊 耗時比例,< 1 代表變快)
+
+    Args:
+        old: 舊報告 dict
+        new: 新報告 dict
+
+    Returns:
+        DataFrame: 每個 (bars, tickers, stage) 一列
+    """
+    def flatten(rep):
+        return {
+            (r["bars"], r["tickers"], stage): sec
+            for r in rep["results"] for stage, sec in r["seconds"].items()
+        }
+
+    a, b = flatten(old), flatten(new)
+    rows = [
+        {"bars": k[0], "tickers": k[1], "stage": k[2],
+         "old": a[k], "new": b[k], "ratio": b[k] / a[k] if a[k] else np.nan}
+        for k in sorted(set(a) & set(b))
+    ]
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="stock_risk_tool 效能基準測試")
+    parser.add_argument("--bars", type=int, nargs="+", default=DEFAULT_BARS)
+    parser.add_argument("--tickers", type=int, nargs="+", default=DEFAULT_TICKERS)
+    parser.add_argument("--ticker-bars", type=int, default=DEFAULT_TICKER_BARS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engine", choices=["python", "numpy", "numba"], default=None)
+    parser.add_argument("--full-grid", action="store_true")
+    parser.add_argument("--output", default=None, help="輸出 JSON 路徑")
+    parser.add_argument("--compare", default=None, help="與舊的 JSON 報告比較")
+    args = parser.parse_args(argv)
+
+    p = dict(config.P)
+    if args.engine:
+        p["BACKTEST_ENGINE"] = args.engine
+
+    rep = run_benchmarks(args.bars, args.tickers, args.ticker_bars,
+                         args.repeat, p, args.full_grid)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench_{rep['commit']}_{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=2)
+    print(f"結果已存至 {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        print(compare(old, rep).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# =========================================================
+# 台股合成 OHLCV 產生器
+# 特色:
+# 1. 多空 / 盤整趨勢區段輪替
+# 2. ±10% 漲跌停限制,並刻意產生漲停 / 跌停日
+# 3. 跳空缺口與爆量日
+# 4. 固定亂數種子,結果可重現
+# =========================================================
+import numpy as np
+import pandas as pd
+
+PRICE_LIMIT = 0.10
+STOCK_TYPES = ("DEFAULT", "WEIGHT", "FINANCE", "MOMENTUM")
+
+# 趨勢區段: (日報酬均值, 日波動度)
+REGIMES = {
+    "bull": (0.0025, 0.018),
+    "bear": (-0.0025, 0.022),
+    "range": (0.0, 0.012),
+    "crash": (-0.012, 0.035),
+    "rally": (0.010, 0.030),
+}
+REGIME_PROBS = {"bull": 0.32, "bear": 0.25, "range": 0.3, "crash": 0.05, "rally": 0.08}
+
+
+def _tick_round(prices):
+    """依台股升降單位四捨五入"""
+    tick = np.select(
+        [prices < 10, prices < 50, prices < 100, prices < 500, prices < 1000],
+        [0.01, 0.05, 0.1, 0.5, 1.0],
+        default=5.0,
+    )
+    return np.round(prices / tick) * tick
+
+
+def generate_ohlcv(n_bars=750, seed=0, start="2015-01-05", start_price=None):
+    """
+    產生單檔合成 OHLCV
+
+    Args:
+        n_bars: K 棒數
+        seed: 亂數種子
+        start: 起始日期
+        start_price: 起始價格 (預設隨機 20~600)
+
+    Returns:
+        DataFrame: ensure_ohlcv 格式 (Open/High/Low/Close/Volume)
+    """
+    rng = np.random.default_rng(seed)
+    names = list(REGIMES)
+    probs = np.array([REGIME_PROBS[k] for k in names])
+
+    # --- 趨勢區段 ---
+    mu = np.empty(n_bars)
+    sigma = np.empty(n_bars)
+    i = 0
+    while i < n_bars:
+        name = names[rng.choice(len(names), p=probs)]
+        length = int(rng.integers(15, 120))
+        mu[i:i + length], sigma[i:i + length] = REGIMES[name]
+        i += length
+
+    rets = rng.normal(mu, sigma)
+
+    # --- 漲停 / 跌停日 ---
+    limit_days = rng.random(n_bars) < 0.015
+    rets[limit_days] = np.where(rng.random(limit_days.sum()) < 0.6, PRICE_LIMIT, -PRICE_LIMIT)
+    rets = np.clip(rets, -PRICE_LIMIT, PRICE_LIMIT)
+
+    price0 = start_price or float(rng.uniform(20, 600))
+    close = price0 * np.cumprod(1 + rets)
+    close = np.maximum(_tick_round(close), 0.01)
+    prev_close = np.concatenate([[price0], close[:-1]])
+
+    # --- 開盤價 (含跳空) ---
+    gap = rng.normal(0, 0.004, n_bars)
+    gap_days = rng.random(n_bars) < 0.04
+    gap[gap_days] = np.sign(rets[gap_days]) * rng.uniform(0.01, 0.05, gap_days.sum())
+    open_ = prev_close * (1 + np.clip(gap, -PRICE_LIMIT, PRICE_LIMIT))
+
+    # --- 高低價 (不超過漲跌停) ---
+    upper = prev_close * (1 + PRICE_LIMIT)
+    lower = prev_close * (1 - PRICE_LIMIT)
+    wick_up = np.abs(rng.normal(0, 0.008, n_bars))
+    wick_dn = np.abs(rng.normal(0, 0.008, n_bars))
+    high = np.minimum(np.maximum(open_, close) * (1 + wick_up), upper)
+    low = np.maximum(np.minimum(open_, close) * (1 - wick_dn), lower)
+    open_ = _tick_round(np.clip(open_, lower, upper))
+    high = _tick_round(np.maximum(high, np.maximum(open_, close)))
+    low = _tick_round(np.minimum(low, np.minimum(open_, close)))
+
+    # 跳空日讓缺口真的成立 (低點高於前一日高點)
+    high_prev = np.concatenate([[high[0]], high[:-1]])
+    gap_up = gap_days & (gap > 0)
+    low[gap_up] = np.maximum(low[gap_up], np.minimum(high_prev[gap_up] * 1.001, close[gap_up]))
+
+    # --- 成交量 (隨波動放大,偶爾爆量) ---
+    base_vol = rng.uniform(2e3, 5e4) * 1000
+    volume = base_vol * rng.lognormal(0, 0.35, n_bars) * (1 + 8 * np.abs(rets))
+    spikes = rng.random(n_bars) < 0.03
+    volume[spikes] *= rng.uniform(2.5, 6.0, spikes.sum())
+    volume = np.round(volume, -3)
+
+    index = pd.bdate_range(start, periods=n_bars)
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+def generate_universe(n_tickers=10, n_bars=750, seed=0, start="2015-01-05"):
+    """
+    產生多檔合成股票
+
+    Args:
+        n_tickers: 股票檔數
+        n_bars: 每檔 K 棒數
+        seed: 亂數種子 (每檔以 seed + 序號產生)
+        start: 起始日期
+
+    Returns:
+        tuple: ({ticker: DataFrame}, {ticker: 股票類型})
+    """
+    data = {}
+    types = {}
+    for j in range(n_tickers):
+        ticker = f"{9000 + j}.TW"
+        data[ticker] = generate_ohlcv(n_bars, seed=seed * 100003 + j, start=start)
+        types[ticker] = STOCK_TYPES[j % len(STOCK_TYPES)]
+    return data, types
+
+
+def signal_coverage(df):
+    """
+    統計訊號表中各分支的觸發次數 (確認合成資料涵蓋所有邏輯)
+
+    Args:
+        df: generate_signals 的輸出
+
+    Returns:
+        dict: {分支名稱: 次數}
+    """
+    out = {}
+    for reason in ("FOUR_SEAS", "THREE_SUNS", "TREND"):
+        out[f"Buy_Reason={reason}"] = int((df["Buy_Reason"] == reason).sum())
+    for reason in ("HARD_STOP", "BIG_VOL_BREAK", "TAKE_PROFIT", "FAKE_BREAK", "MA_BREAK"):
+        out[f"Sell_Reason_Raw={reason}"] = int((df["Sell_Reason_Raw"] == reason).sum())
+    for col in ("Buy_Signal", "Sell_Signal", "In_Protection", "Near_StopLine_Warn",
+                "Sell_Premature", "Is_Big_Vol", "Is_Big_Red", "Gap_Up", "SanYang", "SiHai"):
+        out[col] = int(df[col].sum())
+    return out
@@ -3,10 +3,29 @@
 # 模組說明:
 # - config.py: 參數配置
 # - indicators.py: 技術指標計算
+# - streaming.py: 串流指標 (逐根 K 棒 O(1) 更新)
+# - rolling.py: 滾動極值 (向前 / 向後視窗,陣列版) 與滾動運算快取
 # - signals.py: 買賣訊號產生
+# - premature.py: 賣在起漲前分析 (多觀察期一次計算)
+# - events.py: 事件研究 (各訊號之後的未來報酬分布,依原因 / 股票類型)
 # - backtest.py: 回測引擎
+# - portfolio.py: 投組回測 (共用資金、持股上限、等權重 / ATR / 評分配置)
+# - risk.py: 風險指標 (Sharpe / Sortino / Calmar / 追蹤誤差,含滾動版,支援多檔 2D)
+# - portfolio_risk.py: 投組風險 (滾動共變異數增量更新、VaR / CVaR)
+# - fsm.py: 陣列版回測狀態機 (NumPy / numba)
+# - ledger.py: 逐筆交易明細 (結構化陣列) 與向量化交易統計
 # - report.py: 報告產生
+# - bootstrap.py: 回測績效的 bootstrap 信賴區間 (逐筆交易 / 每日區塊抽樣)
+# - pipeline.py: 單檔完整流程 (預先配置、免複製模式)
+# - parallel.py: 逐檔平行執行 (保留輸入順序)
+# - sweep.py: 參數掃描 (多行程)
+# - walkforward.py: Walk-forward 最佳化 (樣本內調參、樣本外驗證)
 # - utils.py: 工具函數
+# - instrument.py: 效能紀錄 (各階段耗時 / 記憶體)
+# - compact.py: 精簡型別 (float32 / int8 / 原因代碼)
+# - store.py: 本地價格倉儲 (增量下載)
+# - screener.py: 全市場選股 (只計算尾端資料)
+# - cache.py: 結果快取 (LRU + TTL)
 
 __version__ = "3.1.0"
 __author__ = "老王實戰版重構團隊"
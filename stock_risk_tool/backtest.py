@@ -1,8 +1,20 @@
+import json
+import os
+
 import numpy as np
 import pandas as pd
-from .utils import ensure_schema
+from .utils import ensure_schema, set_column
+from .fsm import run_fsm
+from .ledger import build_ledger
+from .risk import (
+    align_benchmark, metrics_from_moments, return_moments, risk_metrics,
+    simple_returns, update_moments,
+)
+
+# backtest_fsm 會影響結果的參數 (BACKTEST_ENGINE 三種引擎結果相同,不列入)
+PARAM_KEYS = ("FEE_BUY", "FEE_SELL", "EXIT_COOLDOWN_DAYS")
 
-def backtest_fsm(df, p, stock_type="DEFAULT"):
+def backtest_fsm(df, p, stock_type="DEFAULT", engine=None, inplace=False, benchmark=None):
     """
     回測引擎 - 有限狀態機版本
     
@@ -10,12 +22,20 @@ def backtest_fsm(df, p, stock_type="DEFAULT"):
         df: 包含指標和訊號的 DataFrame
         p: 參數字典
         stock_type: 股票類型 (WEIGHT/FINANCE/MOMENTUM)
+        engine: 回測引擎 "python" / "numpy" / "numba"
+                (預設讀取 p["BACKTEST_ENGINE"],三者結果完全相同)
+        inplace: 直接寫入 df 而不複製 (搭配 pipeline.allocate_frame)
+        benchmark: 基準收盤價 Series (如 risk.load_benchmark 的輸出),
+                   用於追蹤誤差 / 資訊比率;None 時以個股買進持有為基準
     
     Returns:
         dict: 回測結果統計
     """
-    df = df.copy().dropna(subset=["Close"])
-    df = ensure_schema(df)
+    if not inplace:
+        df = df.copy().dropna(subset=["Close"])
+    elif df["Close"].isna().any():
+        df = df.dropna(subset=["Close"])
+    df = ensure_schema(df, inplace=inplace)
 
     if len(df) < 100:
         return {
@@ -32,6 +52,7 @@ def backtest_fsm(df, p, stock_type="DEFAULT"):
     fee_buy = p["FEE_BUY"]
     fee_sell = p["FEE_SELL"]
     exit_cooldown = p.get("EXIT_COOLDOWN_DAYS", 5)  # 增加到 5 天
+    engine = engine or p.get("BACKTEST_ENGINE", "python")
     
     # 提取陣列加速運算
     closes = df["Close"].values
@@ -43,7 +64,108 @@ def backtest_fsm(df, p, stock_type="DEFAULT"):
     sell_reasons_raw = df["Sell_Reason_Raw"].values
     buy_reasons_raw = df["Buy_Reason"].values
 
-    n = len(df)
+    if engine != "python":
+        equity, pos_hist, entry_idx, exit_idx, net_ret = run_fsm(
+            closes, buys, sells_all, fee_buy, fee_sell, exit_cooldown, engine=engine
+        )
+        trades = net_ret.tolist()
+        record_buy_reasons = buy_reasons_raw[entry_idx].tolist()
+        record_sell_reasons = sell_reasons_raw[exit_idx].tolist()
+    else:
+        equity, pos_hist, trades, record_buy_reasons, record_sell_reasons = _fsm_loop(
+            closes, buys, sells_all, buy_reasons_raw, sell_reasons_raw,
+            fee_buy, fee_sell, exit_cooldown
+        )
+        entry_idx, exit_idx = _fsm_transitions(pos_hist)
+
+    # 寫回 DataFrame
+    set_column(df, "Equity", equity, inplace)
+    set_column(df, "Position", pos_hist, inplace)
+
+    bench = align_benchmark(benchmark, df.index) if benchmark is not None else None
+
+    result = {"df": df}
+    result.update(_summarize(
+        equity, pos_hist, closes, trades, record_buy_reasons, record_sell_reasons, bench
+    ))
+    # 每筆已平倉交易的結構化明細 (見 ledger.TRADE_DTYPE)
+    result["ledger"] = build_ledger(df, entry_idx, exit_idx, trades)
+    return result
+
+
+def _summarize(equity, pos_hist, closes, trades, buy_reasons, sell_reasons, benchmark=None):
+    """
+    由權益曲線與交易紀錄計算績效統計
+
+    backtest_fsm 與 backtest_panel 共用,確保兩者數值一致。
+    benchmark 為與 closes 對齊的基準價格;沒有或全為 NaN 時以個股買進持有為基準。
+    """
+    # ========== 績效統計 ==========
+    total_ret = equity[-1] - 1.0
+    dd = (equity / np.maximum.accumulate(equity) - 1).min()
+
+    # Buy & Hold 報酬
+    bh_return = (closes[-1] / closes[0]) - 1
+
+    # 在市場時間比例
+    in_market = (pos_hist == 1).mean()
+
+    # 風險指標 (Sharpe / Sortino / Calmar / 追蹤誤差 / 資訊比率)
+    if benchmark is None or np.isnan(benchmark).all():
+        benchmark = closes
+    risk = risk_metrics(equity, benchmark)
+
+    return _stats_dict(total_ret, dd, bh_return, in_market, trades, buy_reasons, sell_reasons, risk)
+
+
+def _stats_dict(total_ret, dd, bh_return, in_market, trades, buy_reasons, sell_reasons,
+                risk=None):
+    # 獲利因子
+    gross_profit = sum([t for t in trades if t > 0])
+    gross_loss = abs(sum([t for t in trades if t < 0]))
+    pf = gross_profit / gross_loss if gross_loss > 0 else 0
+
+    # 勝率
+    winrate = np.mean([t > 0 for t in trades]) if trades else 0
+
+    return {
+        "total_return": total_ret,
+        "dd": dd,
+        "trades": len(trades),
+        "winrate": winrate,
+        "bh_return": bh_return,
+        "trades_list": trades,
+        "profit_factor": pf,
+        "in_market": in_market,
+        "buy_reasons": buy_reasons,
+        "sell_reasons": sell_reasons,
+        **_risk_fields(risk),
+    }
+
+
+def _risk_fields(risk):
+    """風險指標轉為結果欄位 (無法計算的比率記為 0,與 profit_factor 相同)"""
+    risk = risk or {}
+
+    def value(key):
+        v = risk.get(key, 0)
+        return 0 if v is None or np.isnan(v) else v
+
+    return {
+        "te": value("te"),                  # 年化追蹤誤差
+        "sharpe": value("sharpe"),          # 年化 Sharpe ratio (rf = 0)
+        "sortino": value("sortino"),
+        "calmar": value("calmar"),
+        "info_ratio": value("info_ratio"),  # 資訊比率
+        "volatility": value("volatility"),
+        "dd_duration": value("dd_duration"),  # 最長回撤期間 (K 棒)
+    }
+
+
+def _fsm_loop(closes, buys, sells_all, buy_reasons_raw, sell_reasons_raw,
+              fee_buy, fee_sell, exit_cooldown):
+    """逐日迴圈版狀態機 (參考實作)"""
+    n = len(closes)
     
     # 初始化追蹤陣列
     equity = np.ones(n, dtype=float)
@@ -102,40 +224,443 @@ def backtest_fsm(df, p, stock_type="DEFAULT"):
 
         pos_hist[i] = pos
 
-    # 寫回 DataFrame
-    df["Equity"] = equity
-    df["Position"] = pos_hist
+    return equity, pos_hist, trades, record_buy_reasons, record_sell_reasons
 
-    # ========== 績效統計 ==========
-    total_ret = equity[-1] - 1.0
-    dd = (df["Equity"] / df["Equity"].cummax() - 1).min()
 
-    # 獲利因子
-    gross_profit = sum([t for t in trades if t > 0])
-    gross_loss = abs(sum([t for t in trades if t < 0]))
-    pf = gross_profit / gross_loss if gross_loss > 0 else 0
+def to_panel(frames, columns=("Close", "Buy_Signal", "Sell_Signal")):
+    """
+    將多檔股票的訊號 DataFrame 對齊成 (日期 × 股票) 陣列
 
-    # 勝率
-    winrate = np.mean([t > 0 for t in trades]) if trades else 0
+    Args:
+        frames: {ticker: DataFrame} (generate_signals 的輸出)
+        columns: 要取出的欄位
 
-    # Buy & Hold 報酬
-    bh_return = (closes[-1] / closes[0]) - 1
+    Returns:
+        tuple: (index, tickers, {欄位: 2D ndarray})
+            缺值的價格為 NaN,缺值的布林訊號為 False
+    """
+    tickers = list(frames)
+    index = pd.DatetimeIndex([])
+    for df in frames.values():
+        index = index.union(df.index)
 
-    # 在市場時間比例
-    in_market = (pos_hist == 1).mean()
+    panel = {}
+    for col in columns:
+        wide = pd.concat(
+            [frames[t][col].reindex(index) for t in tickers], axis=1, keys=tickers
+        )
+        if col in ("Buy_Signal", "Sell_Signal"):
+            wide = wide.fillna(False).astype(bool)
+        panel[col] = wide.to_numpy()
+    return index, tickers, panel
+
+
+def backtest_panel(close, buy, sell, p, buy_reason=None, sell_reason=None, tickers=None,
+                   benchmark=None):
+    """
+    多檔股票批次回測 - 同一個狀態機在 (日期 × 股票) 陣列上一次跑完
+
+    每根 K 棒以向量運算同時更新所有股票的狀態,語意與 backtest_fsm
+    完全相同;價格為 NaN 的列視為該股票當天無資料 (等同 backtest_fsm
+    的 dropna),冷卻期以該股票自己的 K 棒數計算。
+
+    Args:
+        close: 收盤價 2D 陣列 (T × N)
+        buy: 買進訊號 2D 布林陣列
+        sell: 賣出訊號 2D 布林陣列
+        p: 參數字典
+        buy_reason: 買進原因 2D 陣列 (選用)
+        sell_reason: 賣出原因 2D 陣列 (選用)
+        tickers: 股票代號列表 (選用,預設為欄位序號)
+        benchmark: 基準收盤價 1D 陣列 (長度 T,與列對齊;選用,預設為各檔買進持有)
+
+    Returns:
+        dict: {
+            "tickers": 股票代號,
+            "equity": 權益曲線 (T × N,無資料處為 NaN),
+            "position": 持倉狀態 (T × N),
+            "trades": 每檔一個 dict (entry_idx / exit_idx / net_ret 陣列,索引為列位置),
+            "stats": 每檔一個與 backtest_fsm 相同鍵值的績效 dict (不含 df),
+        }
+    """
+    close = np.asarray(close, dtype=float)
+    buy = np.asarray(buy, dtype=bool)
+    sell = np.asarray(sell, dtype=bool)
+    T, N = close.shape
+    tickers = list(tickers) if tickers is not None else list(range(N))
+
+    fee_buy = p["FEE_BUY"]
+    fee_sell = p["FEE_SELL"]
+    exit_cooldown = p.get("EXIT_COOLDOWN_DAYS", 5)
+
+    valid = ~np.isnan(close)
+    benchmark = np.asarray(benchmark, dtype=float) if benchmark is not None else None
+
+    # 狀態向量 (每檔股票一格)
+    local_idx = np.zeros(N, dtype=np.int64)     # 該股票目前是第幾根 K 棒
+    prev_close = np.full(N, np.nan)
+    pos = np.zeros(N, dtype=bool)
+    entry_price = np.ones(N)
+    entry_row = np.full(N, -1, dtype=np.int64)
+    last_exit_idx = np.full(N, -999, dtype=np.int64)
+    eq = np.ones(N)
+
+    equity = np.full((T, N), np.nan)
+    position = np.zeros((T, N), dtype=int)
+
+    # 交易紀錄 (依時間順序累積,最後再依股票拆分)
+    rec_ticker, rec_entry, rec_exit, rec_ret = [], [], [], []
+    buy_log_ticker, buy_log_row = [], []
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for t in range(T):
+            c = close[t]
+            v = valid[t]
+            active = v & (local_idx >= 1)   # 每檔的第一根 K 棒不交易
+
+            # ========== 持倉中 ==========
+            held = active & pos
+            eq = np.where(held, eq * (c / prev_close), eq)
+
+            sell_now = held & sell[t]
+            if sell_now.any():
+                eq = np.where(sell_now, eq * (1 - fee_sell), eq)
+                cols = np.flatnonzero(sell_now)
+                raw_ret = (c[cols] / entry_price[cols]) - 1
+                net_ret = (1 + raw_ret) * (1 - fee_buy) * (1 - fee_sell) - 1
+                rec_ticker.append(cols)
+                rec_entry.append(entry_row[cols])
+                rec_exit.append(np.full(len(cols), t))
+                rec_ret.append(net_ret)
+                pos[cols] = False
+                entry_row[cols] = -1
+                last_exit_idx[cols] = local_idx[cols]
+
+            # ========== 空手中 ==========
+            flat = active & ~held
+            buy_now = flat & buy[t] & ((local_idx - last_exit_idx) >= exit_cooldown)
+            if buy_now.any():
+                cols = np.flatnonzero(buy_now)
+                pos[cols] = True
+                entry_price[cols] = c[cols] * (1 + fee_buy)
+                entry_row[cols] = t
+                eq = np.where(buy_now, eq * (1 - fee_buy), eq)
+                buy_log_ticker.append(cols)
+                buy_log_row.append(np.full(len(cols), t))
+
+            equity[t] = np.where(v, eq, np.nan)
+            position[t] = np.where(v, pos, 0)
+            prev_close = np.where(v, c, prev_close)
+            local_idx += v
+
+    def _concat(parts, dtype):
+        return np.concatenate(parts).astype(dtype) if parts else np.array([], dtype=dtype)
+
+    rec_ticker = _concat(rec_ticker, np.int64)
+    rec_entry = _concat(rec_entry, np.int64)
+    rec_exit = _concat(rec_exit, np.int64)
+    rec_ret = _concat(rec_ret, float)
+    buy_log_ticker = _concat(buy_log_ticker, np.int64)
+    buy_log_row = _concat(buy_log_row, np.int64)
+
+    # 依股票拆分 (stable 排序保留時間順序)
+    order = np.argsort(rec_ticker, kind="stable")
+    bounds = np.searchsorted(rec_ticker[order], np.arange(N + 1))
+    buy_order = np.argsort(buy_log_ticker, kind="stable")
+    buy_bounds = np.searchsorted(buy_log_ticker[buy_order], np.arange(N + 1))
+
+    trades = []
+    stats = []
+    for j in range(N):
+        sel = order[bounds[j]:bounds[j + 1]]
+        entries = buy_log_row[buy_order[buy_bounds[j]:buy_bounds[j + 1]]]
+        exits = rec_exit[sel]
+        trades.append({
+            "entry_idx": rec_entry[sel],
+            "exit_idx": exits,
+            "net_ret": rec_ret[sel],
+        })
+
+        rows = valid[:, j]
+        if rows.sum() < 100:
+            stats.append({
+                "trades": 0,
+                "total_return": 0.0,
+                "winrate": 0,
+                "profit_factor": 0,
+                "buy_reasons": [],
+                "sell_reasons": []
+            })
+            continue
+
+        buy_reasons = buy_reason[entries, j].tolist() if buy_reason is not None else []
+        sell_reasons = sell_reason[exits, j].tolist() if sell_reason is not None else []
+        stats.append(_summarize(
+            equity[rows, j], position[rows, j], close[rows, j],
+            rec_ret[sel].tolist(), buy_reasons, sell_reasons,
+            benchmark[rows] if benchmark is not None else None,
+        ))
 
     return {
-        "df": df,
-        "total_return": total_ret,
-        "dd": dd,
-        "trades": len(trades),
-        "winrate": winrate,
-        "bh_return": bh_return,
-        "trades_list": trades,
-        "profit_factor": pf,
-        "in_market": in_market,
-        "buy_reasons": record_buy_reasons,
-        "sell_reasons": record_sell_reasons,
-        "te": 0,      # Tracking Error (簡化)
-        "sharpe": 0   # Sharpe Ratio (簡化)
+        "tickers": tickers,
+        "equity": equity,
+        "position": position,
+        "trades": trades,
+        "stats": stats,
     }
+
+
+# =========================================================
+# 可續跑回測 (checkpoint)
+# =========================================================
+STATE_VERSION = 2
+
+
+def _state_params(p):
+    return {
+        "FEE_BUY": p["FEE_BUY"],
+        "FEE_SELL": p["FEE_SELL"],
+        "EXIT_COOLDOWN_DAYS": p.get("EXIT_COOLDOWN_DAYS", 5),
+    }
+
+
+def _state_from_arrays(df, p, equity, pos_hist, entry_idx, exit_idx, trades,
+                       buy_reasons, sell_reasons):
+    """由完整回測的陣列建立狀態快照"""
+    closes = df["Close"].values
+    pos = int(pos_hist[-1])
+    last_entry = int(entry_idx[-1]) if pos == 1 else -1
+    return {
+        "version": STATE_VERSION,
+        "params": _state_params(p),
+        "n_bars": len(df),
+        "last_date": df.index[-1].isoformat(),
+        "pos": pos,
+        "entry_price": float(closes[last_entry] * (1 + p["FEE_BUY"])) if pos == 1 else None,
+        "entry_idx": last_entry,
+        "last_exit_idx": int(exit_idx[-1]) if len(exit_idx) else -999,
+        "equity": float(equity[-1]),
+        "peak": float(np.max(equity)),
+        "max_dd": float((equity / np.maximum.accumulate(equity) - 1).min()),
+        "first_close": float(closes[0]),
+        "last_close": float(closes[-1]),
+        "bars_in_market": int((pos_hist == 1).sum()),
+        # 風險指標的累計和 (基準為個股買進持有) 與目前 / 最長的回撤期間
+        "moments": return_moments(simple_returns(equity), simple_returns(closes)),
+        "underwater": _trailing_run(equity < np.maximum.accumulate(equity)),
+        "dd_duration": int(risk_metrics(equity)["dd_duration"]),
+        "trades": [float(t) for t in trades],
+        "buy_reasons": [str(r) for r in buy_reasons],
+        "sell_reasons": [str(r) for r in sell_reasons],
+    }
+
+
+def _trailing_run(flags):
+    """序列尾端連續 True 的長度"""
+    false_idx = np.flatnonzero(~flags)
+    return int(len(flags) - 1 - false_idx[-1]) if len(false_idx) else int(len(flags))
+
+
+def _resume_steps(state, closes, buys, sells, buy_reasons_raw, sell_reasons_raw):
+    """從狀態快照往後逐根推進 (只跑新 K 棒)"""
+    fee_buy = state["params"]["FEE_BUY"]
+    fee_sell = state["params"]["FEE_SELL"]
+    exit_cooldown = state["params"]["EXIT_COOLDOWN_DAYS"]
+
+    n_new = len(closes)
+    equity = np.empty(n_new, dtype=float)
+    pos_hist = np.zeros(n_new, dtype=int)
+
+    eq = state["equity"]
+    pos = state["pos"]
+    entry_price = state["entry_price"]
+    prev_close = state["last_close"]
+
+    for k in range(n_new):
+        i = state["n_bars"] + k
+        prev_eq = eq
+        in_cooldown = (i - state["last_exit_idx"]) < exit_cooldown
+
+        if pos == 1:
+            eq *= (closes[k] / prev_close)
+            if sells[k]:
+                eq *= (1 - fee_sell)
+                raw_ret = (closes[k] / entry_price) - 1
+                net_ret = (1 + raw_ret) * (1 - fee_buy) * (1 - fee_sell) - 1
+                state["trades"].append(float(net_ret))
+                state["sell_reasons"].append(str(sell_reasons_raw[k]))
+                pos = 0
+                entry_price = None
+                state["entry_idx"] = -1
+                state["last_exit_idx"] = i
+        elif buys[k] and not in_cooldown:
+            pos = 1
+            entry_price = closes[k] * (1 + fee_buy)
+            state["entry_idx"] = i
+            eq *= (1 - fee_buy)
+            state["buy_reasons"].append(str(buy_reasons_raw[k]))
+
+        equity[k] = eq
+        pos_hist[k] = pos
+        state["peak"] = max(state["peak"], eq)
+        state["max_dd"] = min(state["max_dd"], eq / state["peak"] - 1)
+        update_moments(state["moments"], eq / prev_eq - 1, closes[k] / prev_close - 1)
+        state["underwater"] = state["underwater"] + 1 if eq < state["peak"] else 0
+        state["dd_duration"] = max(state["dd_duration"], state["underwater"])
+        state["bars_in_market"] += int(pos == 1)
+        prev_close = closes[k]
+
+    state["equity"] = float(eq)
+    state["pos"] = pos
+    state["entry_price"] = float(entry_price) if entry_price is not None else None
+    state["last_close"] = float(prev_close)
+    state["n_bars"] += n_new
+    return equity, pos_hist
+
+
+def backtest_incremental(df, p, state=None, stock_type="DEFAULT"):
+    """
+    可續跑回測 - 從上次的狀態快照只推進新增的 K 棒
+
+    第一次呼叫 (state=None) 會跑完整段歷史並建立快照;之後傳入
+    同一檔股票較新的資料,只會處理 state["last_date"] 之後的 K 棒。
+    結果與對完整資料呼叫 backtest_fsm 相同 (風險指標以個股買進持有為基準,
+    由累計和推算,與完整回測的差異在浮點誤差內)。
+    快照應在收盤後保存,已處理過的 K 棒之後不可再變動。
+
+    Args:
+        df: 包含指標和訊號的 DataFrame
+        p: 參數字典
+        state: 上次回傳的狀態快照 (dict),None 表示從頭開始
+        stock_type: 股票類型
+
+    Returns:
+        dict: 績效統計 (鍵值同 backtest_fsm),
+              "df" 只包含本次新增的 K 棒,"state" 為新的快照
+
+    Raises:
+        ValueError: 快照的手續費 / 冷卻期參數與 p 不一致時
+    """
+    if state is None:
+        res = backtest_fsm(df, p, stock_type=stock_type)
+        if len(res["df"]) < 100:
+            res["state"] = None
+            return res
+
+        full = res["df"]
+        entry_idx, exit_idx = _fsm_transitions(full["Position"].values)
+        res["state"] = _state_from_arrays(
+            full, p, full["Equity"].values, full["Position"].values,
+            entry_idx, exit_idx, res["trades_list"],
+            res["buy_reasons"], res["sell_reasons"],
+        )
+        return res
+
+    if state.get("version") != STATE_VERSION:
+        raise ValueError("回測狀態版本不符,請重新建立")
+    if state["params"] != _state_params(p):
+        raise ValueError("回測狀態的手續費或冷卻期參數與目前設定不一致")
+
+    state = json.loads(json.dumps(state))  # 不修改呼叫端的快照
+    df = df.dropna(subset=["Close"])
+    df = ensure_schema(df[df.index > pd.Timestamp(state["last_date"])])
+
+    if len(df):
+        equity, pos_hist = _resume_steps(
+            state,
+            df["Close"].values, df["Buy_Signal"].values, df["Sell_Signal"].values,
+            df["Buy_Reason"].values, df["Sell_Reason_Raw"].values,
+        )
+        df["Equity"] = equity
+        df["Position"] = pos_hist
+        state["last_date"] = df.index[-1].isoformat()
+
+    result = {"df": df, "state": state}
+    result.update(_stats_dict(
+        state["equity"] - 1.0,
+        state["max_dd"],
+        state["last_close"] / state["first_close"] - 1,
+        state["bars_in_market"] / state["n_bars"],
+        state["trades"], state["buy_reasons"], state["sell_reasons"],
+        metrics_from_moments(
+            state["moments"], state["equity"] - 1.0, state["n_bars"],
+            state["max_dd"], state["dd_duration"],
+        ),
+    ))
+    return result
+
+
+def _fsm_transitions(pos_hist):
+    """由持倉序列找出進場 / 出場索引"""
+    change = np.diff(pos_hist, prepend=0)
+    entry_idx = np.flatnonzero(change == 1)
+    exit_idx = np.flatnonzero(change == -1)
+    return entry_idx, exit_idx
+
+
+# =========================================================
+# 圖表標記 (由持倉序列推導)
+# =========================================================
+MARKER_COLS = ["Buy_Marker", "Sell_Profit_Marker", "Sell_Stop_Marker", "Protect_Marker"]
+
+
+def add_trade_markers(df, p=None, position=None, honor_cooldown=True, inplace=False):
+    """
+    由單一持倉序列產生圖表標記欄位
+
+    - Buy_Marker: 進場日收盤價
+    - Sell_Profit_Marker: 出場原因為 TAKE_PROFIT 的出場日收盤價
+    - Sell_Stop_Marker: 其他原因的出場日收盤價
+    - Protect_Marker: 持倉中、當日未出場且處於 RSI 保護的收盤價
+    其餘位置為 NaN。
+
+    Args:
+        df: 含 Close / Buy_Signal / Sell_Signal / Sell_Reason_Raw / In_Protection 的 DataFrame
+        p: 參數字典 (未提供 position 時用於讀取 EXIT_COOLDOWN_DAYS)
+        position: 既有的持倉序列 (如 backtest_fsm 的 Position 欄位),
+                  提供時直接使用,不重跑狀態機
+        honor_cooldown: 是否套用出場冷卻期 (與 backtest_fsm 一致)
+        inplace: 直接寫入 df 而不複製
+
+    Returns:
+        DataFrame: 加上 MARKER_COLS 的資料
+    """
+    if not inplace:
+        df = df.copy()
+    closes = df["Close"].to_numpy(dtype=float)
+
+    if position is None:
+        cooldown = (p or {}).get("EXIT_COOLDOWN_DAYS", 5) if honor_cooldown else 0
+        _, position, _, _, _ = run_fsm(
+            closes, df["Buy_Signal"].to_numpy(), df["Sell_Signal"].to_numpy(),
+            0.0, 0.0, cooldown
+        )
+    pos = np.asarray(position, dtype=int)
+    prev = np.concatenate(([0], pos[:-1]))
+
+    entry = (prev == 0) & (pos == 1)
+    exit_ = (prev == 1) & (pos == 0)
+    profit = df["Sell_Reason_Raw"].to_numpy() == "TAKE_PROFIT"
+    protect = (prev == 1) & (pos == 1) & df["In_Protection"].to_numpy(dtype=bool)
+
+    set_column(df, "Buy_Marker", np.where(entry, closes, np.nan), inplace)
+    set_column(df, "Sell_Profit_Marker", np.where(exit_ & profit, closes, np.nan), inplace)
+    set_column(df, "Sell_Stop_Marker", np.where(exit_ & ~profit, closes, np.nan), inplace)
+    set_column(df, "Protect_Marker", np.where(protect, closes, np.nan), inplace)
+    return df
+
+
+def save_state(state, path):
+    """將回測狀態快照存成 JSON"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_state(path):
+    """讀取回測狀態快照,檔案不存在時回傳 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
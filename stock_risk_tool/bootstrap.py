@@ -0,0 +1,200 @@
+# =========================================================
+# Bootstrap 信賴區間 - 回測績效的抽樣誤差
+#
+# 三年回測常常只有十幾筆交易,勝率與獲利因子的點估計很不穩定。
+# 1. trade_bootstrap: 逐筆交易報酬放回抽樣 (S × n 索引矩陣一次產生)
+# 2. block_bootstrap: 每日報酬以循環區塊抽樣,保留短期自相關
+# 3. bootstrap_results: 多檔股票平行計算,輸出每檔的上下界
+# =========================================================
+import numpy as np
+import pandas as pd
+
+from . import config, parallel
+
+METRICS = ("total_return", "dd", "winrate", "profit_factor")
+
+# 每批最多展開的元素數 (S × n),超過時分批抽樣以限制記憶體
+_CHUNK_ELEMENTS = 1 << 23
+
+
+def _interval(samples, confidence):
+    """百分位數信賴區間 (NaN 樣本不列入)"""
+    alpha = (1 - confidence) / 2
+    samples = samples[~np.isnan(samples)]
+    if len(samples) == 0:
+        return np.nan, np.nan
+    lo, hi = np.quantile(samples, [alpha, 1 - alpha])
+    return float(lo), float(hi)
+
+
+def _path_metrics(r):
+    """
+    每列為一條報酬路徑,計算總報酬與最大回撤
+
+    Args:
+        r: shape (S, n) 的報酬矩陣
+
+    Returns:
+        tuple: (total_return, dd),各為長度 S
+    """
+    equity = np.cumprod(1 + r, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)   # 起始權益 1 也算前高
+    dd = np.minimum((equity / peak - 1).min(axis=1), 0.0)
+    return equity[:, -1] - 1, dd
+
+
+def _chunks(n_samples, width):
+    step = max(1, _CHUNK_ELEMENTS // max(width, 1))
+    for start in range(0, n_samples, step):
+        yield min(step, n_samples - start)
+
+
+def trade_bootstrap(trades, n_samples=None, confidence=None, seed=None):
+    """
+    逐筆交易報酬的 bootstrap 信賴區間
+
+    每次抽樣以放回方式抽出與原本相同筆數的交易,依抽出順序串成權益曲線。
+    獲利因子的定義同 backtest (沒有虧損時為 0)。
+
+    Args:
+        trades: 每筆交易的淨報酬 (backtest_fsm 的 trades_list)
+        n_samples: 抽樣次數 (預設 config.BOOTSTRAP_SAMPLES)
+        confidence: 信賴水準 (預設 config.BOOTSTRAP_CONFIDENCE)
+        seed: 亂數種子或 np.random.Generator
+
+    Returns:
+        dict: {指標: (下界, 上界)},指標為 METRICS;交易少於 2 筆時為 NaN
+    """
+    n_samples = n_samples or config.BOOTSTRAP_SAMPLES
+    confidence = confidence or config.BOOTSTRAP_CONFIDENCE
+    r = np.asarray(trades, dtype=float)
+    n = len(r)
+    if n < 2:
+        return {m: (np.nan, np.nan) for m in METRICS}
+
+    rng = np.random.default_rng(seed)
+    parts = {m: [] for m in METRICS}
+    for size in _chunks(n_samples, n):
+        sample = r[rng.integers(0, n, size=(size, n))]
+        total, dd = _path_metrics(sample)
+        gain = np.where(sample > 0, sample, 0.0).sum(axis=1)
+        loss = -np.where(sample < 0, sample, 0.0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pf = np.where(loss > 0, gain / loss, 0.0)
+        parts["total_return"].append(total)
+        parts["dd"].append(dd)
+        parts["winrate"].append((sample > 0).mean(axis=1))
+        parts["profit_factor"].append(pf)
+    return {m: _interval(np.concatenate(v), confidence) for m, v in parts.items()}
+
+
+def block_bootstrap(returns, block=20, n_samples=None, confidence=None, seed=None,
+                    periods=252):
+    """
+    每日報酬的循環區塊 bootstrap 信賴區間
+
+    隨機選取起點、連續取 block 天 (超過尾端時接回開頭),
+    串接到原長度,保留波動聚集等短期相依性。
+
+    Args:
+        returns: 每日報酬 (如權益曲線的 pct_change,NaN 會先移除)
+        block: 區塊長度 (天)
+        n_samples: 抽樣次數 (預設 config.BOOTSTRAP_SAMPLES)
+        confidence: 信賴水準 (預設 config.BOOTSTRAP_CONFIDENCE)
+        seed: 亂數種子或 np.random.Generator
+        periods: 每年期數 (Sharpe 年化用)
+
+    Returns:
+        dict: {"total_return" / "dd" / "sharpe": (下界, 上界)}
+    """
+    n_samples = n_samples or config.BOOTSTRAP_SAMPLES
+    confidence = confidence or config.BOOTSTRAP_CONFIDENCE
+    r = np.asarray(returns, dtype=float)
+    r = r[~np.isnan(r)]
+    n = len(r)
+    keys = ("total_return", "dd", "sharpe")
+    if n < 2:
+        return {k: (np.nan, np.nan) for k in keys}
+
+    block = max(1, min(int(block), n))
+    n_blocks = -(-n // block)
+    offsets = np.arange(block)
+    rng = np.random.default_rng(seed)
+    parts = {k: [] for k in keys}
+    for size in _chunks(n_samples, n_blocks * block):
+        starts = rng.integers(0, n, size=(size, n_blocks))
+        idx = ((starts[:, :, None] + offsets) % n).reshape(size, -1)[:, :n]
+        sample = r[idx]
+        total, dd = _path_metrics(sample)
+        std = sample.std(axis=1, ddof=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sharpe = np.where(std > 0, sample.mean(axis=1) / std * np.sqrt(periods), np.nan)
+        parts["total_return"].append(total)
+        parts["dd"].append(dd)
+        parts["sharpe"].append(sharpe)
+    return {k: _interval(np.concatenate(v), confidence) for k, v in parts.items()}
+
+
+# =========================================================
+# 多檔股票
+# =========================================================
+def _bootstrap_one(result, n_samples, confidence, block, seed):
+    """單檔: 交易 bootstrap,另有權益曲線時加上區塊 bootstrap"""
+    rng = np.random.default_rng(seed)
+    row = {"trades": len(result.get("trades_list", []))}
+    ci = trade_bootstrap(result.get("trades_list", []), n_samples, confidence, rng)
+    for m, (lo, hi) in ci.items():
+        row[f"{m}_lo"], row[f"{m}_hi"] = lo, hi
+
+    df = result.get("df")
+    if block and df is not None and "Equity" in df.columns and len(df) > 1:
+        daily = df["Equity"].pct_change().to_numpy()
+        ci = block_bootstrap(daily, block, n_samples, confidence, rng)
+        for m, (lo, hi) in ci.items():
+            row[f"daily_{m}_lo"], row[f"daily_{m}_hi"] = lo, hi
+    return row
+
+
+def _equity_frame(result):
+    df = result.get("df")
+    return df[["Equity"]] if df is not None and "Equity" in df.columns else None
+
+
+def bootstrap_results(results, n_samples=None, confidence=None, block=None, seed=0,
+                      executor=None, max_workers=None):
+    """
+    多檔股票回測結果的信賴區間 (各檔平行計算)
+
+    每檔使用由 seed 衍生的獨立亂數流,結果與執行順序、平行方式無關。
+
+    Args:
+        results: {ticker: backtest_fsm 結果}
+        n_samples: 抽樣次數 (預設 config.BOOTSTRAP_SAMPLES)
+        confidence: 信賴水準 (預設 config.BOOTSTRAP_CONFIDENCE)
+        block: 每日報酬區塊長度 (None / 0 = 不做區塊 bootstrap)
+        seed: 亂數種子
+        executor: "serial" / "thread" / "process" (預設 config.PIPELINE_EXECUTOR)
+        max_workers: 工作數 (預設 config.PIPELINE_WORKERS)
+
+    Returns:
+        DataFrame: index 為股票代號,欄位為 trades 與各指標的 _lo / _hi
+                   (區塊 bootstrap 的欄位前綴 daily_);計算失敗的股票不列入
+    """
+    n_samples = n_samples or config.BOOTSTRAP_SAMPLES
+    confidence = confidence or config.BOOTSTRAP_CONFIDENCE
+    tickers = list(results)
+    seeds = np.random.SeedSequence(seed).spawn(len(tickers))
+    # 行程模式只傳需要的欄位,避免序列化整張訊號表
+    args = [
+        ({"trades_list": results[t].get("trades_list", []),
+          "df": _equity_frame(results[t]) if block else None},
+         n_samples, confidence, block, s)
+        for t, s in zip(tickers, seeds)
+    ]
+    outputs = parallel.map_ordered(
+        _bootstrap_one, args,
+        executor=executor or config.PIPELINE_EXECUTOR,
+        max_workers=max_workers or config.PIPELINE_WORKERS,
+    )
+    rows = {t: row for t, (row, err) in zip(tickers, outputs) if err is None}
+    return pd.DataFrame.from_dict(rows, orient="index")
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def params_hash(*objs):
+    """
+    參數的穩定雜湊值 (dict 鍵值順序不影響結果)
+
+    Args:
+        *objs: 可 JSON 化的物件 (如 config.P、TICKERS_CONFIG)
+
+    Returns:
+        str: 16 碼十六進位字串
+    """
+    text = json.dumps(objs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def frame_hash(df):
+    """
+    DataFrame 內容的雜湊值 (索引與數值相同即相同)
+
+    Returns:
+        str: 16 碼十六進位字串
+    """
+    values = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    h = hashlib.sha1(values.tobytes())
+    h.update("|".join(map(str, df.columns)).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def sizeof(obj):
+    """估計物件占用的記憶體 (bytes)"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(sizeof(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+class ResultCache:
+    """
+    記憶體結果快取 - LRU + TTL,以總位元組數限制大小
+
+    執行緒安全,可放在 st.cache_resource 中跨 session 共用。
+
+    Args:
+        ttl: 存活秒數 (None = 不過期)
+        max_bytes: 總容量上限 (None = 不限制),超過時淘汰最久未使用的項目
+    """
+
+    def __init__(self, ttl=None, max_bytes=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key -> (value, size, expire_at)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key, default=None):
+        """讀取快取 (過期視為不存在)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, size, expire_at = item
+            if expire_at is not None and time.monotonic() > expire_at:
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size=None):
+        """
+        寫入快取
+
+        Args:
+            key: 可雜湊的鍵值
+            value: 任意物件
+            size: 大小 (bytes),預設以 sizeof 估計
+        """
+        size = sizeof(value) if size is None else size
+        expire_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, size, expire_at)
+            self._bytes += size
+            self._evict()
+
+    def get_or_compute(self, key, fn):
+        """有快取就回傳,否則呼叫 fn() 計算並存入"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, predicate=None):
+        """
+        移除快取項目
+
+        Args:
+            predicate: 判斷 key 是否移除的函數 (None = 全部清除)
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate is None or predicate(k)]:
+                self._pop(key)
+
+    def stats(self):
+        """快取統計"""
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _pop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [k for k, (_, _, exp) in self._data.items() if exp is not None and now > exp]
+        for k in expired:
+            self._pop(k)
+        if self.max_bytes is None:
+            return
+        while self._bytes > self.max_bytes and self._data:
+            self._pop(next(iter(self._data)))
+
+
+_MISSING = object()
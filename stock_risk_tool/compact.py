@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# =========================================================
+# 原因代碼對照表 (代碼 = 在 tuple 中的位置)
+# =========================================================
+# 買進原因 (signals.generate_signals -> Buy_Reason)
+BUY_REASONS = ("NONE", "TREND", "THREE_SUNS", "FOUR_SEAS")
+
+# 賣出原因 (signals.generate_signals -> Sell_Reason_Raw, 依優先級)
+SELL_REASONS = ("NONE", "HARD_STOP", "BIG_VOL_BREAK", "TAKE_PROFIT", "FAKE_BREAK", "MA_BREAK")
+
+REASON_CATEGORIES = {
+    "Buy_Reason": BUY_REASONS,
+    "Sell_Reason_Raw": SELL_REASONS,
+}
+
+# 保持原精度的欄位 (價格與成交量,回測與顯示需要完整精度)
+KEEP_FLOAT64 = ("Open", "High", "Low", "Close", "Volume")
+
+# 小整數欄位
+INT8_COLS = ("Tech_Score", "Position")
+
+
+def encode_reasons(values, kind="Sell_Reason_Raw"):
+    """
+    原因字串轉為 int8 代碼
+
+    Args:
+        values: 原因字串陣列
+        kind: "Buy_Reason" 或 "Sell_Reason_Raw"
+
+    Returns:
+        ndarray: int8 代碼 (未知原因為 -1)
+    """
+    cat = pd.Categorical(np.asarray(values, dtype=object), categories=REASON_CATEGORIES[kind])
+    return cat.codes.astype(np.int8)
+
+
+def decode_reasons(codes, kind="Sell_Reason_Raw"):
+    """
+    int8 代碼轉回原因字串
+
+    Args:
+        codes: encode_reasons 的輸出
+        kind: "Buy_Reason" 或 "Sell_Reason_Raw"
+
+    Returns:
+        ndarray: 原因字串 (object)
+    """
+    labels = np.asarray(REASON_CATEGORIES[kind] + ("NONE",), dtype=object)
+    # -1 (未知) 對應到最後一格的 "NONE"
+    return labels[np.asarray(codes, dtype=np.int64)]
+
+
+def compact_frame(df):
+    """
+    將指標 / 訊號表轉為精簡型別
+
+    - 指標 (價格與成交量除外) float64 -> float32
+    - Tech_Score / Position -> int8
+    - Buy_Reason / Sell_Reason_Raw -> Categorical (固定類別,與字串比較結果不變)
+
+    Args:
+        df: generate_signals / backtest_fsm 的輸出
+
+    Returns:
+        DataFrame: 精簡型別的新表
+    """
+    cols = {}
+    for col in df.columns:
+        s = df[col]
+        if col in REASON_CATEGORIES:
+            cols[col] = pd.Categorical(s.astype(object), categories=REASON_CATEGORIES[col])
+        elif col in INT8_COLS:
+            cols[col] = s.to_numpy().astype(np.int8)
+        elif s.dtype == np.float64 and col not in KEEP_FLOAT64:
+            cols[col] = s.to_numpy(dtype=np.float32)
+        else:
+            cols[col] = s
+    return pd.DataFrame(cols, index=df.index)
+
+
+def expand_frame(df):
+    """
+    compact_frame 的反向轉換 (float32 -> float64、int8 -> int64、類別 -> 字串)
+
+    Args:
+        df: compact_frame 的輸出
+
+    Returns:
+        DataFrame: 原始型別的新表
+    """
+    cols = {}
+    for col in df.columns:
+        s = df[col]
+        if col in REASON_CATEGORIES:
+            cols[col] = s.astype(object).to_numpy()
+        elif col in INT8_COLS:
+            cols[col] = s.to_numpy().astype(np.int64)
+        elif s.dtype == np.float32:
+            cols[col] = s.to_numpy(dtype=np.float64)
+        else:
+            cols[col] = s
+    return pd.DataFrame(cols, index=df.index)
+
+
+def memory_saving(df):
+    """
+    比較精簡前後的記憶體用量
+
+    Returns:
+        dict: {"before": bytes, "after": bytes, "ratio": before / after}
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    after = int(compact_frame(df).memory_usage(deep=True).sum())
+    return {"before": before, "after": after, "ratio": before / after if after else np.nan}
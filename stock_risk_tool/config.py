@@ -5,6 +5,7 @@
 # 2. 新增可調整的賣出參數
 # 3. 改善程式可維護性
 # =========================================================
+import os
 from datetime import datetime, timedelta
 
 # =========================================================
@@ -15,6 +16,44 @@ start_date_obj = today - timedelta(days=1095)  # 3年 = 1095天
 START_DATE_STR = start_date_obj.strftime("%Y-%m-%d")
 END_DATE_STR = today.strftime("%Y-%m-%d")
 
+# =========================================================
+# 本地資料倉儲 (避免每次重新下載全部歷史)
+# =========================================================
+DATA_DIR = os.environ.get(
+    "STOCK_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "prices")
+)
+
+# =========================================================
+# 分析結果快取 (Streamlit 重新執行時沿用)
+# =========================================================
+CACHE_TTL_SECONDS = 6 * 60 * 60   # 6 小時後重新計算
+CACHE_MAX_MB = 512                # 快取總容量上限
+
+# =========================================================
+# 平行運算 (逐檔分析)
+# =========================================================
+PIPELINE_EXECUTOR = "thread"      # serial / thread / process
+PIPELINE_WORKERS = 4              # 工作數 (None = CPU 核心數)
+
+# =========================================================
+# 風險指標基準 (追蹤誤差 / 資訊比率)
+# 以 0050 代替加權指數;取不到資料時改用個股買進持有
+# =========================================================
+BENCHMARK_TICKER = "0050.TW"
+
+# =========================================================
+# 投組風險 (跨股票相關性 / VaR)
+# =========================================================
+RISK_WINDOW = 250                 # 共變異數視窗 (K 棒,約一年)
+VAR_CONFIDENCE = 0.95             # VaR / CVaR 信賴水準
+
+# =========================================================
+# Bootstrap 信賴區間 (回測績效)
+# =========================================================
+BOOTSTRAP_SAMPLES = 2000          # 抽樣次數
+BOOTSTRAP_CONFIDENCE = 0.90       # 信賴水準 (雙尾)
+
 # =========================================================
 # 股票清單
 # =========================================================
@@ -81,6 +120,16 @@ P = {
     "FEE_BUY": 0.001425,           # 買進手續費 (0.1425%)
     "FEE_SELL": 0.004425,          # 賣出手續費 + 證交稅 (0.4425%)
 
+    # --- 投組回測 (共用資金) ---
+    "PORTFOLIO_MAX_POSITIONS": 10, # 同時持有上限
+    "PORTFOLIO_SIZING": "equal",   # equal (等權重) / atr (依 ATRp) / score (依 Tech_Score)
+    "PORTFOLIO_ATR_RISK": 0.01,    # atr 配置: 1 個 ATR 的波動約為權益的 1%
+    "PORTFOLIO_MAX_WEIGHT": 0.2,   # atr 配置: 單檔上限 (權益比例)
+
+    # --- 回測引擎 ---
+    "BACKTEST_ENGINE": "numpy",    # python (逐日迴圈) / numpy / numba
+    "COMPACT_DTYPES": False,       # 輸出表改用 float32 / int8 / 類別型別
+
     # --- 爆量相關 ---
     "BIGVOL_VALID_DAYS": 60,       # 爆量支撐有效期 (天)
 
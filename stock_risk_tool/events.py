@@ -0,0 +1,192 @@
+# =========================================================
+# 事件研究 - 各種訊號發生後 N 天的報酬分布
+#
+# 1. 全部股票的收盤價首尾相接,每檔之後補 max(horizons) 個 NaN,
+#    以 sliding_window_view 建立 (位置 × 視窗) 的零複製視圖,
+#    事件位置與觀察期一次以進階索引取出,視窗不會跨到下一檔
+# 2. 事件: 買進 (依 Buy_Reason)、賣出 (依 Sell_Reason_Raw)、RSI 保護中 (In_Protection)
+# 3. 依事件 / 原因 / 股票類型分組,統計平均、中位數、勝率 (報酬 > 0) 與分位數
+# =========================================================
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import config
+from .compact import BUY_REASONS, SELL_REASONS
+
+DEFAULT_HORIZONS = (1, 3, 5, 10, 20)
+DEFAULT_QUANTILES = (0.1, 0.25, 0.75, 0.9)
+
+EVENT_TYPES = ("buy", "sell", "protect")
+
+# 原因類別 (買進 / 賣出原因合併,另加保護中)
+PROTECT_REASON = "IN_PROTECTION"
+REASON_LABELS = tuple(dict.fromkeys(BUY_REASONS + SELL_REASONS + (PROTECT_REASON,)))
+
+# 事件類型 -> (訊號欄位, 原因欄位)
+_EVENT_COLUMNS = {
+    "buy": ("Buy_Signal", "Buy_Reason"),
+    "sell": ("Sell_Signal", "Sell_Reason_Raw"),
+    "protect": ("In_Protection", None),
+}
+
+
+def _event_rows(df, events):
+    """
+    單檔的事件位置、事件類型代碼與原因字串
+
+    原因在全部股票串接後才一次轉為類別代碼 (逐檔建立 Categorical 很慢)。
+    """
+    rows, kinds, reasons = [], [], []
+    for kind in events:
+        flag_col, reason_col = _EVENT_COLUMNS[kind]
+        if flag_col not in df.columns:
+            continue
+        pos = np.flatnonzero(df[flag_col].to_numpy(dtype=bool))
+        rows.append(pos)
+        kinds.append(np.full(len(pos), EVENT_TYPES.index(kind), dtype=np.int8))
+        if reason_col is None:
+            reasons.append(np.full(len(pos), PROTECT_REASON, dtype=object))
+        else:
+            reasons.append(df[reason_col].to_numpy(dtype=object)[pos])
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int8), np.array([], dtype=object)
+    return np.concatenate(rows), np.concatenate(kinds), np.concatenate(reasons)
+
+
+def collect_events(frames, horizons=DEFAULT_HORIZONS, stock_types=None, events=EVENT_TYPES,
+                   price_col="Close"):
+    """
+    收集全部股票的訊號事件及其未來報酬
+
+    未來報酬 = 第 h 根之後的收盤價 / 事件當天收盤價 - 1,
+    資料不足 h 根時為 NaN。
+
+    Args:
+        frames: {ticker: generate_signals 輸出的 DataFrame}
+        horizons: 觀察期列表 (K 棒數)
+        stock_types: {ticker: 股票類型} (預設 config.TICKERS_CONFIG,未列出者為 DEFAULT)
+        events: 要收集的事件類型 (EVENT_TYPES 的子集)
+        price_col: 價格欄位
+
+    Returns:
+        DataFrame: 每個事件一列,欄位 ticker / date / stock_type / event / reason
+                   (皆為類別型別) 與每個觀察期一欄 (欄名為整數 h)
+
+    Raises:
+        ValueError: 未知的事件類型或觀察期 < 1
+    """
+    horizons = np.asarray(sorted(set(int(h) for h in horizons)), dtype=np.int64)
+    if len(horizons) == 0 or horizons[0] < 1:
+        raise ValueError(f"觀察期必須 >= 1: {list(horizons)}")
+    unknown = set(events) - set(EVENT_TYPES)
+    if unknown:
+        raise ValueError(f"未知的事件類型: {sorted(unknown)} (可用: {EVENT_TYPES})")
+    stock_types = config.TICKERS_CONFIG if stock_types is None else stock_types
+    pad = int(horizons[-1])
+
+    tickers = [t for t, df in frames.items() if df is not None and len(df)]
+    type_labels = sorted(set(stock_types.get(t, "DEFAULT") for t in tickers)) or ["DEFAULT"]
+
+    # 價格首尾相接,每段之後補 pad 個 NaN (事件位置加上各段起點)
+    prices, dates, ev_pos, ev_ticker, ev_kind, ev_reason = [], [], [], [], [], []
+    offset = 0
+    for j, t in enumerate(tickers):
+        df = frames[t]
+        rows, kinds, reasons = _event_rows(df, events)
+        prices.append(df[price_col].to_numpy(dtype=float))
+        prices.append(np.full(pad, np.nan))
+        dates.append(df.index.to_numpy()[rows])
+        ev_pos.append(rows + offset)
+        ev_ticker.append(np.full(len(rows), j, dtype=np.int32))
+        ev_kind.append(kinds)
+        ev_reason.append(reasons)
+        offset += len(df) + pad
+
+    columns = ["ticker", "date", "stock_type", "event", "reason"] + horizons.tolist()
+    if not tickers:
+        return pd.DataFrame(columns=columns)
+
+    prices = np.concatenate(prices)
+    pos = np.concatenate(ev_pos)
+    ticker_code = np.concatenate(ev_ticker)
+
+    # (位置 × pad+1) 的零複製視窗;進階索引只取出事件列的各觀察期
+    windows = sliding_window_view(prices, pad + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fwd = windows[pos[:, None], horizons[None, :]] / prices[pos, None] - 1
+
+    type_of_ticker = np.array([type_labels.index(stock_types.get(t, "DEFAULT")) for t in tickers])
+    # 未知原因歸為 NONE
+    reason_code = pd.Categorical(np.concatenate(ev_reason), categories=REASON_LABELS).codes
+    reason_code = np.where(reason_code < 0, REASON_LABELS.index("NONE"), reason_code)
+    out = pd.DataFrame({
+        "ticker": pd.Categorical.from_codes(ticker_code, categories=tickers),
+        "date": np.concatenate(dates),
+        "stock_type": pd.Categorical.from_codes(type_of_ticker[ticker_code], categories=type_labels),
+        "event": pd.Categorical.from_codes(np.concatenate(ev_kind), categories=EVENT_TYPES),
+        "reason": pd.Categorical.from_codes(reason_code, categories=REASON_LABELS),
+    })
+    fwd_frame = pd.DataFrame(fwd, columns=horizons.tolist())
+    return pd.concat([out, fwd_frame], axis=1)
+
+
+def summarize_events(events, by=("event", "reason"), quantiles=DEFAULT_QUANTILES):
+    """
+    依分組統計未來報酬分布
+
+    Args:
+        events: collect_events 的輸出
+        by: 分組欄位 (如 ("event", "reason")、("stock_type", "event", "reason"))
+        quantiles: 分位數列表
+
+    Returns:
+        DataFrame: index 為 (分組..., horizon),欄位 count / mean / median /
+                   hit_rate (報酬 > 0 的比例) / q10 / q25 ...;
+                   資料不足觀察期的事件不列入該觀察期
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    horizons = [c for c in events.columns if isinstance(c, (int, np.integer))]
+    fwd = events[horizons]
+    keys = [events[k] for k in by]
+
+    g = fwd.groupby(keys, observed=True, sort=True)
+    hits = (fwd > 0).astype(float).where(fwd.notna())
+    # 中位數與各分位數一次計算 (每組只排序一次)
+    levels = [0.5] + [float(q) for q in quantiles]
+    qs = g.quantile(levels)
+    stats = {
+        "count": g.count(),
+        "mean": g.mean(),
+        "median": qs.xs(0.5, level=-1),
+        "hit_rate": hits.groupby(keys, observed=True, sort=True).mean(),
+    }
+    for q in levels[1:]:
+        stats[f"q{round(q * 100):g}"] = qs.xs(q, level=-1)
+
+    table = pd.concat(
+        {name: frame.rename_axis(columns="horizon").stack() for name, frame in stats.items()},
+        axis=1,
+    )
+    table["count"] = table["count"].astype(np.int64)
+    return table
+
+
+def event_study(frames, horizons=DEFAULT_HORIZONS, by=("event", "reason"),
+                quantiles=DEFAULT_QUANTILES, stock_types=None, events=EVENT_TYPES):
+    """
+    事件研究: 收集事件並依分組統計未來報酬
+
+    Args:
+        frames: {ticker: generate_signals 輸出的 DataFrame}
+        horizons: 觀察期列表
+        by: 分組欄位 (可含 "stock_type" / "ticker")
+        quantiles: 分位數列表
+        stock_types: {ticker: 股票類型} (預設 config.TICKERS_CONFIG)
+        events: 要收集的事件類型
+
+    Returns:
+        DataFrame: 同 summarize_events
+    """
+    collected = collect_events(frames, horizons, stock_types, events)
+    return summarize_events(collected, by, quantiles)
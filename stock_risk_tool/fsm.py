@@ -0,0 +1,186 @@
+import warnings
+
+import numpy as np
+
+# numba 為選用套件,未安裝時退回純 NumPy 版本
+try:
+    import numba
+    _HAS_NUMBA = True
+except ImportError:
+    numba = None
+    _HAS_NUMBA = False
+
+ENGINES = ("python", "numpy", "numba")
+
+
+def _find_trades(buys, sells, exit_cooldown):
+    """
+    以事件跳躍方式找出所有進出場點
+
+    只在「下一個可買點」與「下一個賣點」之間跳躍,
+    迴圈次數等於交易筆數而非 K 棒數。
+
+    Returns:
+        tuple: (entry_idx, exit_idx, open_entry)
+            open_entry 為期末仍持有部位的進場索引,無則為 -1
+    """
+    buy_idx = np.flatnonzero(buys[1:]) + 1
+    sell_idx = np.flatnonzero(sells[1:]) + 1
+
+    entries = []
+    exits = []
+    open_entry = -1
+    last_exit_idx = -999
+    i = 1
+
+    while True:
+        # 冷卻期: (i - last_exit_idx) < exit_cooldown 時不可買
+        start = max(i, last_exit_idx + exit_cooldown)
+        k = np.searchsorted(buy_idx, start, side="left")
+        if k >= len(buy_idx):
+            break
+        entry = int(buy_idx[k])
+
+        # 進場當天不檢查賣出,從下一根開始
+        k = np.searchsorted(sell_idx, entry, side="right")
+        if k >= len(sell_idx):
+            open_entry = entry
+            break
+        exit_ = int(sell_idx[k])
+
+        entries.append(entry)
+        exits.append(exit_)
+        last_exit_idx = exit_
+        i = exit_ + 1
+
+    return (
+        np.asarray(entries, dtype=np.int64),
+        np.asarray(exits, dtype=np.int64),
+        open_entry,
+    )
+
+
+def _fsm_numpy(closes, buys, sells, fee_buy, fee_sell, exit_cooldown):
+    n = len(closes)
+    entry_idx, exit_idx, open_entry = _find_trades(buys, sells, exit_cooldown)
+
+    # 持倉序列: 進場當天起為 1,出場當天為 0
+    delta = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(delta, entry_idx, 1)
+    np.add.at(delta, exit_idx, -1)
+    if open_entry >= 0:
+        delta[open_entry] += 1
+    pos_hist = np.cumsum(delta[:n]).astype(int)
+
+    # 權益曲線: 每根 K 棒拆成「價格變動」與「手續費」兩個乘數,
+    # 交錯排列後以 cumprod 依序相乘,與逐日迴圈的運算順序完全相同
+    factors = np.ones(2 * n, dtype=float)
+    held_prev = np.zeros(n, dtype=bool)
+    held_prev[1:] = pos_hist[:-1] == 1
+    ratio = np.ones(n, dtype=float)
+    ratio[1:] = closes[1:] / closes[:-1]
+    factors[0::2] = np.where(held_prev, ratio, 1.0)
+
+    fee = np.ones(n, dtype=float)
+    fee[exit_idx] = 1 - fee_sell
+    fee[entry_idx] = 1 - fee_buy
+    if open_entry >= 0:
+        fee[open_entry] = 1 - fee_buy
+    factors[1::2] = fee
+    factors[0] = 1.0
+    factors[1] = 1.0
+    equity = np.cumprod(factors)[1::2]
+
+    # 單筆報酬
+    entry_price = closes[entry_idx] * (1 + fee_buy)
+    raw_ret = (closes[exit_idx] / entry_price) - 1
+    net_ret = (1 + raw_ret) * (1 - fee_buy) * (1 - fee_sell) - 1
+
+    if open_entry >= 0:
+        entry_idx = np.append(entry_idx, open_entry)
+
+    return equity, pos_hist, entry_idx, exit_idx, net_ret
+
+
+def _fsm_kernel(closes, buys, sells, fee_buy, fee_sell, exit_cooldown):
+    """
+    逐日迴圈版狀態機 (engine="python";同一份程式碼由 numba 編譯為 engine="numba")
+    """
+    n = len(closes)
+    equity = np.ones(n, dtype=np.float64)
+    pos_hist = np.zeros(n, dtype=np.int64)
+    entry_idx = np.empty(n, dtype=np.int64)
+    exit_idx = np.empty(n, dtype=np.int64)
+    net_ret = np.empty(n, dtype=np.float64)
+    n_entries = 0
+    n_exits = 0
+
+    pos = 0
+    entry_price = 0.0
+    last_exit_idx = -999
+
+    for i in range(1, n):
+        equity[i] = equity[i - 1]
+        in_cooldown = (i - last_exit_idx) < exit_cooldown
+        if pos == 1:
+            equity[i] *= (closes[i] / closes[i - 1])
+            if sells[i]:
+                equity[i] *= (1 - fee_sell)
+                raw_ret = (closes[i] / entry_price) - 1
+                net_ret[n_exits] = (1 + raw_ret) * (1 - fee_buy) * (1 - fee_sell) - 1
+                exit_idx[n_exits] = i
+                n_exits += 1
+                pos = 0
+                last_exit_idx = i
+        else:
+            if buys[i] and not in_cooldown:
+                pos = 1
+                entry_price = closes[i] * (1 + fee_buy)
+                entry_idx[n_entries] = i
+                n_entries += 1
+                equity[i] *= (1 - fee_buy)
+        pos_hist[i] = pos
+
+    return (equity, pos_hist, entry_idx[:n_entries],
+            exit_idx[:n_exits], net_ret[:n_exits])
+
+
+if _HAS_NUMBA:
+    _fsm_numba_kernel = numba.njit(cache=True)(_fsm_kernel)
+
+
+def run_fsm(closes, buys, sells, fee_buy, fee_sell, exit_cooldown, engine="numpy"):
+    """
+    陣列版回測狀態機 (與 backtest_fsm 逐日迴圈語意相同)
+
+    Args:
+        closes: 收盤價陣列
+        buys: 買進訊號布林陣列
+        sells: 賣出訊號布林陣列
+        fee_buy: 買進手續費
+        fee_sell: 賣出手續費
+        exit_cooldown: 出場冷卻天數
+        engine: "python" (逐日迴圈) / "numpy" / "numba"
+                (未安裝 numba 時發出 RuntimeWarning 並改用 numpy)
+
+    Returns:
+        tuple: (equity, pos_hist, entry_idx, exit_idx, net_ret)
+            entry_idx 可能比 exit_idx 多一筆 (期末仍持有)
+    """
+    closes = np.asarray(closes, dtype=float)
+    buys = np.asarray(buys, dtype=bool)
+    sells = np.asarray(sells, dtype=bool)
+
+    if engine not in ENGINES:
+        raise ValueError(f"未知的回測引擎: {engine}")
+    if engine == "numba" and not _HAS_NUMBA:
+        warnings.warn("未安裝 numba,改用 numpy 回測引擎", RuntimeWarning, stacklevel=2)
+        engine = "numpy"
+    if engine == "numpy":
+        return _fsm_numpy(closes, buys, sells, fee_buy, fee_sell, exit_cooldown)
+
+    kernel = _fsm_numba_kernel if engine == "numba" else _fsm_kernel
+    equity, pos_hist, entry_idx, exit_idx, net_ret = kernel(
+        closes, buys, sells, float(fee_buy), float(fee_sell), int(exit_cooldown)
+    )
+    return equity, pos_hist.astype(int), entry_idx, exit_idx, net_ret
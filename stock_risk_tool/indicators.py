@@ -1,5 +1,15 @@
 import pandas as pd
 import numpy as np
+from .utils import set_column
+from .rolling import RollingMemo
+
+# add_indicators 會讀取的參數 (其餘參數變動時指標不需重算)
+PARAM_KEYS = (
+    "MA5", "MA10", "MA20", "MA60", "MA240",
+    "VOL_MA", "ATR_N", "RSI_N", "KD_N",
+    "MACD_FAST", "MACD_SLOW", "MACD_SIGNAL",
+    "BIGVOL_MULT", "BIG_RED_BODY_PCT",
+)
 
 def compute_atr_pct(df, n=14):
     """
@@ -12,84 +22,102 @@ def compute_atr_pct(df, n=14):
     Returns:
         Series: ATR 百分比
     """
+    # 回傳 ATR 百分比
+    return _true_range(df).rolling(n).mean() / df["Close"]
+
+
+def _true_range(df):
+    """真實波幅 (True Range)"""
     high = df["High"]
     low = df["Low"]
-    close = df["Close"]
-    prev_close = close.shift(1)
-    
-    # 計算真實波幅 (True Range)
-    tr = pd.concat([
+    prev_close = df["Close"].shift(1)
+    return pd.concat([
         (high - low),
         (high - prev_close).abs(),
         (low - prev_close).abs()
     ], axis=1).max(axis=1)
-    
-    # 回傳 ATR 百分比
-    return tr.rolling(n).mean() / close
 
 
-def add_indicators(df, p):
+def add_indicators(df, p, inplace=False, memo=None):
     """
     新增所有技術指標
     
     Args:
         df: 原始 OHLC DataFrame
         p: 參數字典
+        inplace: 直接寫入 df 而不複製 (搭配 pipeline.allocate_frame)
+        memo: 同一檔股票的 RollingMemo (參數掃描時跨組合共用滾動運算)
     
     Returns:
         DataFrame: 加入指標後的資料
+
+    Raises:
+        ValueError: memo 與 df 的資料不一致
     """
-    df = df.copy()
+    if not inplace:
+        df = df.copy()
+    if memo is None:
+        memo = RollingMemo(df)
+    elif not memo.matches(df):
+        raise ValueError("RollingMemo 與資料不一致,請為每檔股票建立各自的快取")
 
     # ========================================================
     # 1. 均線系統
     # ========================================================
     for ma in ["MA5", "MA10", "MA20", "MA60", "MA240"]:
         if p.get(ma):
-            df[ma] = df["Close"].rolling(p[ma]).mean()
+            set_column(df, ma, memo.mean("Close", p[ma]), inplace)
 
     # ========================================================
     # 2. 量能指標
     # ========================================================
-    df["VOL_MA"] = df["Volume"].rolling(p["VOL_MA"]).mean()
+    set_column(df, "VOL_MA", memo.mean("Volume", p["VOL_MA"]), inplace)
     
     # ========================================================
     # 3. 波動率指標
     # ========================================================
-    df["ATRp"] = compute_atr_pct(df, p["ATR_N"])
+    atr = memo.mean("TR", p["ATR_N"], lambda: _true_range(memo.frame))
+    set_column(df, "ATRp", atr / df["Close"], inplace)
 
     # ========================================================
     # 4. RSI (相對強弱指標)
     # ========================================================
-    delta = df["Close"].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(p["RSI_N"]).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(p["RSI_N"]).mean()
+    delta = lambda: memo.series("DELTA", lambda: memo.frame["Close"].diff())
+    gain = memo.mean("GAIN", p["RSI_N"], lambda: delta().where(delta() > 0, 0))
+    loss = memo.mean("LOSS", p["RSI_N"], lambda: -delta().where(delta() < 0, 0))
     rs = gain / loss
-    df["RSI"] = 100 - (100 / (1 + rs)).fillna(50)
+    set_column(df, "RSI", 100 - (100 / (1 + rs)).fillna(50), inplace)
 
     # ========================================================
     # 5. KD 指標
     # ========================================================
-    low_min = df["Low"].rolling(p["KD_N"]).min()
-    high_max = df["High"].rolling(p["KD_N"]).max()
-    rsv = (df["Close"] - low_min) / (high_max - low_min) * 100
-    df["K"] = rsv.ewm(com=2).mean()
-    df["D"] = df["K"].ewm(com=2).mean()
+    kd_n = p["KD_N"]
+    def rsv():
+        low_min = memo.min("Low", kd_n)
+        high_max = memo.max("High", kd_n)
+        return (memo.frame["Close"] - low_min) / (high_max - low_min) * 100
+    k = memo.ewm(f"RSV{kd_n}", com=2, fn=rsv)
+    set_column(df, "K", k, inplace)
+    set_column(df, "D", memo.ewm(f"K{kd_n}", com=2, fn=lambda: k), inplace)
 
     # ========================================================
     # 6. MACD
     # ========================================================
-    ema_fast = df["Close"].ewm(span=p["MACD_FAST"]).mean()
-    ema_slow = df["Close"].ewm(span=p["MACD_SLOW"]).mean()
+    fast, slow = p["MACD_FAST"], p["MACD_SLOW"]
+    ema_fast = memo.ewm("Close", span=fast)
+    ema_slow = memo.ewm("Close", span=slow)
     macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=p["MACD_SIGNAL"]).mean()
-    df["MACD_Hist"] = macd_line - signal_line
+    signal_line = memo.ewm(f"MACD{fast}_{slow}", span=p["MACD_SIGNAL"], fn=lambda: macd_line)
+    set_column(df, "MACD_Hist", macd_line - signal_line, inplace)
 
     # ========================================================
     # 7. OBV (能量潮指標)
     # ========================================================
-    df["OBV"] = (np.sign(df["Close"].diff()) * df["Volume"]).fillna(0).cumsum()
-    df["OBV_MA20"] = df["OBV"].rolling(20).mean()
+    obv = memo.series(
+        "OBV", lambda: (np.sign(memo.frame["Close"].diff()) * memo.frame["Volume"]).fillna(0).cumsum()
+    )
+    set_column(df, "OBV", obv, inplace)
+    set_column(df, "OBV_MA20", memo.mean("OBV", 20), inplace)
 
     # ========================================================
     # 8. 老王戰法核心指標
@@ -97,33 +125,33 @@ def add_indicators(df, p):
     
     # 8.1 爆大量與低點
     is_big_vol = (df["Volume"] > df["VOL_MA"] * p["BIGVOL_MULT"])
-    df["Is_Big_Vol"] = is_big_vol
+    set_column(df, "Is_Big_Vol", is_big_vol, inplace)
     
     # 爆量低點支撐線 (向後延伸)
-    df["BigVol_Low"] = np.where(is_big_vol, df["Low"], np.nan)
-    df["BigVol_Low"] = df["BigVol_Low"].ffill()
+    set_column(df, "BigVol_Low", np.where(is_big_vol, df["Low"], np.nan), inplace)
+    set_column(df, "BigVol_Low", df["BigVol_Low"].ffill(), inplace)
 
     # 8.2 長紅與缺口
     body_pct = (df["Close"] - df["Open"]) / df["Open"]
-    df["Is_Big_Red"] = (body_pct > p["BIG_RED_BODY_PCT"])
-    df["Gap_Up"] = df["Low"] > df["High"].shift(1)
+    set_column(df, "Is_Big_Red", (body_pct > p["BIG_RED_BODY_PCT"]), inplace)
+    set_column(df, "Gap_Up", df["Low"] > df["High"].shift(1), inplace)
 
     # 8.3 三陽開泰 / 四海遊龍
-    df["SanYang"] = (
+    set_column(df, "SanYang", (
         (df["Close"] > df["MA5"]) & 
         (df["Close"] > df["MA10"]) & 
         (df["Close"] > df["MA20"])
-    )
-    df["SiHai"] = df["SanYang"] & (df["Close"] > df["MA60"])
+    ), inplace)
+    set_column(df, "SiHai", df["SanYang"] & (df["Close"] > df["MA60"]), inplace)
 
     # ========================================================
     # 9. 相容性欄位 (保持與舊版一致)
     # ========================================================
-    df["GapUp"] = df["Gap_Up"]
-    df["Gap_Support"] = False
-    df["Breakout"] = False
-    df["Wash"] = False
-    df["BigVol_Confirmed"] = True
+    set_column(df, "GapUp", df["Gap_Up"], inplace)
+    set_column(df, "Gap_Support", False, inplace)
+    set_column(df, "Breakout", False, inplace)
+    set_column(df, "Wash", False, inplace)
+    set_column(df, "BigVol_Confirmed", True, inplace)
 
     return df
 
@@ -0,0 +1,288 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+import pandas as pd
+
+# 目前執行中的紀錄器 (None = 關閉,所有 hook 直接略過)
+# 以 ContextVar 保存: Streamlit 的每個 session 在各自的執行緒執行,互不影響;
+# parallel.map_ordered 的 thread 模式會把呼叫端的 context 帶進工作執行緒
+_CURRENT = contextvars.ContextVar("instrument_recorder", default=None)
+_NULL = nullcontext()
+
+# tracemalloc 是整個行程共用的: 記錄使用中的紀錄器數量,
+# 以及是否由本模組啟動 (外部已啟動時不由這裡停止)
+_TRACE_LOCK = threading.Lock()
+_TRACE_USERS = 0
+_TRACE_OWNED = False
+
+
+class _Stage:
+    """單一階段的計時區塊 (由 Recorder.stage 建立)"""
+
+    __slots__ = ("rec", "name", "ticker", "wall0", "cpu0", "mem0", "max_peak")
+
+    def __init__(self, rec, name, ticker):
+        self.rec = rec
+        self.name = name
+        self.ticker = ticker
+
+    def __enter__(self):
+        stack = self.rec._stack()
+        if self.rec.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # 重設峰值前,先把目前峰值記到外層階段
+            if stack:
+                stack[-1].max_peak = max(stack[-1].max_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem0 = current
+            self.max_peak = current
+        stack.append(self)
+        self.cpu0 = time.thread_time()
+        self.wall0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall0
+        cpu = time.thread_time() - self.cpu0
+        stack = self.rec._stack()
+        stack.pop()
+
+        peak_bytes = None
+        if self.rec.trace_memory:
+            peak = max(self.max_peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - self.mem0
+            if stack:
+                stack[-1].max_peak = max(stack[-1].max_peak, peak)
+
+        self.rec._add({
+            "stage": self.name,
+            "ticker": self.ticker,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "peak_bytes": peak_bytes,
+            "error": exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+
+class Recorder:
+    """
+    效能紀錄器 - 記錄每個階段 / 每檔股票的耗時與記憶體峰值
+
+    Args:
+        trace_memory: 是否以 tracemalloc 追蹤記憶體峰值
+                      (會拖慢程式,且多執行緒時峰值會互相混合)
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def stage(self, name, ticker=None):
+        """回傳計時用的 context manager"""
+        return _Stage(self, name, ticker)
+
+    def to_frame(self):
+        """所有紀錄 (每個階段呼叫一列)"""
+        return pd.DataFrame(
+            self.records,
+            columns=["stage", "ticker", "wall_s", "cpu_s", "peak_bytes", "error"],
+        )
+
+    def aggregate(self):
+        """
+        依階段彙總 (跨股票)
+
+        Returns:
+            DataFrame: calls / wall_total / wall_mean / wall_max / cpu_total / peak_max
+        """
+        df = self.to_frame()
+        if df.empty:
+            return pd.DataFrame()
+        agg = df.groupby("stage", sort=False).agg(
+            calls=("wall_s", "size"),
+            wall_total=("wall_s", "sum"),
+            wall_mean=("wall_s", "mean"),
+            wall_max=("wall_s", "max"),
+            cpu_total=("cpu_s", "sum"),
+            peak_max=("peak_bytes", "max"),
+        )
+        return agg.sort_values("wall_total", ascending=False)
+
+    def by_ticker(self):
+        """每檔股票 × 階段的總耗時 (秒)"""
+        df = self.to_frame()
+        df = df[df["ticker"].notna()]
+        if df.empty:
+            return pd.DataFrame()
+        return df.pivot_table(index="ticker", columns="stage", values="wall_s", aggfunc="sum")
+
+    def to_json(self, path=None):
+        """
+        匯出為 JSON
+
+        Args:
+            path: 輸出路徑 (None 時只回傳字串)
+
+        Returns:
+            str: JSON 字串
+        """
+        agg = self.aggregate()
+        payload = {
+            "records": self.records,
+            "summary": agg.reset_index().to_dict("records") if not agg.empty else [],
+        }
+        text = json.dumps(payload, ensure_ascii=False, indent=1, default=str)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+
+# =========================================================
+# 模組層級介面 (關閉時零成本)
+# =========================================================
+def _acquire_tracing():
+    global _TRACE_USERS, _TRACE_OWNED
+    with _TRACE_LOCK:
+        if _TRACE_USERS == 0:
+            _TRACE_OWNED = not tracemalloc.is_tracing()
+            if _TRACE_OWNED:
+                tracemalloc.start()
+        _TRACE_USERS += 1
+
+
+def _release_tracing():
+    global _TRACE_USERS, _TRACE_OWNED
+    with _TRACE_LOCK:
+        _TRACE_USERS -= 1
+        if _TRACE_USERS == 0 and _TRACE_OWNED:
+            tracemalloc.stop()
+            _TRACE_OWNED = False
+
+
+def enable(trace_memory=True):
+    """
+    在目前的 context (執行緒 / Streamlit session) 啟用紀錄
+
+    Returns:
+        Recorder: 新的紀錄器
+    """
+    rec = Recorder(trace_memory=trace_memory)
+    if trace_memory:
+        _acquire_tracing()
+        rec._tracing = True
+    _CURRENT.set(rec)
+    return rec
+
+
+def disable(rec=None):
+    """
+    停止紀錄
+
+    只影響目前 context 的紀錄器;tracemalloc 只在最後一個使用者結束、
+    且是由 enable 啟動時才停止。
+
+    Args:
+        rec: 要停止的紀錄器 (預設為目前 context 的紀錄器)
+
+    Returns:
+        Recorder: 停止的紀錄器 (未啟用時為 None)
+    """
+    current = _CURRENT.get()
+    rec = rec if rec is not None else current
+    if rec is None:
+        return None
+    if current is rec:
+        _CURRENT.set(None)
+    if rec._tracing:
+        rec._tracing = False
+        _release_tracing()
+    return rec
+
+
+def get_recorder():
+    """回傳目前 context 的紀錄器 (未啟用時為 None)"""
+    return _CURRENT.get()
+
+
+def stage(name, ticker=None):
+    """
+    計時區塊
+
+    用法:
+        with instrument.stage("add_indicators", ticker):
+            df = indicators.add_indicators(df, p)
+    """
+    rec = _CURRENT.get()
+    if rec is None:
+        return _NULL
+    return rec.stage(name, ticker)
+
+
+def timed(name=None):
+    """
+    計時裝飾器 (未啟用時直接呼叫原函數)
+
+    Args:
+        name: 階段名稱 (預設為函數名稱)
+    """
+    def deco(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rec = _CURRENT.get()
+            if rec is None:
+                return fn(*args, **kwargs)
+            with rec.stage(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def render_streamlit(rec, st):
+    """
+    在 Streamlit 顯示效能分析面板
+
+    Args:
+        rec: Recorder
+        st: streamlit 模組
+    """
+    if rec is None or not rec.records:
+        return
+    with st.expander("⏱️ 效能分析", expanded=False):
+        agg = rec.aggregate()
+        st.markdown("**各階段彙總**")
+        st.dataframe(agg.style.format({
+            "wall_total": "{:.3f}s", "wall_mean": "{:.4f}s", "wall_max": "{:.4f}s",
+            "cpu_total": "{:.3f}s", "peak_max": "{:,.0f}",
+        }), use_container_width=True)
+        st.bar_chart(agg["wall_total"])
+
+        per_ticker = rec.by_ticker()
+        if not per_ticker.empty:
+            st.markdown("**各股票耗時 (秒)**")
+            st.dataframe(per_ticker, use_container_width=True)
+
+        st.download_button(
+            "下載 JSON", rec.to_json(), file_name="profile.json", mime="application/json"
+        )
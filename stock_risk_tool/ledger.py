@@ -0,0 +1,213 @@
+# =========================================================
+# 交易明細 (trade ledger) - 每筆交易一列的結構化陣列
+#
+# backtest_fsm 以 result["ledger"] 回傳,欄位見 TRADE_DTYPE;
+# 原因欄位存成 compact 模組的 int8 代碼,多檔股票合併後
+# 仍可直接以 NumPy 向量化統計 (連勝 / 連敗、期望值、持有天數分布)。
+# =========================================================
+import numpy as np
+import pandas as pd
+
+from .compact import decode_reasons, encode_reasons
+
+TRADE_DTYPE = np.dtype([
+    ("entry_idx", np.int64),        # 進場 K 棒索引
+    ("exit_idx", np.int64),         # 出場 K 棒索引
+    ("entry_date", "datetime64[ns]"),
+    ("exit_date", "datetime64[ns]"),
+    ("entry_price", np.float64),    # 進場收盤價 (未含手續費)
+    ("exit_price", np.float64),     # 出場收盤價
+    ("holding_days", np.int32),     # 持有 K 棒數
+    ("net_return", np.float64),     # 扣除買賣手續費後的報酬
+    ("buy_reason", np.int8),        # BUY_REASONS 代碼 (-1 = 未知)
+    ("sell_reason", np.int8),       # SELL_REASONS 代碼 (-1 = 未知)
+    ("mae", np.float64),            # 持有期間最大不利幅度 (最低價 / 進場價 - 1)
+    ("mfe", np.float64),            # 持有期間最大有利幅度 (最高價 / 進場價 - 1)
+])
+
+
+def _segment_reduce(ufunc, values, starts, stops):
+    """
+    對多個不相連區段 values[starts[i]:stops[i]] 做 ufunc.reduceat
+
+    區段需非空;起訖索引交錯排列後一次 reduceat,取偶數位置的結果。
+    """
+    padded = np.append(values, values[-1:])      # 讓 stop == len(values) 也是合法索引
+    idx = np.empty(2 * len(starts), dtype=np.int64)
+    idx[0::2] = starts
+    idx[1::2] = stops
+    return ufunc.reduceat(padded, idx)[0::2]
+
+
+def build_ledger(df, entry_idx, exit_idx, net_ret):
+    """
+    由進出場索引建立交易明細 (只含已平倉的交易)
+
+    Args:
+        df: 回測用的 DataFrame (Close / Buy_Reason / Sell_Reason_Raw,
+            有 High / Low 時用於 MAE / MFE,否則以收盤價計算)
+        entry_idx: 進場索引 (可比 exit_idx 多一筆期末未平倉)
+        exit_idx: 出場索引
+        net_ret: 每筆已平倉交易的淨報酬
+
+    Returns:
+        ndarray: TRADE_DTYPE 結構化陣列
+    """
+    exit_idx = np.asarray(exit_idx, dtype=np.int64)
+    entry_idx = np.asarray(entry_idx, dtype=np.int64)[:len(exit_idx)]
+    ledger = np.zeros(len(exit_idx), dtype=TRADE_DTYPE)
+    if len(exit_idx) == 0:
+        return ledger
+
+    closes = df["Close"].to_numpy(dtype=float)
+    highs = df["High"].to_numpy(dtype=float) if "High" in df.columns else closes
+    lows = df["Low"].to_numpy(dtype=float) if "Low" in df.columns else closes
+    dates = df.index.to_numpy()
+
+    ledger["entry_idx"] = entry_idx
+    ledger["exit_idx"] = exit_idx
+    if np.issubdtype(dates.dtype, np.datetime64):
+        ledger["entry_date"] = dates[entry_idx]
+        ledger["exit_date"] = dates[exit_idx]
+    else:
+        ledger["entry_date"] = np.datetime64("NaT")
+        ledger["exit_date"] = np.datetime64("NaT")
+    ledger["entry_price"] = closes[entry_idx]
+    ledger["exit_price"] = closes[exit_idx]
+    ledger["holding_days"] = exit_idx - entry_idx
+    ledger["net_return"] = net_ret
+    ledger["buy_reason"] = encode_reasons(df["Buy_Reason"].to_numpy()[entry_idx], "Buy_Reason")
+    ledger["sell_reason"] = encode_reasons(df["Sell_Reason_Raw"].to_numpy()[exit_idx])
+
+    # 持有期間 = 進場隔天 ~ 出場當天 (進場以當日收盤成交)
+    starts, stops = entry_idx + 1, exit_idx + 1
+    entry_close = closes[entry_idx]
+    ledger["mae"] = _segment_reduce(np.fmin, lows, starts, stops) / entry_close - 1
+    ledger["mfe"] = _segment_reduce(np.fmax, highs, starts, stops) / entry_close - 1
+    return ledger
+
+
+def ledger_frame(ledgers):
+    """
+    合併多檔股票的交易明細為 DataFrame (原因解碼為字串)
+
+    Args:
+        ledgers: {ticker: ledger} 或單一 ledger
+
+    Returns:
+        DataFrame: TRADE_DTYPE 欄位,多檔時另有 ticker 欄
+    """
+    if isinstance(ledgers, np.ndarray):
+        ledgers = {None: ledgers}
+    parts = []
+    for ticker, ledger in ledgers.items():
+        part = pd.DataFrame(ledger)
+        if ticker is not None:
+            part.insert(0, "ticker", ticker)
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=list(TRADE_DTYPE.names))
+    out = pd.concat(parts, ignore_index=True)
+    # 未知原因 (-1) 解碼為 "NONE"
+    out["buy_reason"] = decode_reasons(out["buy_reason"].to_numpy(), "Buy_Reason")
+    out["sell_reason"] = decode_reasons(out["sell_reason"].to_numpy())
+    return out
+
+
+# =========================================================
+# 向量化統計
+# =========================================================
+def streaks(net_returns, groups=None):
+    """
+    最大連續獲利 / 虧損次數 (報酬 > 0 為獲利,其餘為虧損)
+
+    Args:
+        net_returns: 依時間排序的每筆報酬
+        groups: 每筆交易所屬的股票 (None = 全部同一組);
+                同一組的交易需相鄰,連續計算不跨組
+
+    Returns:
+        tuple: 無 groups 時為 (最大連勝, 最大連敗);
+               有 groups 時為 DataFrame (index 為組別, 欄位 win_streak / loss_streak)
+    """
+    r = np.asarray(net_returns, dtype=float)
+    n = len(r)
+    if groups is None:
+        codes, labels = np.zeros(n, dtype=np.int64), None
+    else:
+        codes, labels = pd.factorize(np.asarray(groups), sort=False)
+
+    win = np.zeros(max(len(labels) if labels is not None else 1, 1), dtype=np.int64)
+    loss = np.zeros_like(win)
+    if n:
+        wins = r > 0
+        # 勝負或組別改變處為新區段的起點
+        change = np.ones(n, dtype=bool)
+        change[1:] = (wins[1:] != wins[:-1]) | (codes[1:] != codes[:-1])
+        starts = np.flatnonzero(change)
+        lengths = np.diff(np.append(starts, n))
+        run_win = wins[starts]
+        np.maximum.at(win, codes[starts][run_win], lengths[run_win])
+        np.maximum.at(loss, codes[starts][~run_win], lengths[~run_win])
+
+    if labels is None:
+        return int(win[0]), int(loss[0])
+    return pd.DataFrame({"win_streak": win, "loss_streak": loss}, index=pd.Index(labels))
+
+
+def expectancy(trades, by="sell_reason"):
+    """
+    依分組計算期望值等交易統計
+
+    Args:
+        trades: ledger_frame 的輸出
+        by: 分組欄位 (如 "sell_reason"、"buy_reason"、"ticker" 或欄位列表)
+
+    Returns:
+        DataFrame: trades / winrate / avg_win / avg_loss / expectancy /
+                   profit_factor / avg_holding / avg_mae / avg_mfe
+    """
+    r = trades["net_return"]
+    tmp = trades.assign(
+        _win=r > 0,
+        _gain=r.where(r > 0, 0.0),
+        _loss=-r.where(r < 0, 0.0),
+        _win_ret=r.where(r > 0),
+        _loss_ret=r.where(r <= 0),
+    )
+    g = tmp.groupby(by, sort=True)
+    out = pd.DataFrame({
+        "trades": g.size(),
+        "winrate": g["_win"].mean(),
+        "avg_win": g["_win_ret"].mean(),
+        "avg_loss": g["_loss_ret"].mean(),
+        "expectancy": g["net_return"].mean(),
+        # 沒有虧損時獲利因子記為 0 (與 backtest 的 profit_factor 相同)
+        "profit_factor": (g["_gain"].sum() / g["_loss"].sum().replace(0, np.nan)).fillna(0.0),
+        "avg_holding": g["holding_days"].mean(),
+        "avg_mae": g["mae"].mean(),
+        "avg_mfe": g["mfe"].mean(),
+    })
+    return out
+
+
+def holding_distribution(trades, bins=(0, 3, 5, 10, 20, 60, np.inf), by=None):
+    """
+    持有天數分布與各區間的平均報酬
+
+    Args:
+        trades: ledger_frame 的輸出
+        bins: 持有 K 棒數的區間邊界 (左開右閉)
+        by: 額外分組欄位 (如 "sell_reason")
+
+    Returns:
+        DataFrame: 每個 (分組, 區間) 的 trades / mean_return / winrate
+    """
+    bucket = pd.cut(trades["holding_days"], bins=list(bins))
+    keys = [bucket] if by is None else [trades[by], bucket]
+    g = trades["net_return"].groupby(keys, observed=True)
+    return pd.DataFrame({
+        "trades": g.size(),
+        "mean_return": g.mean(),
+        "winrate": (trades["net_return"] > 0).groupby(keys, observed=True).mean(),
+    })
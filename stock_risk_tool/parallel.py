@@ -0,0 +1,61 @@
+import contextvars
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+EXECUTORS = ("serial", "thread", "process")
+
+
+def map_ordered(fn, arg_list, executor="thread", max_workers=None, on_done=None):
+    """
+    平行執行並依輸入順序回傳結果
+
+    單筆失敗不會中斷其他工作,例外會放在回傳值中由呼叫端處理。
+    on_done 在呼叫端的執行緒中觸發 (可安全更新 Streamlit 進度條)。
+
+    Args:
+        fn: 工作函數 (process 模式需為模組層級函數)
+        arg_list: 每筆工作的參數 tuple 列表
+        executor: "serial" / "thread" / "process"
+        max_workers: 工作數 (None = CPU 核心數)
+        on_done: 每完成一筆呼叫 on_done(已完成數, 總數)
+
+    Returns:
+        list: 與 arg_list 對應的 (結果, 例外) tuple,成功時例外為 None
+
+    Raises:
+        ValueError: 未知的 executor
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"未知的執行模式: {executor}")
+
+    n = len(arg_list)
+    out = [None] * n
+
+    if executor == "serial" or n <= 1 or max_workers == 1:
+        for i, args in enumerate(arg_list):
+            try:
+                out[i] = (fn(*args), None)
+            except Exception as e:
+                out[i] = (None, e)
+            if on_done:
+                on_done(i + 1, n)
+        return out
+
+    pool_cls = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+    workers = min(max_workers or os.cpu_count() or 1, n)
+    with pool_cls(max_workers=workers) as pool:
+        if executor == "thread":
+            # 每筆工作各自複製呼叫端的 context (如 instrument 的紀錄器)
+            futures = {pool.submit(contextvars.copy_context().run, fn, *args): i
+                       for i, args in enumerate(arg_list)}
+        else:
+            futures = {pool.submit(fn, *args): i for i, args in enumerate(arg_list)}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            i = futures[fut]
+            try:
+                out[i] = (fut.result(), None)
+            except Exception as e:
+                out[i] = (None, e)
+            if on_done:
+                on_done(done, n)
+    return out
@@ -0,0 +1,303 @@
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .utils import bind_column_slots, ensure_schema
+from .indicators import PARAM_KEYS as INDICATOR_KEYS, add_indicators
+from .signals import PARAM_KEYS as SIGNAL_KEYS, generate_signals
+from .backtest import PARAM_KEYS as BACKTEST_KEYS, backtest_fsm
+from .compact import compact_frame
+from .cache import ResultCache, frame_hash, params_hash
+from . import config, instrument
+
+# pandas >= 3.0: 以既有陣列直接建立區塊 (不複製、不推斷字串型別)
+try:
+    from pandas.api.internals import create_dataframe_from_blocks
+except ImportError:
+    create_dataframe_from_blocks = None
+
+# =========================================================
+# 完整流程會產生的所有欄位 (名稱 -> (dtype, 預設值))
+# =========================================================
+_FLOAT_COLS = [
+    "Open", "High", "Low", "Close", "Volume",
+    "MA5", "MA10", "MA20", "MA60", "MA240",
+    "VOL_MA", "K", "D", "RSI", "DIF", "DEA", "MACD_Hist",
+    "ATRp", "OBV", "OBV_MA20", "BigVol_Low",
+    "StopLine", "Bias", "MA_Slope", "Sell_Premature_RisePct", "Equity",
+]
+_INT_COLS = ["Tech_Score", "Position"]
+_BOOL_COLS = [
+    "Buy_Signal", "Sell_Signal", "Sell_Core", "Sell_StopLine", "Sell_Premature",
+    "Is_Big_Vol", "Is_Big_Red", "Gap_Up", "SanYang", "SiHai",
+    "GapUp", "Gap_Support", "Breakout", "Wash", "BigVol_Confirmed",
+    "In_Protection", "Near_StopLine_Warn",
+    "Sell_Profit", "Sell_BigVol", "Sell_Fake", "Sell_StopLine_Raw", "Sell_HardStop",
+    "Short_Signal",
+]
+_REASON_COLS = ["Buy_Reason", "Sell_Reason_Raw"]
+
+PIPELINE_COLUMNS = (
+    [(c, np.float64, np.nan) for c in _FLOAT_COLS] +
+    [(c, np.int64, 0) for c in _INT_COLS] +
+    [(c, np.bool_, False) for c in _BOOL_COLS] +
+    [(c, object, "NONE") for c in _REASON_COLS]
+)
+
+
+def _wrap_blocks(blocks, index, columns):
+    """以 (2D 陣列, 欄位位置) 列表建立 DataFrame,不複製陣列"""
+    if create_dataframe_from_blocks is not None:
+        return create_dataframe_from_blocks(blocks, index=index, columns=pd.Index(columns))
+    parts = [
+        pd.DataFrame(arr.T, index=index, columns=[columns[i] for i in placement], copy=False)
+        for arr, placement in blocks
+    ]
+    return pd.concat(parts, axis=1, copy=False)
+
+
+def allocate_frame(ohlcv):
+    """
+    一次配置完整流程需要的 DataFrame (所有欄位預先建立)
+
+    每種 dtype 配置一個 (欄位數 × K 棒數) 的 2D ndarray,每個欄位是其中一列,
+    DataFrame 直接包裝這些陣列 (每種 dtype 一個區塊,不複製)。
+    之後各階段以 inplace=True 經 utils.set_column 寫入對應的列,
+    不再產生新的欄位、區塊或整張表的複本。
+
+    Args:
+        ohlcv: ensure_ohlcv 格式的 DataFrame
+
+    Returns:
+        DataFrame: 預先配置好的資料表
+    """
+    n = len(ohlcv)
+    groups = {}
+    for name, dtype, default in PIPELINE_COLUMNS:
+        groups.setdefault(np.dtype(dtype), []).append((name, default))
+
+    blocks, columns, slots = [], [], {}
+    for dtype, cols in groups.items():
+        arr = np.empty((len(cols), n), dtype=dtype)
+        for row, (name, default) in enumerate(cols):
+            arr[row] = ohlcv[name].to_numpy(dtype=dtype) if name in ohlcv.columns else default
+            slots[name] = (arr, row)
+        blocks.append((arr, np.arange(len(columns), len(columns) + len(cols))))
+        columns.extend(name for name, _ in cols)
+
+    df = _wrap_blocks(blocks, ohlcv.index, columns)
+    bind_column_slots(df, slots)
+    return df
+
+
+def run_pipeline(ohlcv, p, stock_type="DEFAULT", inplace=True, backtest=True, compact=None,
+                 benchmark=None):
+    """
+    執行單檔股票的完整分析流程
+
+    ensure_schema -> add_indicators -> generate_signals -> backtest_fsm
+
+    Args:
+        ohlcv: ensure_ohlcv 格式的 DataFrame
+        p: 參數字典
+        stock_type: 股票類型
+        inplace: True 時只配置一次資料表,各階段直接寫入;
+                 False 時沿用各函數逐步複製的原始流程
+        backtest: 是否執行回測
+        compact: 輸出表轉為精簡型別 (預設讀取 p["COMPACT_DTYPES"])
+        benchmark: 基準收盤價 Series (見 backtest_fsm)
+
+    Returns:
+        tuple: (df, 回測結果 dict 或 None)
+    """
+    if inplace:
+        df = allocate_frame(ohlcv)
+        ensure_schema(df, inplace=True)
+        add_indicators(df, p, inplace=True)
+        generate_signals(df, p, mode="OldWang", stock_type=stock_type, inplace=True)
+    else:
+        df = ensure_schema(ohlcv)
+        df = add_indicators(df, p)
+        df = generate_signals(df, p, mode="OldWang", stock_type=stock_type)
+
+    if compact is None:
+        compact = p.get("COMPACT_DTYPES", False)
+
+    if not backtest:
+        return (compact_frame(df) if compact else df), None
+
+    result = backtest_fsm(df, p, stock_type=stock_type, inplace=inplace, benchmark=benchmark)
+    if compact:
+        result["df"] = compact_frame(result["df"])
+    return result["df"], result
+
+
+def analyze_ticker(ohlcv, p, stock_type="DEFAULT", ticker=None, stages=None, data_key=None):
+    """
+    單檔訊號流程 (不含回測): ensure_schema -> add_indicators -> generate_signals
+
+    模組層級函數,可交給 parallel.map_ordered 以行程池執行。
+
+    Args:
+        ohlcv: ensure_ohlcv 格式的 DataFrame
+        p: 參數字典
+        stock_type: 股票類型
+        ticker: 股票代號 (僅用於效能紀錄)
+        stages: StagedPipeline 實例 (提供時各階段走快取,回傳值請勿直接修改)
+        data_key: 搭配 stages 使用的資料識別鍵
+
+    Returns:
+        DataFrame: 含指標與訊號的資料
+    """
+    if stages is not None:
+        df, _ = stages.run(ohlcv, p, stock_type, data_key=data_key, backtest=False, ticker=ticker)
+        return df
+
+    with instrument.stage("ensure_schema", ticker):
+        df = ensure_schema(ohlcv)
+    with instrument.stage("add_indicators", ticker):
+        df = add_indicators(df, p)
+    with instrument.stage("generate_signals", ticker):
+        df = generate_signals(df, p, mode="OldWang", stock_type=stock_type)
+    return df
+
+
+# =========================================================
+# 分階段快取 (參數變動時只重算受影響的下游階段)
+#
+# OHLCV -> indicators -> signals -> backtest
+# 每個階段的快取鍵 = 上游階段的鍵 + 本階段讀取的參數子集雜湊,
+# 上游重算時下游的鍵自然跟著改變。
+# =========================================================
+STAGE_KEYS = {
+    "indicators": INDICATOR_KEYS,
+    "signals": SIGNAL_KEYS,
+    "backtest": BACKTEST_KEYS,
+}
+
+
+def stage_params(p, stage):
+    """取出某階段讀取的參數子集"""
+    return {k: p.get(k) for k in STAGE_KEYS[stage]}
+
+
+class StagedPipeline:
+    """
+    分階段記憶化的單檔流程
+
+    調整 FEE_SELL 只重跑回測,調整 BIAS_THRESHOLD 只重跑訊號與回測,
+    均線等指標直接沿用快取。回傳的 DataFrame 與快取共用,請勿直接修改。
+
+    Args:
+        cache: ResultCache 實例 (預設依 config.CACHE_MAX_MB 限制總容量)
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or ResultCache(max_bytes=config.CACHE_MAX_MB * 1024 * 1024)
+        self.computed = {stage: 0 for stage in ("schema",) + tuple(STAGE_KEYS)}
+
+    def _memo(self, key, stage, ticker, fn):
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            with instrument.stage(stage, ticker):
+                value = fn()
+            self.cache.put(key, value)
+            self.computed[stage] += 1
+        return value
+
+    def keys(self, data_key, p, stock_type="DEFAULT"):
+        """
+        各階段的快取鍵
+
+        Returns:
+            dict: {"schema": ..., "indicators": ..., "signals": ..., "backtest": ...}
+        """
+        k_schema = ("schema", data_key)
+        k_ind = ("indicators", k_schema, params_hash(stage_params(p, "indicators")))
+        k_sig = ("signals", k_ind, params_hash(stage_params(p, "signals")), stock_type)
+        k_bt = ("backtest", k_sig, params_hash(stage_params(p, "backtest")))
+        return {"schema": k_schema, "indicators": k_ind, "signals": k_sig, "backtest": k_bt}
+
+    def run(self, ohlcv, p, stock_type="DEFAULT", data_key=None, backtest=True, ticker=None):
+        """
+        執行流程,已計算過的階段直接取快取
+
+        Args:
+            ohlcv: ensure_ohlcv 格式的 DataFrame
+            p: 參數字典
+            stock_type: 股票類型
+            data_key: 資料識別鍵 (如 (ticker, start, end));
+                      None 時以資料內容雜湊
+            backtest: 是否執行回測
+            ticker: 股票代號 (僅用於效能紀錄)
+
+        Returns:
+            tuple: (df, 回測結果 dict 或 None)
+        """
+        if data_key is None:
+            data_key = frame_hash(ohlcv)
+        keys = self.keys(data_key, p, stock_type)
+
+        df = self._memo(keys["schema"], "schema", ticker, lambda: ensure_schema(ohlcv))
+        df = self._memo(keys["indicators"], "indicators", ticker,
+                        lambda: add_indicators(df, p))
+        df = self._memo(keys["signals"], "signals", ticker,
+                        lambda: generate_signals(df, p, mode="OldWang", stock_type=stock_type))
+        if not backtest:
+            return df, None
+
+        result = self._memo(keys["backtest"], "backtest", ticker,
+                            lambda: backtest_fsm(df, p, stock_type=stock_type))
+        return result["df"], result
+
+    def stats(self):
+        """各階段實際計算次數與快取統計"""
+        return {"computed": dict(self.computed), **self.cache.stats()}
+
+
+_MISSING = object()
+
+
+def profile_pipeline(ohlcv, p, stock_type="DEFAULT"):
+    """
+    比較複製流程與預先配置流程的記憶體用量
+
+    Args:
+        ohlcv: ensure_ohlcv 格式的 DataFrame
+        p: 參數字典
+        stock_type: 股票類型
+
+    Returns:
+        DataFrame: 每種模式一列,包含
+            peak_bytes (tracemalloc 峰值), retained_bytes (結束時仍占用),
+            allocations (結束時仍存在的配置數),
+            column_allocations (其中至少一整欄大小的配置數,即欄位 / 整表的複本),
+            frame_bytes (輸出表大小), n_blocks (輸出表記憶體區塊數), seconds
+    """
+    column_bytes = len(ohlcv) * np.dtype(np.float64).itemsize
+    rows = []
+    for mode, inplace in (("copy", False), ("inplace", True)):
+        gc.collect()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        df, _ = run_pipeline(ohlcv, p, stock_type=stock_type, inplace=inplace, compact=False)
+        seconds = time.perf_counter() - t0
+        current, peak = tracemalloc.get_traced_memory()
+        sizes = [t.size for t in tracemalloc.take_snapshot().traces]
+        tracemalloc.stop()
+
+        rows.append({
+            "mode": mode,
+            "peak_bytes": peak,
+            "retained_bytes": current,
+            "allocations": len(sizes),
+            "column_allocations": sum(size >= column_bytes for size in sizes),
+            "frame_bytes": int(df.memory_usage(deep=True).sum()),
+            "n_blocks": getattr(df._mgr, "nblocks", np.nan),
+            "seconds": seconds,
+        })
+        del df
+    return pd.DataFrame(rows).set_index("mode")
@@ -0,0 +1,258 @@
+# =========================================================
+# 投組回測 - 全部股票共用一筆資金
+#
+# backtest_fsm 假設每檔都投入全部資金,各檔報酬無法直接加總。
+# 這裡在 (日期 × 股票) 陣列上逐根 K 棒模擬,每根只做向量運算:
+# 1. 持有中的股票收到賣出訊號 -> 以收盤價賣出 (扣 FEE_SELL)
+# 2. 空手且不在冷卻期的股票收到買進訊號 -> 依剩餘名額與資金配置
+#    (名額不足時 Tech_Score 高者優先),以收盤價買進 (扣 FEE_BUY)
+# 3. 權益 = 現金 + 持股市值 (當天無資料的股票沿用前一天收盤價)
+# 股數不取整 (視同可買零股)。
+# =========================================================
+import numpy as np
+import pandas as pd
+
+from . import config
+from .backtest import to_panel
+from .risk import align_benchmark, risk_metrics
+
+SIZING_MODES = ("equal", "atr", "score")
+
+_PANEL_COLS = ("Close", "Buy_Signal", "Sell_Signal", "ATRp", "Tech_Score",
+               "Buy_Reason", "Sell_Reason_Raw")
+
+
+def _position_values(mode, equity, max_positions, atr, score, atr_risk, max_weight):
+    """
+    新建倉位的目標金額 (扣手續費前)
+
+    - equal: 權益 / max_positions
+    - atr: 權益 × atr_risk / ATRp (1 個 ATR 的波動約為權益的 atr_risk),
+           上限 max_weight × 權益
+    - score: 權益 / max_positions × Tech_Score / 100
+    """
+    slot = equity / max_positions
+    if mode == "equal":
+        return np.full(len(score), slot)
+    if mode == "atr":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = equity * atr_risk / atr
+        # ATR 缺值 (上市初期) 時退回等權重
+        value = np.where(np.isfinite(value) & (value > 0), value, slot)
+        return np.minimum(value, max_weight * equity)
+    return slot * np.clip(np.nan_to_num(score, nan=0.0), 0, 100) / 100
+
+
+def simulate_portfolio(close, buy, sell, p=None, atr=None, score=None, sizing=None,
+                       max_positions=None, initial_capital=1.0, tickers=None, index=None,
+                       buy_reason=None, sell_reason=None, benchmark=None):
+    """
+    共用資金的投組回測 (陣列版)
+
+    Args:
+        close: 收盤價 2D 陣列 (T × N,NaN = 當天無資料)
+        buy: 買進訊號 2D 布林陣列
+        sell: 賣出訊號 2D 布林陣列
+        p: 參數字典 (預設 config.P;讀取 FEE_BUY / FEE_SELL / EXIT_COOLDOWN_DAYS
+           與 PORTFOLIO_* 參數)
+        atr: ATRp 2D 陣列 (sizing="atr" 時必要)
+        score: Tech_Score 2D 陣列 (名額不足時的排序依據,sizing="score" 時必要)
+        sizing: "equal" / "atr" / "score" (預設 p["PORTFOLIO_SIZING"])
+        max_positions: 同時持有上限 (預設 p["PORTFOLIO_MAX_POSITIONS"])
+        initial_capital: 初始資金
+        tickers: 股票代號列表
+        index: 日期索引 (長度 T)
+        buy_reason / sell_reason: 原因 2D 陣列 (選用,寫入交易明細)
+        benchmark: 基準收盤價 1D 陣列 (長度 T,風險指標用;預設不計算追蹤誤差)
+
+    Returns:
+        dict:
+            equity / cash / exposure: 權益、現金、持股市值比例 (Series)
+            holdings: 各檔持股市值 (T × N ndarray)
+            trades: 交易明細 (DataFrame)
+            stats: 績效統計 (total_return / dd / trades / winrate / profit_factor /
+                   avg_positions / 以及 risk.risk_metrics 的各項指標)
+
+    Raises:
+        ValueError: sizing 不支援,或缺少對應的 ATRp / Tech_Score
+    """
+    p = p if p is not None else config.P
+    sizing = sizing or p.get("PORTFOLIO_SIZING", "equal")
+    max_positions = int(max_positions or p.get("PORTFOLIO_MAX_POSITIONS", 10))
+    if sizing not in SIZING_MODES:
+        raise ValueError(f"不支援的資金配置方式: {sizing} (可用: {SIZING_MODES})")
+    if sizing == "atr" and atr is None:
+        raise ValueError("sizing='atr' 需要 ATRp 陣列")
+    if sizing == "score" and score is None:
+        raise ValueError("sizing='score' 需要 Tech_Score 陣列")
+    if max_positions < 1:
+        raise ValueError(f"max_positions 必須 >= 1: {max_positions}")
+
+    close = np.asarray(close, dtype=float)
+    buy = np.asarray(buy, dtype=bool)
+    sell = np.asarray(sell, dtype=bool)
+    T, N = close.shape
+    atr = np.asarray(atr, dtype=float) if atr is not None else np.full((T, N), np.nan)
+    score = np.asarray(score, dtype=float) if score is not None else np.zeros((T, N))
+    tickers = list(tickers) if tickers is not None else list(range(N))
+    index = index if index is not None else pd.RangeIndex(T)
+
+    fee_buy = p["FEE_BUY"]
+    fee_sell = p["FEE_SELL"]
+    exit_cooldown = p.get("EXIT_COOLDOWN_DAYS", 5)
+    atr_risk = p.get("PORTFOLIO_ATR_RISK", 0.01)
+    max_weight = p.get("PORTFOLIO_MAX_WEIGHT", 0.2)
+
+    valid = ~np.isnan(close)
+
+    # 狀態向量 (每檔一格)
+    local_idx = np.zeros(N, dtype=np.int64)      # 該股票目前是第幾根 K 棒 (冷卻期以此計算)
+    last_price = np.full(N, np.nan)
+    shares = np.zeros(N)
+    cost = np.zeros(N)                           # 建倉時投入的現金
+    entry_row = np.full(N, -1, dtype=np.int64)
+    last_exit_idx = np.full(N, -999, dtype=np.int64)
+    cash = float(initial_capital)
+
+    equity = np.empty(T)
+    cash_hist = np.empty(T)
+    holdings = np.zeros((T, N))
+    n_held = np.zeros(T, dtype=np.int64)
+
+    rec_ticker, rec_entry, rec_exit, rec_cost, rec_proceeds = [], [], [], [], []
+
+    with np.errstate(invalid="ignore"):
+        for t in range(T):
+            v = valid[t]
+            c = close[t]
+            last_price = np.where(v, c, last_price)
+            active = v & (local_idx >= 1)        # 每檔的第一根 K 棒不交易
+            held = shares > 0
+
+            # ========== 賣出 ==========
+            sell_now = held & active & sell[t]
+            if sell_now.any():
+                cols = np.flatnonzero(sell_now)
+                proceeds = shares[cols] * c[cols] * (1 - fee_sell)
+                cash += proceeds.sum()
+                rec_ticker.append(cols)
+                rec_entry.append(entry_row[cols])
+                rec_exit.append(np.full(len(cols), t))
+                rec_cost.append(cost[cols])
+                rec_proceeds.append(proceeds)
+                shares[cols] = 0.0
+                cost[cols] = 0.0
+                entry_row[cols] = -1
+                last_exit_idx[cols] = local_idx[cols]
+
+            # ========== 買進 ==========
+            slots = max_positions - int((shares > 0).sum())
+            buy_now = (active & ~held & buy[t]
+                       & ((local_idx - last_exit_idx) >= exit_cooldown))
+            if slots > 0 and buy_now.any() and cash > 0:
+                cols = np.flatnonzero(buy_now)
+                if len(cols) > slots:
+                    # 名額不足: Tech_Score 高者優先,同分依股票順序
+                    rank = np.argsort(-np.nan_to_num(score[t, cols], nan=-np.inf), kind="stable")
+                    cols = np.sort(cols[rank[:slots]])
+                total = cash + np.nansum(shares * last_price)
+                value = _position_values(sizing, total, max_positions, atr[t, cols],
+                                         score[t, cols], atr_risk, max_weight)
+                need = value.sum()
+                if need > cash:
+                    value *= cash / need         # 資金不足時等比例縮小
+                keep = value > 0
+                cols, value = cols[keep], value[keep]
+                shares[cols] = value * (1 - fee_buy) / c[cols]
+                cost[cols] = value
+                entry_row[cols] = t
+                cash -= value.sum()
+
+            held_value = shares * last_price
+            holdings[t] = np.where(shares > 0, held_value, 0.0)
+            cash_hist[t] = cash
+            equity[t] = cash + holdings[t].sum()
+            n_held[t] = int((shares > 0).sum())
+            local_idx += v
+
+    def _concat(parts, dtype):
+        return np.concatenate(parts).astype(dtype) if parts else np.array([], dtype=dtype)
+
+    rec_ticker = _concat(rec_ticker, np.int64)
+    rec_entry = _concat(rec_entry, np.int64)
+    rec_exit = _concat(rec_exit, np.int64)
+    rec_cost = _concat(rec_cost, float)
+    rec_proceeds = _concat(rec_proceeds, float)
+    net_ret = rec_proceeds / rec_cost - 1
+
+    trades = pd.DataFrame({
+        "ticker": np.asarray(tickers, dtype=object)[rec_ticker],
+        "entry_date": np.asarray(index)[rec_entry],
+        "exit_date": np.asarray(index)[rec_exit],
+        "entry_price": close[rec_entry, rec_ticker],
+        "exit_price": close[rec_exit, rec_ticker],
+        "cost": rec_cost,
+        "pnl": rec_proceeds - rec_cost,
+        "net_return": net_ret,
+    })
+    if buy_reason is not None:
+        trades["buy_reason"] = np.asarray(buy_reason)[rec_entry, rec_ticker]
+    if sell_reason is not None:
+        trades["sell_reason"] = np.asarray(sell_reason)[rec_exit, rec_ticker]
+
+    curve = equity / initial_capital
+    gross_profit = trades["pnl"][trades["pnl"] > 0].sum()
+    gross_loss = -trades["pnl"][trades["pnl"] < 0].sum()
+    stats = {
+        "total_return": float(curve[-1] - 1) if T else 0.0,
+        "dd": float((curve / np.maximum.accumulate(curve) - 1).min()) if T else 0.0,
+        "trades": len(trades),
+        "winrate": float((net_ret > 0).mean()) if len(trades) else 0,
+        "profit_factor": float(gross_profit / gross_loss) if gross_loss > 0 else 0,
+        "avg_positions": float(n_held.mean()) if T else 0.0,
+        "in_market": float((n_held > 0).mean()) if T else 0.0,
+    }
+    if T > 1:
+        stats.update(risk_metrics(curve, benchmark))
+
+    return {
+        "equity": pd.Series(equity, index=index),
+        "cash": pd.Series(cash_hist, index=index),
+        "exposure": pd.Series(1 - cash_hist / equity, index=index),
+        "holdings": holdings,
+        "tickers": tickers,
+        "trades": trades,
+        "stats": stats,
+    }
+
+
+def backtest_portfolio(frames, p=None, sizing=None, max_positions=None,
+                       initial_capital=1.0, benchmark=None):
+    """
+    多檔訊號表的投組回測
+
+    Args:
+        frames: {ticker: generate_signals 輸出的 DataFrame}
+        p: 參數字典 (預設 config.P)
+        sizing: "equal" / "atr" / "score" (預設 p["PORTFOLIO_SIZING"])
+        max_positions: 同時持有上限 (預設 p["PORTFOLIO_MAX_POSITIONS"])
+        initial_capital: 初始資金
+        benchmark: 基準收盤價 Series (如 risk.load_benchmark 的輸出)
+
+    Returns:
+        dict: 同 simulate_portfolio
+    """
+    frames = {t: df for t, df in frames.items() if df is not None and len(df)}
+    if not frames:
+        raise ValueError("沒有可回測的股票資料")
+    columns = [c for c in _PANEL_COLS if all(c in df.columns for df in frames.values())]
+    index, tickers, panel = to_panel(frames, columns=columns)
+    bench = align_benchmark(benchmark, index) if benchmark is not None else None
+    return simulate_portfolio(
+        panel["Close"], panel["Buy_Signal"], panel["Sell_Signal"], p,
+        atr=panel.get("ATRp"), score=panel.get("Tech_Score"),
+        sizing=sizing, max_positions=max_positions, initial_capital=initial_capital,
+        tickers=tickers, index=index,
+        buy_reason=panel.get("Buy_Reason"), sell_reason=panel.get("Sell_Reason_Raw"),
+        benchmark=bench,
+    )
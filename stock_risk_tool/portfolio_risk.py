@@ -0,0 +1,381 @@
+# =========================================================
+# 投組風險 - 跨股票相關性與 VaR / CVaR
+#
+# 1. RollingCovariance: 固定長度的報酬環狀緩衝區 + 累計和,
+#    每根新 K 棒以 rank-1 (或整批) 更新共變異數,不必整段重算;
+#    記憶體固定為 window × N 的緩衝區加上 N × N 的累計矩陣
+# 2. 以目前持倉 (各檔最新的 Position) 組成權重,
+#    計算歷史模擬法與參數法 (常態) 的 VaR / CVaR
+# =========================================================
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+# 每推進多少根 K 棒就由緩衝區重新累加一次,避免累計和的浮點誤差持續放大
+# (以 window 為單位,攤提後每根仍為 O(N^2))
+_RESYNC_WINDOWS = 4
+
+# 累計矩陣分段更新的列數 (限制暫存陣列大小,避免配置 N × N 的外積)
+_ROW_CHUNK = 256
+
+
+def returns_from_closes(close):
+    """
+    收盤價矩陣轉為單期報酬 (K 棒 × 股票)
+
+    當天無資料 (NaN) 的報酬記為 0,等同沿用前一天收盤價。
+
+    Args:
+        close: 收盤價 2D 陣列或 DataFrame (欄位為股票)
+
+    Returns:
+        ndarray: shape (T - 1, N)
+    """
+    c = pd.DataFrame(close).ffill().to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = c[1:] / c[:-1] - 1
+    r[~np.isfinite(r)] = 0.0
+    return r
+
+
+class RollingCovariance:
+    """
+    滾動共變異數 / 相關係數矩陣 (增量更新)
+
+    保留最近 window 根 K 棒的報酬,並維護
+    S1 = Σx (N) 與 S2 = Σx xᵀ (N × N):
+    新 K 棒加入、最舊一根移出時只做兩次外積,
+    整批加入時改用一次矩陣乘法。
+    報酬中的 NaN 視為 0 (當天無交易)。
+
+    Args:
+        tickers: 股票代號列表 (矩陣的列 / 欄順序)
+        window: 視窗長度 (K 棒,預設 config.RISK_WINDOW)
+        dtype: 累計矩陣的型別 (float32 可讓數千檔時的記憶體減半)
+    """
+
+    def __init__(self, tickers, window=None, dtype=np.float64):
+        window = window or config.RISK_WINDOW
+        if window < 2:
+            raise ValueError(f"視窗長度必須 >= 2: {window}")
+        self.tickers = list(tickers)
+        self.window = int(window)
+        n = len(self.tickers)
+        self._buffer = np.zeros((self.window, n), dtype=dtype)
+        self._sum = np.zeros(n, dtype=np.float64)
+        self._sum_sq = np.zeros((n, n), dtype=dtype)
+        self._pos = 0            # 下一筆寫入的位置
+        self.count = 0           # 緩衝區內的有效筆數 (<= window)
+        self.updates = 0         # 累計更新次數
+        self._since_resync = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        """緩衝區與累計矩陣佔用的記憶體 (bytes)"""
+        return self._buffer.nbytes + self._sum.nbytes + self._sum_sq.nbytes
+
+    @classmethod
+    def from_closes(cls, close, window=None, tickers=None, dtype=np.float64):
+        """
+        由收盤價歷史建立 (只保留最後 window 根報酬)
+
+        Args:
+            close: 收盤價 DataFrame (欄位為股票代號) 或 2D 陣列
+            window: 視窗長度
+            tickers: 股票代號 (close 為陣列時使用)
+            dtype: 累計矩陣型別
+
+        Returns:
+            RollingCovariance
+        """
+        if tickers is None:
+            tickers = list(close.columns) if isinstance(close, pd.DataFrame) \
+                else list(range(np.shape(close)[1]))
+        cov = cls(tickers, window, dtype)
+        cov.update_many(returns_from_closes(close))
+        return cov
+
+    def update(self, returns):
+        """
+        加入一根 K 棒的報酬 (rank-1 更新)
+
+        Args:
+            returns: 長度 N 的報酬向量 (順序同 tickers)
+        """
+        x = np.nan_to_num(np.asarray(returns, dtype=float), nan=0.0)
+        if x.shape != self._sum.shape:
+            raise ValueError(f"報酬長度 {x.shape} 與股票數 {self._sum.shape} 不符")
+        if self.count == self.window:
+            # 加入 x、移出最舊一根: S2 += x xᵀ - old oldᵀ (合併為一次 rank-2 更新)
+            old = self._buffer[self._pos].astype(float)
+            self._sum -= old
+            self._accumulate(np.stack([x, old]), np.stack([x, -old]))
+        else:
+            self.count += 1
+            self._accumulate(x[None, :], x[None, :])
+        self._buffer[self._pos] = x
+        self._sum += x
+        self._pos = (self._pos + 1) % self.window
+        self._advance(1)
+
+    def update_many(self, returns):
+        """
+        一次加入多根 K 棒 (以矩陣乘法取代逐根外積)
+
+        Args:
+            returns: shape (k, N) 的報酬矩陣,依時間排序
+        """
+        block = np.nan_to_num(np.asarray(returns, dtype=float), nan=0.0)
+        if block.ndim != 2 or block.shape[1] != len(self._sum):
+            raise ValueError(f"報酬矩陣形狀 {block.shape} 與股票數 {len(self._sum)} 不符")
+        n_new = len(block)
+        # 超過一個視窗的部分最後會被移出,直接略過
+        block = block[-self.window:]
+        k = len(block)
+        if k == 0:
+            return
+
+        slots = (self._pos + np.arange(k)) % self.window
+        n_evict = max(0, self.count + k - self.window)
+        # 被覆蓋的都是最舊的資料 (緩衝區已滿時即為將寫入的位置)
+        evict_slots = (self._pos - self.count + np.arange(n_evict)) % self.window
+        old = self._buffer[evict_slots].astype(float)
+        self._sum += block.sum(axis=0) - old.sum(axis=0)
+        self._accumulate(np.vstack([block, old]), np.vstack([block, -old]))
+        self._buffer[slots] = block
+        self.count = min(self.window, self.count + k)
+        self._pos = (self._pos + k) % self.window
+        self._advance(n_new)
+
+    def _accumulate(self, u, v):
+        """S2 += uᵀ v,依列分段計算 (每段暫存 _ROW_CHUNK × N)"""
+        for a in range(0, len(self._sum), _ROW_CHUNK):
+            b = a + _ROW_CHUNK
+            self._sum_sq[a:b] += (u[:, a:b].T @ v).astype(self._sum_sq.dtype, copy=False)
+
+    def _advance(self, k):
+        self.updates += k
+        self._since_resync += k
+        if self._since_resync >= _RESYNC_WINDOWS * self.window:
+            self.resync()
+
+    def resync(self):
+        """由緩衝區重新計算累計和 (消除增量更新累積的浮點誤差)"""
+        data = self.history().astype(float)
+        self._sum = data.sum(axis=0)
+        self._sum_sq[:] = 0
+        self._accumulate(data, data)
+        self._since_resync = 0
+
+    def history(self):
+        """視窗內的報酬,依時間排序 (count × N)"""
+        if self.count < self.window:
+            return self._buffer[:self.count].copy()
+        return np.roll(self._buffer, -self._pos, axis=0)
+
+    def mean(self):
+        """視窗內各檔的平均報酬"""
+        if self.count == 0:
+            return np.full(len(self._sum), np.nan)
+        return self._sum / self.count
+
+    def covariance(self):
+        """
+        樣本共變異數矩陣 (ddof=1)
+
+        Returns:
+            ndarray: N × N;資料少於 2 筆時全為 NaN
+        """
+        n = self.count
+        if n < 2:
+            return np.full(self._sum_sq.shape, np.nan)
+        cov = (self._sum_sq - np.outer(self._sum, self._sum) / n) / (n - 1)
+        return (cov + cov.T) / 2
+
+    def correlation(self):
+        """相關係數矩陣 (波動為 0 的股票該列 / 欄為 NaN)"""
+        cov = self.covariance()
+        std = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.outer(std, std)
+        corr[~np.isfinite(corr)] = np.nan
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return corr
+
+    def correlation_frame(self):
+        """相關係數矩陣 (DataFrame,列 / 欄為股票代號)"""
+        return pd.DataFrame(self.correlation(), index=self.tickers, columns=self.tickers)
+
+
+def top_correlations(corr, n=20, tickers=None):
+    """
+    相關性最高的股票組合 (檢查持股集中度)
+
+    Args:
+        corr: 相關係數矩陣 (ndarray 或 DataFrame)
+        n: 取前幾組
+        tickers: 股票代號 (corr 為陣列時使用)
+
+    Returns:
+        DataFrame: a / b / corr,依相關係數由高到低排序
+    """
+    if isinstance(corr, pd.DataFrame):
+        tickers = list(corr.columns)
+        corr = corr.to_numpy()
+    tickers = list(tickers) if tickers is not None else list(range(len(corr)))
+    i, j = np.triu_indices(len(corr), k=1)
+    values = corr[i, j]
+    keep = ~np.isnan(values)
+    i, j, values = i[keep], j[keep], values[keep]
+    top = np.argsort(-values, kind="stable")[:n]
+    return pd.DataFrame({
+        "a": np.asarray(tickers, dtype=object)[i[top]],
+        "b": np.asarray(tickers, dtype=object)[j[top]],
+        "corr": values[top],
+    })
+
+
+# =========================================================
+# 持倉權重
+# =========================================================
+def current_positions(frames):
+    """
+    各檔最新一根 K 棒的持倉狀態
+
+    Args:
+        frames: {ticker: 含 Position 欄位的 DataFrame (backtest_fsm 的 result["df"])}
+
+    Returns:
+        Series: index 為股票代號,值為 0 / 1
+    """
+    return pd.Series({
+        t: int(df["Position"].iloc[-1]) if df is not None and len(df) else 0
+        for t, df in frames.items()
+    }, dtype=int)
+
+
+def position_weights(positions, tickers, values=None):
+    """
+    持倉轉為投組權重 (順序同 tickers,總和為 1)
+
+    Args:
+        positions: 持倉狀態 (Series / dict,ticker -> 0 / 1)
+        tickers: 權重向量的股票順序 (通常為 RollingCovariance.tickers)
+        values: 各檔持倉市值 (選用,預設持有的股票等權重)
+
+    Returns:
+        ndarray: 長度 len(tickers);沒有任何持倉時全為 0
+    """
+    positions = pd.Series(positions, dtype=float).reindex(tickers).fillna(0.0)
+    w = (positions > 0).astype(float)
+    if values is not None:
+        w *= pd.Series(values, dtype=float).reindex(tickers).fillna(0.0)
+    w = w.to_numpy()
+    total = w.sum()
+    return w / total if total > 0 else w
+
+
+# =========================================================
+# VaR / CVaR (以正值表示損失比例)
+# =========================================================
+def historical_var(returns, weights, confidence=None, horizon=1):
+    """
+    歷史模擬法 VaR / CVaR
+
+    以視窗內每根 K 棒的報酬套用目前權重,取損失分布的分位數;
+    多日 horizon 以 sqrt(horizon) 放大。
+
+    Args:
+        returns: 報酬矩陣 (T × N,如 RollingCovariance.history())
+        weights: 權重向量 (長度 N)
+        confidence: 信賴水準 (預設 config.VAR_CONFIDENCE)
+        horizon: 持有天數
+
+    Returns:
+        dict: var / cvar / observations
+    """
+    confidence = confidence or config.VAR_CONFIDENCE
+    pnl = np.nan_to_num(np.asarray(returns, dtype=float), nan=0.0) @ np.asarray(weights, dtype=float)
+    if len(pnl) == 0:
+        return {"var": np.nan, "cvar": np.nan, "observations": 0}
+    losses = np.sort(-pnl)
+    var = float(np.quantile(losses, confidence))
+    tail = losses[losses >= var]
+    scale = np.sqrt(horizon)
+    return {
+        "var": float(var * scale),
+        "cvar": float(tail.mean() * scale),
+        "observations": len(pnl),
+    }
+
+
+def parametric_var(cov, weights, mean=None, confidence=None, horizon=1):
+    """
+    參數法 (常態分配) VaR / CVaR 與各檔的風險貢獻
+
+    VaR = z·σ - μ,CVaR = σ·φ(z) / (1 - confidence) - μ,
+    其中 σ = sqrt(wᵀΣw)。component VaR 為各檔對 z·σ 的貢獻 (總和 = z·σ)。
+
+    Args:
+        cov: 共變異數矩陣 (N × N)
+        weights: 權重向量
+        mean: 各檔平均報酬 (選用,預設 0)
+        confidence: 信賴水準 (預設 config.VAR_CONFIDENCE)
+        horizon: 持有天數 (平均乘 horizon、標準差乘 sqrt(horizon))
+
+    Returns:
+        dict: var / cvar / volatility / component (各檔風險貢獻)
+    """
+    confidence = confidence or config.VAR_CONFIDENCE
+    w = np.asarray(weights, dtype=float)
+    cov = np.nan_to_num(np.asarray(cov, dtype=float), nan=0.0)
+    sigma_w = cov @ w
+    sigma = float(np.sqrt(max(w @ sigma_w, 0.0)) * np.sqrt(horizon))
+    mu = float(np.nan_to_num(mean, nan=0.0) @ w) * horizon if mean is not None else 0.0
+
+    dist = NormalDist()
+    z = dist.inv_cdf(confidence)
+    component = w * sigma_w * np.sqrt(horizon) * z / sigma if sigma > 0 else np.zeros_like(w)
+    return {
+        "var": z * sigma - mu,
+        "cvar": sigma * dist.pdf(z) / (1 - confidence) - mu,
+        "volatility": sigma,
+        "component": component,
+    }
+
+
+def portfolio_var(cov_tracker, positions, values=None, confidence=None, horizon=1):
+    """
+    目前持倉的 VaR / CVaR 摘要 (歷史模擬法與參數法)
+
+    Args:
+        cov_tracker: RollingCovariance
+        positions: 持倉狀態 (current_positions 的輸出)
+        values: 各檔持倉市值 (選用,預設等權重)
+        confidence: 信賴水準
+        horizon: 持有天數
+
+    Returns:
+        dict:
+            holdings: 持有的股票數
+            historical / parametric: 各自的 var / cvar
+            contributions: 各檔參數法風險貢獻 (Series,只列持有的股票)
+    """
+    w = position_weights(positions, cov_tracker.tickers, values)
+    hist = historical_var(cov_tracker.history(), w, confidence, horizon)
+    param = parametric_var(cov_tracker.covariance(), w, cov_tracker.mean(), confidence, horizon)
+    held = w > 0
+    return {
+        "holdings": int(held.sum()),
+        "historical": {"var": hist["var"], "cvar": hist["cvar"]},
+        "parametric": {"var": param["var"], "cvar": param["cvar"]},
+        "contributions": pd.Series(
+            param["component"][held], index=np.asarray(cov_tracker.tickers, dtype=object)[held]
+        ).sort_values(ascending=False),
+    }
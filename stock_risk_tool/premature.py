@@ -0,0 +1,161 @@
+# =========================================================
+# 賣在起漲前分析 - 多個觀察期一次計算
+#
+# detect_sell_before_rise 一次只能檢查一組 (lookahead, threshold),
+# 這裡把 1~N 根的未來最大漲幅算成 (K 棒 × 觀察期) 矩陣,
+# 再依賣出原因統計各 (觀察期, 門檻) 的「賣太早」比例,
+# 用來調整兩層式賣出邏輯,不必反覆重跑 generate_signals。
+# =========================================================
+import numpy as np
+import pandas as pd
+
+from .compact import SELL_REASONS
+from .fsm import run_fsm
+from .rolling import multi_forward_max
+
+DEFAULT_HORIZONS = tuple(range(1, 21))
+DEFAULT_THRESHOLDS = (0.01, 0.02, 0.03, 0.05)
+
+
+def forward_return_matrix(df, horizons=DEFAULT_HORIZONS, use_high=False,
+                          price_col="Close", high_col="High", partial=False):
+    """
+    未來最大漲幅矩陣
+
+    第 j 欄 = 之後 horizons[j] 根 K 棒內的最高價 (或收盤) / 當日收盤 - 1。
+    資料末端之後不足 horizons[j] 根的列為 NaN (觀察期不完整,漲幅會被低估);
+    partial=True 時改用剩餘的 K 棒計算,與 detect_sell_before_rise(lookahead=horizons[j])
+    的 rise_pct 相同。
+
+    Args:
+        df: 含價格的 DataFrame
+        horizons: 觀察期列表 (K 棒數)
+        use_high: 是否以最高價計算未來漲幅
+        price_col: 當前價格欄位
+        high_col: 最高價欄位
+        partial: 是否保留觀察期不完整的列
+
+    Returns:
+        ndarray: shape (len(df), len(horizons))
+    """
+    future = df[high_col if use_high else price_col].to_numpy(dtype=float)
+    n = len(future)
+    nxt = np.empty_like(future)
+    nxt[:-1] = future[1:]
+    nxt[-1:] = np.nan
+    rise = multi_forward_max(nxt, horizons)
+    rise /= df[price_col].to_numpy(dtype=float)[:, None]
+    rise -= 1
+    if not partial:
+        # 第 i 列之後只剩 n - 1 - i 根
+        remaining = (n - 1 - np.arange(n))[:, None]
+        rise[remaining < np.asarray(horizons)[None, :]] = np.nan
+    return rise
+
+
+def _exit_mask(df, p):
+    """回測實際出場的 K 棒 (與 backtest_fsm 相同的持倉序列)"""
+    _, pos, _, exit_idx, _ = run_fsm(
+        df["Close"].to_numpy(dtype=float), df["Buy_Signal"].to_numpy(),
+        df["Sell_Signal"].to_numpy(), 0.0, 0.0, p.get("EXIT_COOLDOWN_DAYS", 5)
+    )
+    mask = np.zeros(len(df), dtype=bool)
+    mask[exit_idx] = True
+    return mask
+
+
+def collect_sell_rises(frames, horizons=DEFAULT_HORIZONS, use_high=False,
+                       exits_only=False, p=None):
+    """
+    收集整個股票池的賣出訊號及其未來最大漲幅
+
+    Args:
+        frames: {ticker: generate_signals 輸出的 DataFrame}
+        horizons: 觀察期列表
+        use_high: 是否以最高價計算未來漲幅
+        exits_only: True 時只看回測實際出場的賣出 (套用持倉與冷卻期)
+        p: 參數字典 (exits_only 時讀取 EXIT_COOLDOWN_DAYS)
+
+    Returns:
+        tuple: (tickers, reasons, rise)
+            tickers / reasons: 每筆賣出的股票代號與 Sell_Reason_Raw
+            rise: shape (賣出筆數, len(horizons))
+    """
+    tickers, reasons, rises = [], [], []
+    for t, df in frames.items():
+        if df is None or df.empty:
+            continue
+        mask = df["Sell_Signal"].to_numpy(dtype=bool)
+        if exits_only:
+            mask = mask & _exit_mask(df, p or {})
+        if not mask.any():
+            continue
+        rises.append(forward_return_matrix(df, horizons, use_high)[mask])
+        reasons.append(df["Sell_Reason_Raw"].to_numpy().astype(object)[mask])
+        tickers.append(np.full(mask.sum(), t, dtype=object))
+
+    if not rises:
+        return np.array([], dtype=object), np.array([], dtype=object), np.empty((0, len(horizons)))
+    return np.concatenate(tickers), np.concatenate(reasons), np.vstack(rises)
+
+
+def premature_rates(frames, horizons=DEFAULT_HORIZONS, thresholds=DEFAULT_THRESHOLDS,
+                    use_high=False, exits_only=False, p=None):
+    """
+    依賣出原因統計「賣在起漲前」比例
+
+    每個原因 (另加 ALL) × 觀察期 × 門檻一列。
+    之後不足 h 根 K 棒的賣出 (資料末端) 不列入觀察期 h 的分母。
+
+    Args:
+        frames: {ticker: generate_signals 輸出的 DataFrame}
+        horizons: 觀察期列表
+        thresholds: 未來漲幅門檻列表
+        use_high: 是否以最高價計算未來漲幅
+        exits_only: True 時只看回測實際出場的賣出
+        p: 參數字典
+
+    Returns:
+        DataFrame: reason / horizon / threshold / sells / premature / rate /
+                   mean_rise / median_rise
+    """
+    _, reasons, rise = collect_sell_rises(frames, horizons, use_high, exits_only, p)
+    thresholds = np.sort(np.asarray(thresholds, dtype=float))
+
+    groups = [(r, reasons == r) for r in SELL_REASONS[1:]]
+    groups.append(("ALL", np.ones(len(reasons), dtype=bool)))
+
+    rows = []
+    for reason, sel in groups:
+        sub = rise[sel]
+        for j, h in enumerate(horizons):
+            col = sub[:, j]
+            col = np.sort(col[~np.isnan(col)])
+            n = len(col)
+            # 排序後二分搜尋,一次得到所有門檻的達標筆數
+            hits = n - np.searchsorted(col, thresholds, side="left")
+            mean = col.mean() if n else np.nan
+            median = np.median(col) if n else np.nan
+            for thr, k in zip(thresholds, hits):
+                rows.append({
+                    "reason": reason, "horizon": h, "threshold": thr,
+                    "sells": n, "premature": int(k),
+                    "rate": k / n if n else np.nan,
+                    "mean_rise": mean, "median_rise": median,
+                })
+    return pd.DataFrame(rows)
+
+
+def rate_matrix(stats, threshold):
+    """
+    整理成 原因 × 觀察期 的比例表
+
+    Args:
+        stats: premature_rates 的輸出
+        threshold: 門檻 (需為 premature_rates 計算過的值)
+
+    Returns:
+        DataFrame: index 為賣出原因,columns 為觀察期
+    """
+    sub = stats[np.isclose(stats["threshold"], threshold)]
+    return sub.pivot(index="reason", columns="horizon", values="rate")
@@ -1,7 +1,18 @@
 import pandas as pd
 import numpy as np
 
-def build_suitability_report(results):
+from .ledger import expectancy, holding_distribution, ledger_frame, streaks
+
+def _format_interval(lo, hi, pct=True):
+    """信賴區間格式化 (NaN 顯示為 -)"""
+    if pd.isna(lo) or pd.isna(hi):
+        return "-"
+    if pct:
+        return f"{lo*100:.1f}% ~ {hi*100:.1f}%"
+    return f"{lo:.2f} ~ {hi:.2f}"
+
+
+def build_suitability_report(results, intervals=None):
     """
     建立適用性分析報告
     
@@ -13,6 +24,8 @@ def build_suitability_report(results):
     
     Args:
         results: 回測結果列表 (每個元素為一檔股票的結果字典)
+        intervals: bootstrap.bootstrap_results 的輸出 (選用);
+                   提供時加上報酬 / 回撤 / 勝率 / 獲利因子的信賴區間欄位
     
     Returns:
         DataFrame: 格式化的報告表格
@@ -71,7 +84,7 @@ def build_suitability_report(results):
         final_note = "、".join(notes) if notes else "體質健康"
 
         # 加入報告
-        report.append({
+        entry = {
             "股票代號": ticker,
             "技術評分": int(score),  # 顯示整數
             "狀態": status,
@@ -80,7 +93,19 @@ def build_suitability_report(results):
             "PF(獲利因子)": f"{pf:.2f}",
             "勝率": f"{winrate*100:.0f}%",
             "診斷": final_note
-        })
+        }
+
+        # 4. Bootstrap 信賴區間 (交易筆數少時區間很寬,解讀績效需保守)
+        if intervals is not None:
+            ci = intervals.loc[ticker] if ticker in intervals.index else {}
+            entry["報酬區間"] = _format_interval(ci.get("total_return_lo"), ci.get("total_return_hi"))
+            entry["回撤區間"] = _format_interval(ci.get("dd_lo"), ci.get("dd_hi"))
+            entry["勝率區間"] = _format_interval(ci.get("winrate_lo"), ci.get("winrate_hi"))
+            entry["PF區間"] = _format_interval(
+                ci.get("profit_factor_lo"), ci.get("profit_factor_hi"), pct=False
+            )
+
+        report.append(entry)
 
     return pd.DataFrame(report)
 
@@ -115,21 +140,8 @@ def generate_detailed_stats(result):
     max_win = trades_array.max()
     max_loss = trades_array.min()
     
-    # 連續統計
-    winning_streak = 0
-    losing_streak = 0
-    current_win_streak = 0
-    current_lose_streak = 0
-    
-    for trade in trades_list:
-        if trade > 0:
-            current_win_streak += 1
-            current_lose_streak = 0
-            winning_streak = max(winning_streak, current_win_streak)
-        else:
-            current_lose_streak += 1
-            current_win_streak = 0
-            losing_streak = max(losing_streak, current_lose_streak)
+    # 連續統計 (向量化計算連續區段長度)
+    winning_streak, losing_streak = streaks(trades_array)
     
     return {
         "總交易次數": total_trades,
@@ -141,6 +153,38 @@ def generate_detailed_stats(result):
     }
 
 
+def build_trade_analysis(ledgers, by="sell_reason"):
+    """
+    多檔股票的逐筆交易分析
+
+    Args:
+        ledgers: {ticker: backtest_fsm 回傳的 result["ledger"]}
+        by: 期望值的分組欄位 ("sell_reason" / "buy_reason" / "ticker")
+
+    Returns:
+        dict:
+            trades: 合併後的逐筆交易明細 (DataFrame)
+            expectancy: 依分組的勝率 / 期望值 / 獲利因子 / 平均持有天數 / MAE / MFE
+            streaks: 每檔的最大連續獲利 / 虧損次數
+            holding: 持有天數分布
+    """
+    trades = ledger_frame(ledgers)
+    if trades.empty:
+        return {"trades": trades, "expectancy": pd.DataFrame(),
+                "streaks": pd.DataFrame(), "holding": pd.DataFrame()}
+
+    groups = trades["ticker"] if "ticker" in trades.columns else None
+    streak = streaks(trades["net_return"].to_numpy(), groups)
+    if groups is None:
+        streak = pd.DataFrame([streak], columns=["win_streak", "loss_streak"])
+    return {
+        "trades": trades,
+        "expectancy": expectancy(trades, by=by),
+        "streaks": streak,
+        "holding": holding_distribution(trades),
+    }
+
+
 def format_summary_table(results):
     """
     格式化為簡潔的摘要表格
@@ -164,7 +208,13 @@ def format_summary_table(results):
             "B&H報酬": f"{r.get('bh_return', 0)*100:.1f}%",
             "交易": r.get("交易筆數", 0),
             "勝率": f"{r.get('勝率', 0)*100:.0f}%",
-            "PF": f"{r.get('profit_factor', 0):.2f}"
+            "PF": f"{r.get('profit_factor', 0):.2f}",
+            "MDD": f"{r.get('dd', 0)*100:.1f}%",
+            "Sharpe": f"{r.get('sharpe', 0):.2f}",
+            "Sortino": f"{r.get('sortino', 0):.2f}",
+            "Calmar": f"{r.get('calmar', 0):.2f}",
+            "TE": f"{r.get('te', 0)*100:.1f}%",
+            "IR": f"{r.get('info_ratio', 0):.2f}"
         })
     
     return pd.DataFrame(summary)
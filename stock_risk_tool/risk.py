@@ -0,0 +1,585 @@
+# =========================================================
+# 風險指標 - 直接在權益 / 報酬陣列上計算
+#
+# 所有函數都接受 1D (單檔) 或 2D (K 棒 × 股票) 陣列,沿 axis 0 計算:
+# 1D 輸入回傳 float,2D 回傳每檔一個值的陣列。
+# NaN 視為該股票當天無資料 (例如 backtest_panel 的權益矩陣),不列入統計。
+# 滾動版以累計和 / 滑動視窗一次算完,不需逐檔逐日迴圈。
+# =========================================================
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import config
+
+# 年化用的每年交易日數
+TRADING_DAYS = 252
+
+# 滑動視窗計算時每批最多展開的元素數 (限制記憶體用量)
+_CHUNK_ELEMENTS = 1 << 22
+
+
+def _as_2d(x):
+    arr = np.asarray(x, dtype=float)
+    if arr.ndim == 1:
+        return arr[:, None], True
+    if arr.ndim != 2:
+        raise ValueError(f"只支援 1D 或 2D 陣列: ndim={arr.ndim}")
+    return arr, False
+
+
+def _out(values, squeeze):
+    return float(values[0]) if squeeze else values
+
+
+def simple_returns(equity):
+    """
+    權益 (或價格) 序列轉為單期報酬
+
+    Args:
+        equity: 1D / 2D 陣列
+
+    Returns:
+        ndarray: 與輸入同形狀,第一列為 NaN
+    """
+    eq = np.asarray(equity, dtype=float)
+    r = np.full(eq.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r[1:] = eq[1:] / eq[:-1] - 1
+    return r
+
+
+def align_benchmark(benchmark, index):
+    """
+    基準價格對齊到回測的日期索引
+
+    基準缺少的日期沿用前一天收盤 (不往回補,起始日之前為 NaN)。
+
+    Args:
+        benchmark: 基準收盤價 Series (日期索引)
+        index: 回測資料的 DatetimeIndex
+
+    Returns:
+        ndarray: 與 index 等長
+    """
+    s = pd.Series(benchmark).sort_index()
+    s = s[~s.index.duplicated(keep="last")]
+    return s.reindex(s.index.union(index)).ffill().reindex(index).to_numpy(dtype=float)
+
+
+def load_benchmark(price_store, start, end=None, ticker=None):
+    """
+    讀取基準指數的收盤價 (預設 config.BENCHMARK_TICKER,以 0050 代替加權指數)
+
+    Args:
+        price_store: store.PriceStore
+        start: 起始日
+        end: 結束日
+        ticker: 基準代號
+
+    Returns:
+        Series | None: 收盤價,取不到資料時為 None (呼叫端改用個股買進持有)
+    """
+    ticker = ticker or config.BENCHMARK_TICKER
+    try:
+        df = price_store.load(ticker, start, end)
+    except Exception:
+        return None
+    if df is None or df.empty:
+        return None
+    return df["Close"]
+
+
+# =========================================================
+# 整段期間
+# =========================================================
+def _mean_std(x):
+    """每欄的有效筆數、平均、樣本標準差 (ddof=1)"""
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, x, 0.0).sum(axis=0) / n
+        dev = np.where(valid, x - mean, 0.0)
+        std = np.sqrt((dev * dev).sum(axis=0) / (n - 1))
+    std[n < 2] = np.nan
+    return n, mean, std
+
+
+def _ratio(num, den):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = num / den
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def annualized_volatility(returns, periods=TRADING_DAYS):
+    """
+    年化波動度
+
+    Args:
+        returns: 單期報酬 (1D / 2D)
+        periods: 每年期數
+
+    Returns:
+        float | ndarray
+    """
+    r, squeeze = _as_2d(returns)
+    _, _, std = _mean_std(r)
+    return _out(std * np.sqrt(periods), squeeze)
+
+
+def sharpe_ratio(returns, rf=0.0, periods=TRADING_DAYS):
+    """
+    年化 Sharpe ratio = 平均超額報酬 / 標準差 × sqrt(periods)
+
+    Args:
+        returns: 單期報酬 (1D / 2D)
+        rf: 年化無風險利率
+        periods: 每年期數
+
+    Returns:
+        float | ndarray: 標準差為 0 或資料不足時為 NaN
+    """
+    r, squeeze = _as_2d(returns)
+    _, mean, std = _mean_std(r - rf / periods)
+    return _out(_ratio(mean, std) * np.sqrt(periods), squeeze)
+
+
+def sortino_ratio(returns, rf=0.0, periods=TRADING_DAYS):
+    """
+    年化 Sortino ratio = 平均超額報酬 / 下檔標準差 × sqrt(periods)
+
+    下檔標準差 = sqrt(mean(min(超額報酬, 0)^2)),分母為全部有效期數。
+    """
+    r, squeeze = _as_2d(returns)
+    ex = r - rf / periods
+    n, mean, _ = _mean_std(ex)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        down = np.sqrt(np.where(ex < 0, ex * ex, 0.0).sum(axis=0) / n)
+    return _out(_ratio(mean, down) * np.sqrt(periods), squeeze)
+
+
+def drawdown(equity):
+    """
+    回撤序列 = 權益 / 歷史最高 - 1
+
+    Args:
+        equity: 權益曲線 (1D / 2D)
+
+    Returns:
+        ndarray: 與輸入同形狀 (NaN 處維持 NaN)
+    """
+    eq = np.asarray(equity, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return eq / np.fmax.accumulate(eq, axis=0) - 1
+
+
+def _max_dd(dd, axis=0):
+    return np.where(np.isnan(dd), 0.0, dd).min(axis=axis)
+
+
+def max_drawdown(equity):
+    """最大回撤 (負值,沒有回撤時為 0)"""
+    dd, squeeze = _as_2d(drawdown(equity))
+    return _out(_max_dd(dd), squeeze)
+
+
+def _longest_run(flags, axis):
+    """沿 axis 最長連續 True 的長度"""
+    c = np.cumsum(flags, axis=axis)
+    reset = np.maximum.accumulate(np.where(flags, 0, c), axis=axis)
+    return (c - reset).max(axis=axis)
+
+
+def max_drawdown_duration(equity):
+    """
+    最長回撤期間 (權益低於前高的最長連續 K 棒數)
+
+    Args:
+        equity: 權益曲線 (1D / 2D)
+
+    Returns:
+        int | ndarray
+    """
+    dd, squeeze = _as_2d(drawdown(equity))
+    with np.errstate(invalid="ignore"):
+        runs = _longest_run(dd < 0, axis=0)
+    return int(runs[0]) if squeeze else runs
+
+
+def cagr(equity, periods=TRADING_DAYS):
+    """
+    年化報酬 (以每欄第一筆與最後一筆有效值計算)
+
+    Args:
+        equity: 權益曲線 (1D / 2D)
+        periods: 每年期數
+
+    Returns:
+        float | ndarray
+    """
+    eq, squeeze = _as_2d(equity)
+    valid = ~np.isnan(eq)
+    n = valid.sum(axis=0)
+    cols = np.arange(eq.shape[1])
+    first = eq[valid.argmax(axis=0), cols]
+    last = eq[len(eq) - 1 - valid[::-1].argmax(axis=0), cols]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = (last / first) ** (periods / (n - 1)) - 1
+    out[n < 2] = np.nan
+    return _out(out, squeeze)
+
+
+def calmar_ratio(equity, periods=TRADING_DAYS):
+    """Calmar ratio = 年化報酬 / |最大回撤| (沒有回撤時為 NaN)"""
+    eq, squeeze = _as_2d(equity)
+    return _out(_ratio(cagr(eq, periods), np.abs(max_drawdown(eq))), squeeze)
+
+
+def tracking_error(returns, benchmark_returns, periods=TRADING_DAYS):
+    """
+    年化追蹤誤差 = 主動報酬 (策略 - 基準) 的標準差 × sqrt(periods)
+
+    Args:
+        returns: 策略單期報酬 (1D / 2D)
+        benchmark_returns: 基準單期報酬 (1D 會廣播到每一欄,或與 returns 同形狀)
+        periods: 每年期數
+
+    Returns:
+        float | ndarray
+    """
+    r, squeeze = _as_2d(returns)
+    b, _ = _as_2d(benchmark_returns)
+    _, _, std = _mean_std(r - b)
+    return _out(std * np.sqrt(periods), squeeze)
+
+
+def information_ratio(returns, benchmark_returns, periods=TRADING_DAYS):
+    """資訊比率 = 平均主動報酬 / 主動報酬標準差 × sqrt(periods)"""
+    r, squeeze = _as_2d(returns)
+    b, _ = _as_2d(benchmark_returns)
+    _, mean, std = _mean_std(r - b)
+    return _out(_ratio(mean, std) * np.sqrt(periods), squeeze)
+
+
+def risk_metrics(equity, benchmark=None, rf=0.0, periods=TRADING_DAYS):
+    """
+    一次計算全部風險指標
+
+    Args:
+        equity: 權益曲線 (1D / 2D)
+        benchmark: 基準價格 (1D,或與 equity 同形狀);None 時不計算 te / info_ratio
+        rf: 年化無風險利率
+        periods: 每年期數
+
+    Returns:
+        dict: volatility / sharpe / sortino / cagr / max_dd / dd_duration /
+              calmar / te / info_ratio (1D 為 float,2D 為陣列)
+    """
+    eq, squeeze = _as_2d(equity)
+    r = simple_returns(eq)
+    dd = drawdown(eq)
+    growth = cagr(eq, periods)
+    mdd = _max_dd(dd)
+    with np.errstate(invalid="ignore"):
+        duration = _longest_run(dd < 0, axis=0)
+    out = {
+        "volatility": annualized_volatility(r, periods),
+        "sharpe": sharpe_ratio(r, rf, periods),
+        "sortino": sortino_ratio(r, rf, periods),
+        "cagr": growth,
+        "max_dd": mdd,
+        "dd_duration": duration,
+        "calmar": _ratio(growth, np.abs(mdd)),
+    }
+    if benchmark is not None:
+        b = simple_returns(benchmark)
+        out["te"] = tracking_error(r, b, periods)
+        out["info_ratio"] = information_ratio(r, b, periods)
+    else:
+        out["te"] = np.full(eq.shape[1], np.nan)
+        out["info_ratio"] = np.full(eq.shape[1], np.nan)
+    if squeeze:
+        return {k: (int(v[0]) if k == "dd_duration" else float(v[0])) for k, v in out.items()}
+    return out
+
+
+def risk_table(equity, benchmark=None, tickers=None, rf=0.0, periods=TRADING_DAYS):
+    """
+    多檔股票的風險指標表 (每檔一列)
+
+    Args:
+        equity: 權益矩陣 (K 棒 × 股票),或 {ticker: 權益 Series} (依日期對齊)
+        benchmark: 基準價格 (與 equity 的列對齊,或 Series 時依日期對齊)
+        tickers: 股票代號 (equity 為陣列時使用)
+        rf: 年化無風險利率
+        periods: 每年期數
+
+    Returns:
+        DataFrame: index 為股票代號,欄位同 risk_metrics
+    """
+    if isinstance(equity, dict):
+        frame = pd.DataFrame(equity)
+        tickers = list(frame.columns)
+        if isinstance(benchmark, pd.Series):
+            benchmark = align_benchmark(benchmark, frame.index)
+        equity = frame.to_numpy(dtype=float)
+    eq, _ = _as_2d(equity)
+    tickers = list(tickers) if tickers is not None else list(range(eq.shape[1]))
+    return pd.DataFrame(risk_metrics(eq, benchmark, rf, periods), index=pd.Index(tickers))
+
+
+# =========================================================
+# 累計動差 (可續跑回測用,逐根更新後不需保留完整報酬序列)
+# =========================================================
+def return_moments(returns, benchmark_returns):
+    """
+    報酬序列的累計和 (1D)
+
+    Args:
+        returns: 策略單期報酬
+        benchmark_returns: 基準單期報酬
+
+    Returns:
+        dict: n / sum / sum_sq / down_sq (策略報酬) 與
+              active_n / active_sum / active_sum_sq (主動報酬)
+    """
+    r = np.asarray(returns, dtype=float)
+    a = r - np.asarray(benchmark_returns, dtype=float)
+    r = r[~np.isnan(r)]
+    a = a[~np.isnan(a)]
+    return {
+        "n": int(len(r)), "sum": float(r.sum()), "sum_sq": float((r * r).sum()),
+        "down_sq": float((r[r < 0] ** 2).sum()),
+        "active_n": int(len(a)), "active_sum": float(a.sum()),
+        "active_sum_sq": float((a * a).sum()),
+    }
+
+
+def update_moments(m, r, b):
+    """以一期報酬 r 與基準報酬 b 更新 return_moments 的結果 (原地修改)"""
+    if not np.isnan(r):
+        m["n"] += 1
+        m["sum"] += r
+        m["sum_sq"] += r * r
+        if r < 0:
+            m["down_sq"] += r * r
+        if not np.isnan(b):
+            a = r - b
+            m["active_n"] += 1
+            m["active_sum"] += a
+            m["active_sum_sq"] += a * a
+
+
+def metrics_from_moments(m, total_return, n_bars, max_dd, dd_duration, periods=TRADING_DAYS):
+    """
+    由累計和計算與 risk_metrics 相同鍵值的指標 (rf = 0)
+
+    以 sum / sum_sq 還原變異數,與 risk_metrics 的差異在浮點誤差內。
+
+    Args:
+        m: return_moments 的結果
+        total_return: 總報酬 (權益從 1 開始)
+        n_bars: K 棒數
+        max_dd: 最大回撤
+        dd_duration: 最長回撤期間
+        periods: 每年期數
+
+    Returns:
+        dict: 同 risk_metrics
+    """
+    def mean_std(n, s, s2):
+        if n < 2:
+            return np.nan, np.nan
+        mean = s / n
+        return mean, np.sqrt(max(s2 - s * mean, 0.0) / (n - 1))
+
+    def ratio(a, b):
+        return a / b if b and np.isfinite(a / b) else np.nan
+
+    mean, std = mean_std(m["n"], m["sum"], m["sum_sq"])
+    a_mean, a_std = mean_std(m["active_n"], m["active_sum"], m["active_sum_sq"])
+    down = np.sqrt(m["down_sq"] / m["n"]) if m["n"] else np.nan
+    growth = (1 + total_return) ** (periods / (n_bars - 1)) - 1 if n_bars > 1 else np.nan
+    root = np.sqrt(periods)
+    return {
+        "volatility": float(std * root),
+        "sharpe": float(ratio(mean, std) * root),
+        "sortino": float(ratio(mean, down) * root),
+        "cagr": float(growth),
+        "max_dd": float(max_dd),
+        "dd_duration": int(dd_duration),
+        "calmar": float(ratio(growth, abs(max_dd))),
+        "te": float(a_std * root),
+        "info_ratio": float(ratio(a_mean, a_std) * root),
+    }
+
+
+# =========================================================
+# 滾動版 (視窗內的指標,前 window - 1 列為 NaN)
+# =========================================================
+def _rolling_moments(x, window, min_periods):
+    """
+    每個向後視窗的有效筆數、平均、樣本標準差
+
+    以累計和計算 (O(n));先減去整欄平均再累加,降低大樣本下的相消誤差。
+    """
+    valid = ~np.isnan(x)
+    with np.errstate(invalid="ignore"):
+        center = np.nanmean(np.where(valid, x, np.nan), axis=0)
+    center = np.where(np.isnan(center), 0.0, center)
+    d = np.where(valid, x - center, 0.0)
+
+    def window_sum(v):
+        c = np.zeros((len(v) + 1,) + v.shape[1:])
+        np.cumsum(v, axis=0, out=c[1:])
+        s = c[1:].copy()
+        s[window:] -= c[1:len(v) + 1 - window]
+        return s
+
+    n = window_sum(valid.astype(float))
+    s1 = window_sum(d)
+    s2 = window_sum(d * d)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s1 / n
+        var = np.maximum(s2 - s1 * mean, 0.0) / (n - 1)
+    ok = n >= max(min_periods, 2)
+    mean = np.where(ok, mean + center, np.nan)
+    std = np.where(ok, np.sqrt(var), np.nan)
+    return n, mean, std
+
+
+def _check_window(window):
+    window = int(window)
+    if window < 2:
+        raise ValueError(f"滾動視窗長度必須 >= 2: {window}")
+    return window
+
+
+def rolling_volatility(returns, window, periods=TRADING_DAYS, min_periods=None):
+    """
+    滾動年化波動度
+
+    Args:
+        returns: 單期報酬 (1D / 2D)
+        window: 視窗長度
+        periods: 每年期數
+        min_periods: 視窗內最少有效筆數 (預設 = window)
+
+    Returns:
+        ndarray: 與輸入同形狀
+    """
+    window = _check_window(window)
+    r, squeeze = _as_2d(returns)
+    _, _, std = _rolling_moments(r, window, min_periods or window)
+    out = std * np.sqrt(periods)
+    return out[:, 0] if squeeze else out
+
+
+def rolling_sharpe(returns, window, rf=0.0, periods=TRADING_DAYS, min_periods=None):
+    """滾動年化 Sharpe ratio (參數同 rolling_volatility)"""
+    window = _check_window(window)
+    r, squeeze = _as_2d(returns)
+    _, mean, std = _rolling_moments(r - rf / periods, window, min_periods or window)
+    out = _ratio(mean, std) * np.sqrt(periods)
+    return out[:, 0] if squeeze else out
+
+
+def rolling_sortino(returns, window, rf=0.0, periods=TRADING_DAYS, min_periods=None):
+    """滾動年化 Sortino ratio (參數同 rolling_volatility)"""
+    window = _check_window(window)
+    r, squeeze = _as_2d(returns)
+    ex = r - rf / periods
+    n, mean, _ = _rolling_moments(ex, window, min_periods or window)
+    down = np.where(ex < 0, ex * ex, 0.0)
+    c = np.zeros((len(down) + 1, down.shape[1]))
+    np.cumsum(down, axis=0, out=c[1:])
+    s = c[1:].copy()
+    s[window:] -= c[1:len(down) + 1 - window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dd = np.sqrt(np.maximum(s, 0.0) / n)
+    out = _ratio(mean, dd) * np.sqrt(periods)
+    return out[:, 0] if squeeze else out
+
+
+def rolling_tracking_error(returns, benchmark_returns, window, periods=TRADING_DAYS,
+                           min_periods=None):
+    """滾動年化追蹤誤差 (基準報酬 1D 時廣播到每一欄)"""
+    window = _check_window(window)
+    r, squeeze = _as_2d(returns)
+    b, _ = _as_2d(benchmark_returns)
+    _, _, std = _rolling_moments(r - b, window, min_periods or window)
+    out = std * np.sqrt(periods)
+    return out[:, 0] if squeeze else out
+
+
+def rolling_information_ratio(returns, benchmark_returns, window, periods=TRADING_DAYS,
+                              min_periods=None):
+    """滾動資訊比率 (基準報酬 1D 時廣播到每一欄)"""
+    window = _check_window(window)
+    r, squeeze = _as_2d(returns)
+    b, _ = _as_2d(benchmark_returns)
+    _, mean, std = _rolling_moments(r - b, window, min_periods or window)
+    out = _ratio(mean, std) * np.sqrt(periods)
+    return out[:, 0] if squeeze else out
+
+
+def _rolling_window_dd(eq, window, reducer):
+    """
+    對每個向後視窗計算「視窗內自己的回撤序列」並以 reducer 彙總
+
+    以 sliding_window_view 展開 (視窗數 × 股票 × window),分批處理限制記憶體。
+    """
+    n, k = eq.shape
+    out = np.full((n, k), np.nan)
+    if n < window:
+        return out
+    views = sliding_window_view(eq, window, axis=0)     # (n - window + 1, k, window)
+    step = max(1, _CHUNK_ELEMENTS // (k * window))
+    with np.errstate(invalid="ignore"):
+        for i in range(0, len(views), step):
+            block = views[i:i + step]
+            dd = block / np.fmax.accumulate(block, axis=-1) - 1
+            out[window - 1 + i:window - 1 + i + len(block)] = reducer(dd)
+    return out
+
+
+def rolling_max_drawdown(equity, window):
+    """
+    滾動最大回撤 (每個視窗以視窗起點重新計算前高)
+
+    Args:
+        equity: 權益曲線 (1D / 2D)
+        window: 視窗長度
+
+    Returns:
+        ndarray: 與輸入同形狀
+    """
+    window = _check_window(window)
+    eq, squeeze = _as_2d(equity)
+    out = _rolling_window_dd(eq, window, lambda dd: _max_dd(dd, axis=-1))
+    return out[:, 0] if squeeze else out
+
+
+def rolling_drawdown_duration(equity, window):
+    """滾動最長回撤期間 (視窗內低於視窗前高的最長連續 K 棒數)"""
+    window = _check_window(window)
+    eq, squeeze = _as_2d(equity)
+    out = _rolling_window_dd(eq, window, lambda dd: _longest_run(dd < 0, axis=-1))
+    return out[:, 0] if squeeze else out
+
+
+def rolling_calmar(equity, window, periods=TRADING_DAYS):
+    """
+    滾動 Calmar ratio = 視窗年化報酬 / |視窗最大回撤|
+
+    視窗年化報酬以視窗首尾權益計算。
+    """
+    window = _check_window(window)
+    eq, squeeze = _as_2d(equity)
+    growth = np.full(eq.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth[window - 1:] = eq[window - 1:] / eq[:len(eq) - window + 1]
+        ann = growth ** (periods / (window - 1)) - 1
+    out = _ratio(ann, np.abs(rolling_max_drawdown(eq, window)))
+    return out[:, 0] if squeeze else out
@@ -0,0 +1,270 @@
+# =========================================================
+# 滾動極值 - O(n) 陣列版
+#
+# 以 van Herk / Gil-Werman 區塊掃描取代 pandas rolling().max():
+# 序列切成長度 w 的區塊,各算區塊內的前綴 / 後綴極值,
+# 任一視窗的極值 = 後綴[i] 與 前綴[i+w-1] 取大,
+# 每個元素只做常數次比較,與視窗長度無關。
+# NaN 規則與 pandas 相同: 視窗內忽略 NaN,有效值少於 min_periods 時為 NaN。
+# =========================================================
+import numpy as np
+import pandas as pd
+
+# 視窗不超過此長度時改用逐位移比較
+_DIRECT_MAX_WINDOW = 16
+
+
+def _as_float(x):
+    return np.asarray(x, dtype=float)
+
+
+def _window_extreme(padded, w, n, op, fill, out, scratch):
+    """
+    padded[i : i+w] 的極值寫入 out[:n]
+
+    Args:
+        padded: 已將 NaN 換成 fill 的陣列,長度 >= n + w - 1
+        w: 視窗長度
+        n: 輸出長度
+        op: np.maximum 或 np.minimum
+        fill: 區塊補齊值 (-inf / +inf)
+        out: 輸出陣列 (長度 n)
+        scratch: 暫存陣列 (長度 >= 2 * 區塊總長),可重複使用
+    """
+    if w <= _DIRECT_MAX_WINDOW:
+        # 短視窗直接逐位移比較 (w 次向量運算) 比區塊掃描快
+        np.copyto(out, padded[:n])
+        for k in range(1, w):
+            op(out, padded[k:k + n], out=out)
+        return out
+
+    m = -(-(n + w - 1) // w) * w
+    prefix = scratch[:m]
+    suffix = scratch[m:2 * m]
+    k = min(len(padded), m)
+    prefix[:k] = padded[:k]
+    prefix[k:] = fill
+    suffix[:] = prefix
+
+    blocks = prefix.reshape(-1, w)
+    op.accumulate(blocks, axis=1, out=blocks)
+    rblocks = suffix.reshape(-1, w)[:, ::-1]
+    op.accumulate(rblocks, axis=1, out=rblocks)
+
+    op(suffix[:n], prefix[w - 1:w - 1 + n], out=out)
+    return out
+
+
+def _valid_count(valid, w, trailing):
+    """每個視窗內的有效值個數"""
+    n = len(valid)
+    c = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(valid, out=c[1:])
+    k = min(w, n)
+    if trailing:
+        count = c[1:].copy()
+        count[k:] -= c[1:n + 1 - k]
+    else:
+        count = c[n] - c[:n]
+        count[:n - k] = c[k:n] - c[:n - k]
+    return count
+
+
+def _rolling(x, window, min_periods, op, fill, trailing):
+    x = _as_float(x)
+    n = len(x)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    w = int(window)
+    if w < 1:
+        raise ValueError(f"視窗長度必須 >= 1: {window}")
+    min_periods = w if min_periods is None else min_periods
+
+    valid = ~np.isnan(x)
+    clean = np.where(valid, x, fill)
+    pad = np.full(w - 1, fill)
+    padded = np.concatenate((pad, clean) if trailing else (clean, pad))
+    m = -(-(n + w - 1) // w) * w
+    _window_extreme(padded, w, n, op, fill, out, np.empty(2 * m))
+
+    out[_valid_count(valid, w, trailing) < max(min_periods, 1)] = np.nan
+    return out
+
+
+def rolling_max(x, window, min_periods=None):
+    """
+    向後視窗最大值,等同 pd.Series(x).rolling(window, min_periods).max()
+
+    Args:
+        x: 一維陣列
+        window: 視窗長度
+        min_periods: 最少有效值個數 (預設 = window)
+
+    Returns:
+        ndarray: 與 x 等長
+    """
+    return _rolling(x, window, min_periods, np.maximum, -np.inf, trailing=True)
+
+
+def rolling_min(x, window, min_periods=None):
+    """向後視窗最小值,等同 pd.Series(x).rolling(window, min_periods).min()"""
+    return _rolling(x, window, min_periods, np.minimum, np.inf, trailing=True)
+
+
+def forward_max(x, window, min_periods=1):
+    """
+    向前視窗最大值: out[i] = max(x[i : i+window])
+
+    等同 x[::-1].rolling(window, min_periods).max()[::-1],
+    但不需要反轉與中間 Series。
+
+    Args:
+        x: 一維陣列
+        window: 視窗長度
+        min_periods: 最少有效值個數
+
+    Returns:
+        ndarray: 與 x 等長
+    """
+    return _rolling(x, window, min_periods, np.maximum, -np.inf, trailing=False)
+
+
+def forward_min(x, window, min_periods=1):
+    """向前視窗最小值: out[i] = min(x[i : i+window])"""
+    return _rolling(x, window, min_periods, np.minimum, np.inf, trailing=False)
+
+
+def multi_forward_max(x, windows, min_periods=1):
+    """
+    多個視窗長度的向前最大值 (一次配置輸出與暫存)
+
+    Args:
+        x: 一維陣列
+        windows: 視窗長度列表
+        min_periods: 最少有效值個數
+
+    Returns:
+        ndarray: shape (len(x), len(windows)),第 j 欄對應 windows[j]
+    """
+    x = _as_float(x)
+    n = len(x)
+    windows = [int(w) for w in windows]
+    out = np.empty((len(windows), n))
+    if n == 0 or not windows:
+        return out.T
+    if min(windows) < 1:
+        raise ValueError(f"視窗長度必須 >= 1: {windows}")
+
+    w_max = max(windows)
+    valid = ~np.isnan(x)
+    padded = np.concatenate((np.where(valid, x, -np.inf), np.full(w_max - 1, -np.inf)))
+    scratch = np.empty(2 * (-(-(n + w_max - 1) // w_max) * w_max + w_max))
+    for j, w in enumerate(windows):
+        _window_extreme(padded, w, n, np.maximum, -np.inf, out[j], scratch)
+        out[j][_valid_count(valid, w, trailing=False) < max(min_periods, 1)] = np.nan
+    return out.T
+
+
+# =========================================================
+# 滾動運算快取 (單檔股票,跨參數組合共用)
+# =========================================================
+class RollingMemo:
+    """
+    單檔股票的滾動運算快取 - 以 (序列名稱, 運算, 視窗) 為鍵
+
+    參數掃描時不同組合常用到相同視窗 (例如 MA20 同時是均線與生命線),
+    同一檔股票的 Close.rolling(20).mean() 只需計算一次。
+    回傳的 Series 與快取共用,請勿直接修改。
+
+    Args:
+        df: 該檔股票的 OHLCV DataFrame (衍生序列也以此為基準)
+    """
+
+    def __init__(self, df):
+        self.frame = df
+        self.index = df.index
+        self._series = {}    # 序列名稱 -> Series (原始欄位或衍生序列)
+        self._cache = {}     # (名稱, 運算, 視窗) -> Series
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def matches(self, df):
+        """df 是否與建立快取時的資料相同 (索引與價量欄位)"""
+        if len(df) != len(self.index) or not df.index.equals(self.index):
+            return False
+        for col in ("Open", "High", "Low", "Close", "Volume"):
+            if col in self.frame.columns and not np.array_equal(
+                df[col].to_numpy(dtype=float), self.frame[col].to_numpy(dtype=float), equal_nan=True
+            ):
+                return False
+        return True
+
+    def series(self, name, fn=None):
+        """
+        取得來源序列
+
+        Args:
+            name: 原始欄位名稱,或衍生序列的名稱 (需含會影響內容的參數,如 "RSV9")
+            fn: 衍生序列的產生函數 (第一次使用時呼叫)
+        """
+        s = self._series.get(name)
+        if s is None:
+            s = fn() if fn is not None else self.frame[name]
+            self._series[name] = s
+        return s
+
+    def get(self, name, op, window, fn=None):
+        """
+        取得滾動運算結果
+
+        Args:
+            name: 來源序列名稱 (見 series)
+            op: "mean" / "sum" / "min" / "max" / "ewm_span" / "ewm_com"
+            window: 視窗長度 (EWM 時為 span 或 com)
+            fn: 衍生序列的產生函數
+
+        Returns:
+            Series: 與原資料同索引
+        """
+        key = (name, op, window)
+        out = self._cache.get(key)
+        if out is not None:
+            self.hits += 1
+            return out
+        self.misses += 1
+
+        s = self.series(name, fn)
+        if op == "mean":
+            out = s.rolling(window).mean()
+        elif op == "sum":
+            out = s.rolling(window).sum()
+        elif op == "min":
+            out = pd.Series(rolling_min(s.to_numpy(dtype=float), window), index=s.index)
+        elif op == "max":
+            out = pd.Series(rolling_max(s.to_numpy(dtype=float), window), index=s.index)
+        elif op == "ewm_span":
+            out = s.ewm(span=window).mean()
+        elif op == "ewm_com":
+            out = s.ewm(com=window).mean()
+        else:
+            raise ValueError(f"未知的滾動運算: {op}")
+        self._cache[key] = out
+        return out
+
+    def mean(self, name, window, fn=None):
+        return self.get(name, "mean", window, fn)
+
+    def min(self, name, window, fn=None):
+        return self.get(name, "min", window, fn)
+
+    def max(self, name, window, fn=None):
+        return self.get(name, "max", window, fn)
+
+    def ewm(self, name, span=None, com=None, fn=None):
+        if span is not None:
+            return self.get(name, "ewm_span", span, fn)
+        return self.get(name, "ewm_com", com, fn)
@@ -0,0 +1,251 @@
+# =========================================================
+# 全市場選股 - 只計算最後一段 K 棒
+#
+# 每日掃描只需要最新一根的評分與訊號,因此:
+# 1. 依參數算出最少需要的歷史長度 (min_history_bars)
+# 2. 只下載 / 讀取這段尾端資料
+# 3. 同類型股票的尾端資料首尾相接成一張長表,
+#    一次跑完 add_indicators / generate_signals 後取每段最後一列
+# =========================================================
+import argparse
+import math
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from . import config, instrument, parallel
+from .indicators import add_indicators
+from .signals import generate_signals
+
+OHLCV_COLS = ["Open", "High", "Low", "Close", "Volume"]
+
+# 選股表輸出的欄位 (Sell_Premature 需要未來資料,最新一根沒有意義,不輸出)
+SCREEN_COLS = [
+    "Close", "Tech_Score", "Buy_Signal", "Buy_Reason", "Sell_Signal",
+    "Sell_Reason_Raw", "In_Protection", "Near_StopLine_Warn",
+    "SanYang", "SiHai", "MA_Slope", "Bias", "RSI", "K", "D",
+]
+
+
+def min_history_bars(p, ewm_warmup=3):
+    """
+    最新一根訊號所需的最少 K 棒數
+
+    = 最長視窗 (MA240、季線斜率 MA60 + 20 等) + EWM 暖機長度。
+    KD / MACD 為指數平滑,取 ewm_warmup 倍的 (MACD_SLOW + MACD_SIGNAL)
+    讓起始值的權重可忽略。
+
+    Args:
+        p: 參數字典
+        ewm_warmup: EWM 暖機倍數
+
+    Returns:
+        int: K 棒數
+    """
+    lookback = max(
+        p.get("MA240") or 0,
+        (p.get("MA60") or 0) + 20,                                  # 季線趨勢保護
+        max(p.get(k) or 0 for k in ("MA10", "MA20", "MA60")) + 5,   # 生命線斜率
+        p["VOL_MA"], p["ATR_N"] + 1, p["RSI_N"] + 1, p["KD_N"],
+    )
+    warmup = ewm_warmup * max(p["MACD_SLOW"] + p["MACD_SIGNAL"], p["KD_N"] + 6)
+    return int(lookback + warmup)
+
+
+def history_start(end, n_bars):
+    """
+    涵蓋 n_bars 個交易日的起始日 (以每週 5 天、另加 10% 假日估計)
+
+    Args:
+        end: 結束日
+        n_bars: 交易日數
+
+    Returns:
+        str: "YYYY-MM-DD"
+    """
+    days = math.ceil(n_bars * 7 / 5 * 1.1) + 7
+    return (pd.Timestamp(end) - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def market_tickers(markets=("上市", "上櫃"), types=("股票",)):
+    """
+    twstock 代碼表中的全部上市 / 上櫃股票
+
+    Args:
+        markets: 市場別
+        types: 證券類別 (如 "股票"、"ETF")
+
+    Returns:
+        list: 股票代號 (上市 .TW、上櫃 .TWO)
+    """
+    import twstock
+
+    suffix = {"上市": ".TW", "上櫃": ".TWO"}
+    return sorted(
+        f"{code}{suffix[info.market]}"
+        for code, info in twstock.codes.items()
+        if info.market in markets and info.type in types and info.market in suffix
+    )
+
+
+# =========================================================
+# 長表批次計算
+# =========================================================
+def _stack_tails(frames, n_bars):
+    """
+    將多檔尾端資料首尾相接 (每段固定 n_bars 列,不足者前面補 NaN)
+
+    每段長度都不小於最長視窗,因此每段最後一列的滾動計算不會讀到上一檔;
+    EWM 跨段的殘留權重則在暖機長度內衰減到可忽略。
+    """
+    block = np.full((len(frames) * n_bars, len(OHLCV_COLS)), np.nan)
+    for j, df in enumerate(frames):
+        # 倉儲資料的欄位已是標準順序,略過欄位選取 (每檔可省下約 1ms)
+        if list(df.columns) != OHLCV_COLS:
+            df = df[OHLCV_COLS]
+        arr = df.to_numpy(dtype=float)[-n_bars:]
+        stop = (j + 1) * n_bars
+        block[stop - len(arr):stop] = arr
+    return pd.DataFrame(block, columns=OHLCV_COLS)
+
+
+def _blockwise_ffill(values, n_bars):
+    """分段 forward fill (不跨段延伸)"""
+    idx = np.arange(len(values))
+    last = np.maximum.accumulate(np.where(np.isnan(values), -1, idx))
+    block_start = idx - idx % n_bars
+    return np.where(last >= block_start, values[np.maximum(last, 0)], np.nan)
+
+
+def screen_frames(frames, p, stock_type="DEFAULT", n_bars=None):
+    """
+    同一股票類型的多檔資料,批次計算最新一根的訊號
+
+    Args:
+        frames: {ticker: OHLCV DataFrame}
+        p: 參數字典
+        stock_type: 股票類型 (決定生命線)
+        n_bars: 每檔使用的尾端 K 棒數 (預設 min_history_bars(p))
+
+    Returns:
+        DataFrame: index 為股票代號,欄位為 SCREEN_COLS 加上 Date / Bars
+    """
+    n_bars = n_bars or min_history_bars(p)
+    tickers = [t for t, df in frames.items() if df is not None and len(df)]
+    if not tickers:
+        return pd.DataFrame(columns=["Date", "Bars"] + SCREEN_COLS)
+
+    long = _stack_tails([frames[t] for t in tickers], n_bars)
+    df = add_indicators(long, p, inplace=True)
+
+    # 爆量低點是無限延伸的 ffill,需改為分段計算,避免沿用上一檔的低點
+    raw_low = np.where(df["Is_Big_Vol"].to_numpy(), df["Low"].to_numpy(), np.nan)
+    df["BigVol_Low"] = _blockwise_ffill(raw_low, n_bars)
+
+    df = generate_signals(df, p, mode="OldWang", stock_type=stock_type, inplace=True)
+
+    last_rows = np.arange(1, len(tickers) + 1) * n_bars - 1
+    out = df[SCREEN_COLS].iloc[last_rows].copy()
+    out.index = pd.Index(tickers, name="ticker")
+    out.insert(0, "Date", [frames[t].index[-1] for t in tickers])
+    out.insert(1, "Bars", [min(len(frames[t]), n_bars) for t in tickers])
+    return out
+
+
+def screen(tickers, price_store, p=None, end=None, stock_types=None,
+           download=True, chunk_size=500):
+    """
+    全市場選股
+
+    Args:
+        tickers: 股票代號列表
+        price_store: store.PriceStore
+        p: 參數字典 (預設 config.P)
+        end: 截止日 (預設今天)
+        stock_types: {ticker: 股票類型} (預設 config.TICKERS_CONFIG)
+        download: 是否先補齊尾端區間的資料 (False = 只讀本地倉儲)
+        chunk_size: 每批長表的檔數 (限制記憶體用量)
+
+    Returns:
+        DataFrame: 依 Tech_Score 由高到低排序的選股表,
+                   Bars 小於 min_history_bars 者表示歷史資料不足;
+                   Error 欄為讀檔失敗的原因 (如檔案損毀),這些股票排在最後
+    """
+    p = p or config.P
+    end = end or datetime.today().strftime("%Y-%m-%d")
+    stock_types = config.TICKERS_CONFIG if stock_types is None else stock_types
+    n_bars = min_history_bars(p)
+
+    if download:
+        with instrument.stage("download"):
+            price_store.update(tickers, history_start(end, n_bars), end)
+
+    # 讀檔以 I/O 為主 (pyarrow 會釋放 GIL),用執行緒池平行讀取
+    with instrument.stage("load_prices"):
+        loaded = parallel.map_ordered(
+            price_store.tail, [(t, n_bars, end) for t in tickers],
+            executor="thread", max_workers=config.PIPELINE_WORKERS,
+        )
+    frames = {t: df for t, (df, err) in zip(tickers, loaded) if err is None and df is not None}
+    errors = {t: f"{type(err).__name__}: {err}" for t, (_, err) in zip(tickers, loaded)
+              if err is not None}
+
+    groups = {}
+    for t in frames:
+        groups.setdefault(stock_types.get(t, "DEFAULT"), []).append(t)
+
+    parts = []
+    for stock_type, group in groups.items():
+        for i in range(0, len(group), chunk_size):
+            chunk = {t: frames[t] for t in group[i:i + chunk_size]}
+            with instrument.stage("screen_frames"):
+                part = screen_frames(chunk, p, stock_type, n_bars)
+            part.insert(0, "Type", stock_type)
+            parts.append(part)
+
+    if errors:
+        parts.append(pd.DataFrame(
+            {"Type": [stock_types.get(t, "DEFAULT") for t in errors],
+             "Error": list(errors.values())},
+            index=pd.Index(list(errors), name="ticker"),
+        ))
+    if not parts:
+        return pd.DataFrame()
+    table = pd.concat(parts)
+    if "Error" in table.columns:
+        table["Bars"] = table["Bars"].astype("Int64")   # 失敗列為 <NA>,其餘維持整數
+    else:
+        table["Error"] = None
+    # Tech_Score 為 NaN 的失敗列排在最後
+    return table.sort_values(["Tech_Score", "Bars"], ascending=[False, False], kind="stable")
+
+
+def main(argv=None):
+    from .store import PriceStore
+
+    parser = argparse.ArgumentParser(description="全市場選股 (只計算尾端資料)")
+    parser.add_argument("tickers", nargs="*", help="股票代號 (預設全部上市櫃股票)")
+    parser.add_argument("--end", default=None, help="截止日 YYYY-MM-DD")
+    parser.add_argument("--top", type=int, default=50, help="顯示前幾名")
+    parser.add_argument("--offline", action="store_true", help="只讀本地倉儲,不下載")
+    parser.add_argument("--output", default=None, help="輸出 CSV 路徑")
+    args = parser.parse_args(argv)
+
+    tickers = args.tickers or market_tickers()
+    table = screen(tickers, PriceStore(config.DATA_DIR), end=args.end,
+                   download=not args.offline)
+    if args.output:
+        table.to_csv(args.output, encoding="utf-8-sig")
+    failed = table["Error"].dropna() if "Error" in table.columns else pd.Series(dtype=object)
+    ok = table.drop(index=failed.index, columns="Error", errors="ignore")
+    print(ok.head(args.top).to_string())
+    if len(failed):
+        print(f"\n讀取失敗 {len(failed)} 檔:", file=sys.stderr)
+        for t, err in failed.items():
+            print(f"  {t}: {err}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
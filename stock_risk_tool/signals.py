@@ -1,14 +1,22 @@
 import numpy as np
 import pandas as pd
+from .utils import set_column
+from .rolling import forward_max, multi_forward_max
+
+# generate_signals 會讀取的參數 (另外還依 stock_type 決定生命線)
+PARAM_KEYS = (
+    "MA_SLOPE_THRESHOLD", "BIAS_THRESHOLD", "STOP_BUFFER_PCT", "HARD_STOP_PCT",
+    "SELL_LOOKAHEAD", "SELL_PREMATURE_THRESHOLD", "SELL_PREMATURE_USE_HIGH",
+)
 
 def _future_window_max(series, lookahead):
-    reversed_series = series.iloc[::-1]
-    future_max = (
-        reversed_series.rolling(window=lookahead, min_periods=1)
-        .max()
-        .iloc[::-1]
+    """series[i : i+lookahead] 的最大值 (忽略 NaN);lookahead 為列表時回傳每個長度一欄"""
+    values = series.to_numpy(dtype=float)
+    if np.ndim(lookahead) == 0:
+        return pd.Series(forward_max(values, lookahead), index=series.index)
+    return pd.DataFrame(
+        multi_forward_max(values, lookahead), index=series.index, columns=list(lookahead)
     )
-    return future_max
 
 
 def detect_sell_before_rise(
@@ -25,7 +33,8 @@ def detect_sell_before_rise(
 
     Args:
         df: 包含價格與賣出訊號的 DataFrame
-        lookahead: 觀察未來幾根 (天/週等) K 線
+        lookahead: 觀察未來幾根 (天/週等) K 線;
+                   傳入列表時一次計算多個長度,回傳值改為每個長度一欄的 DataFrame
         rise_threshold: 未來最大漲幅閾值 (如 0.02 = 2%)
         price_col: 當前價格欄位 (用於計算漲幅)
         signal_col: 賣出訊號欄位名稱
@@ -37,12 +46,16 @@ def detect_sell_before_rise(
     """
     future_col = high_col if use_high else price_col
     future_max = _future_window_max(df[future_col].shift(-1), lookahead)
+    if isinstance(future_max, pd.DataFrame):
+        rise_pct = future_max.div(df[price_col], axis=0) - 1
+        sell_before_rise = (rise_pct >= rise_threshold) & df[signal_col].to_numpy()[:, None]
+        return sell_before_rise, rise_pct
     rise_pct = (future_max / df[price_col]) - 1
     sell_before_rise = df[signal_col] & (rise_pct >= rise_threshold)
     return sell_before_rise.fillna(False), rise_pct
 
 
-def generate_signals(df, p, mode, stock_type="DEFAULT"):
+def generate_signals(df, p, mode, stock_type="DEFAULT", inplace=False):
     """
     產生買賣訊號 - 重構版
     
@@ -56,11 +69,13 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
         p: 參數字典
         mode: 市場模式
         stock_type: 股票類型
+        inplace: 直接寫入 df 而不複製 (搭配 pipeline.allocate_frame)
     
     Returns:
         DataFrame: 加入買賣訊號後的資料
     """
-    df = df.copy()
+    if not inplace:
+        df = df.copy()
 
     # ========================================================
     # 1. 定義生命線 (StopLine) - 依股票類型調整
@@ -78,10 +93,10 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
     if stop_col not in df.columns:
         stop_col = "MA20"
     
-    df["StopLine"] = df[stop_col]
+    set_column(df, "StopLine", df[stop_col], inplace)
 
     # 計算乖離率 (用於判斷過熱)
-    df["Bias"] = (df["Close"] - df["MA20"]) / df["MA20"]
+    set_column(df, "Bias", (df["Close"] - df["MA20"]) / df["MA20"], inplace)
 
     # ========================================================
     # 2. 買進訊號 - 維持原邏輯
@@ -92,7 +107,7 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
     slope = (df[stop_col] - df[stop_col].shift(ma_lookback)) / df[stop_col].shift(ma_lookback)
     slope_threshold = p.get("MA_SLOPE_THRESHOLD", 0.005)
     is_trend_up = slope > slope_threshold
-    df["MA_Slope"] = slope
+    set_column(df, "MA_Slope", slope, inplace)
 
     # 型態強勢
     trend_strong = df["SanYang"] | df["SiHai"]
@@ -107,18 +122,18 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
         long_term_ok = True
 
     # 綜合買進條件
-    df["Buy_Signal"] = (
+    set_column(df, "Buy_Signal", (
         (df["Close"] > df["StopLine"]) & 
         is_trend_up & 
         trend_strong & 
         long_term_ok
-    )
+    ), inplace)
     
     # 買進原因標記
-    df["Buy_Reason"] = np.where(
+    set_column(df, "Buy_Reason", np.where(
         df["SiHai"], "FOUR_SEAS", 
         np.where(df["SanYang"], "THREE_SUNS", "TREND")
-    )
+    ), inplace)
 
     # ========================================================
     # 3. 賣出訊號 - 重構為「兩層式」
@@ -194,13 +209,13 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
     # 綜合賣出訊號
     # ========================================================
     
-    df["Sell_Signal"] = (
+    set_column(df, "Sell_Signal", (
         sell_profit |      # 獲利了結
         sell_big_vol |     # 結構破壞
         fake_break |       # 假突破
         sell_stopline |    # 趨勢停損
         hard_stop          # 硬停損
-    )
+    ), inplace)
 
     # ========================================================
     # 賣在起漲前判斷
@@ -214,8 +229,8 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
         rise_threshold=sell_rise_threshold,
         use_high=sell_use_high,
     )
-    df["Sell_Premature"] = sell_before_rise
-    df["Sell_Premature_RisePct"] = sell_rise_pct.fillna(0)
+    set_column(df, "Sell_Premature", sell_before_rise, inplace)
+    set_column(df, "Sell_Premature_RisePct", sell_rise_pct.fillna(0), inplace)
     
     # ========================================================
     # 賣出原因標記 (優先級排序)
@@ -236,24 +251,24 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
         "MA_BREAK"        # 均線破位
     ]
     
-    df["Sell_Reason_Raw"] = np.select(conditions, choices, default="NONE")
+    set_column(df, "Sell_Reason_Raw", np.select(conditions, choices, default="NONE"), inplace)
     
     # ========================================================
     # 輔助標記 (用於診斷)
     # ========================================================
     
     # 保護中狀態 (有破位但受保護)
-    df["In_Protection"] = tech_breakdown & is_protected
+    set_column(df, "In_Protection", tech_breakdown & is_protected, inplace)
     
     # 接近停損警告 (跌破 2 天)
-    df["Near_StopLine_Warn"] = (days_below == 2)
+    set_column(df, "Near_StopLine_Warn", (days_below == 2), inplace)
     
     # 個別賣出訊號 (用於分析)
-    df["Sell_Profit"] = sell_profit
-    df["Sell_BigVol"] = sell_big_vol
-    df["Sell_Fake"] = fake_break
-    df["Sell_StopLine_Raw"] = tech_breakdown
-    df["Sell_HardStop"] = hard_stop
+    set_column(df, "Sell_Profit", sell_profit, inplace)
+    set_column(df, "Sell_BigVol", sell_big_vol, inplace)
+    set_column(df, "Sell_Fake", fake_break, inplace)
+    set_column(df, "Sell_StopLine_Raw", tech_breakdown, inplace)
+    set_column(df, "Sell_HardStop", hard_stop, inplace)
     
     # ========================================================
     # 技術評分 (綜合健康度)
@@ -272,12 +287,12 @@ def generate_signals(df, p, mode, stock_type="DEFAULT"):
     score -= np.where(sell_profit, 10, 0)                   # 高檔過熱 -10
     score -= np.where(hard_stop, 40, 0)                     # 硬停損 -40
     
-    df["Tech_Score"] = score.clip(0, 100)
+    set_column(df, "Tech_Score", score.clip(0, 100), inplace)
     
     # ========================================================
     # 相容性欄位 (舊版程式可能會用到)
     # ========================================================
-    df["Sell_Core"] = sell_big_vol
-    df["Short_Signal"] = False  # 暫不支援做空
+    set_column(df, "Sell_Core", sell_big_vol, inplace)
+    set_column(df, "Short_Signal", False, inplace)  # 暫不支援做空
     
     return df
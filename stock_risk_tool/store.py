@@ -0,0 +1,388 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .utils import ensure_ohlcv
+from . import instrument
+
+# Parquet 需要 pyarrow 或 fastparquet,缺少時改用 pickle 儲存
+try:
+    import pyarrow.parquet as pq
+    _HAS_PARQUET = True
+except ImportError:
+    pq = None
+    try:
+        import fastparquet  # noqa: F401
+        _HAS_PARQUET = True
+    except ImportError:
+        _HAS_PARQUET = False
+
+
+def _to_date(value):
+    """將字串 / datetime / Timestamp 統一轉為 Timestamp (去除時間)"""
+    return pd.Timestamp(value).normalize()
+
+
+def _fmt(ts):
+    return ts.strftime("%Y-%m-%d")
+
+
+# =========================================================
+# 資料來源介面
+# =========================================================
+class FetchError(IOError):
+    """
+    下載失敗 (連線錯誤、被限流等),與「該區間沒有資料」不同
+
+    Args:
+        message: 錯誤訊息
+        failed: 下載失敗的股票代號 (空 = 整批失敗)
+        data: 同一批中成功下載的資料 {ticker: DataFrame}
+    """
+
+    def __init__(self, message, failed=(), data=None):
+        super().__init__(message)
+        self.failed = list(failed)
+        self.data = data or {}
+
+
+class PriceProvider:
+    """
+    價格資料來源介面
+
+    子類別需實作 fetch(),回傳 {ticker: 原始 DataFrame}。
+    回傳的資料不必標準化,PriceStore 會統一經過 ensure_ohlcv。
+    下載失敗時須拋出例外 (部分代號失敗時拋出 FetchError),
+    不可回傳空結果,否則該區間會被記錄為「沒有資料」而不再下載。
+    """
+
+    def fetch(self, tickers, start, end):
+        """
+        下載指定區間的資料
+
+        Args:
+            tickers: 股票代號列表
+            start: 起始日 (含), "YYYY-MM-DD"
+            end: 結束日 (含), "YYYY-MM-DD"
+
+        Returns:
+            dict: {ticker: DataFrame},查無資料的代號可省略
+
+        Raises:
+            FetchError: 下載失敗
+        """
+        raise NotImplementedError
+
+
+# yfinance 對查無資料 (假日、上市前 / 下市後) 的錯誤訊息,不視為下載失敗
+_YF_NO_DATA = ("no price data found", "no data found", "delisted")
+
+
+class YFinanceProvider(PriceProvider):
+    """yfinance 資料來源 (預設)"""
+
+    def __init__(self, auto_adjust=True):
+        self.auto_adjust = auto_adjust
+
+    def fetch(self, tickers, start, end):
+        import yfinance as yf
+
+        # yfinance 的 end 為不含,需往後多推一天
+        end_excl = _fmt(_to_date(end) + timedelta(days=1))
+        raw = yf.download(
+            list(tickers), start=start, end=end_excl,
+            group_by="ticker", auto_adjust=self.auto_adjust, progress=False
+        )
+        # yf.download 不會拋出例外,失敗原因記在 yf.shared._ERRORS
+        errors = getattr(getattr(yf, "shared", None), "_ERRORS", None) or {}
+        failed = [
+            t for t in tickers
+            if t.upper() in errors
+            and not any(k in str(errors[t.upper()]).lower() for k in _YF_NO_DATA)
+        ]
+        out = self._split(raw, tickers)
+        if failed:
+            out = {t: df for t, df in out.items() if t not in failed}
+            raise FetchError(f"下載失敗: {', '.join(failed)}", failed=failed, data=out)
+        return out
+
+    @staticmethod
+    def _split(raw, tickers):
+        """yf.download 的輸出拆成 {ticker: DataFrame}"""
+        if raw is None or raw.empty:
+            return {}
+
+        # 統一成 (ticker, field) 的欄位結構
+        if isinstance(raw.columns, pd.MultiIndex):
+            price_fields = {"Open", "High", "Low", "Close", "Volume"}
+            if len(set(raw.columns.get_level_values(0)) & price_fields) >= 4:
+                raw = raw.swaplevel(axis=1).sort_index(axis=1)
+        else:
+            # 單一代號時 yfinance 可能回傳單層欄位
+            return {tickers[0]: raw} if len(tickers) == 1 else {}
+
+        out = {}
+        available = set(raw.columns.get_level_values(0))
+        for t in tickers:
+            if t in available:
+                out[t] = raw[t]
+        return out
+
+
+class LocalFileProvider(PriceProvider):
+    """
+    本地檔案資料來源 (CSV / Parquet)
+
+    目錄下每檔股票一個檔案,例如 2330.TW.csv 或 2330.TW.parquet,
+    可在測試或離線環境中取代 yfinance。
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _read(self, ticker):
+        parquet_path = os.path.join(self.root, f"{ticker}.parquet")
+        csv_path = os.path.join(self.root, f"{ticker}.csv")
+        if os.path.exists(parquet_path):
+            return pd.read_parquet(parquet_path)
+        if os.path.exists(csv_path):
+            return pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        return None
+
+    def fetch(self, tickers, start, end):
+        start_ts, end_ts = _to_date(start), _to_date(end)
+        out = {}
+        for t in tickers:
+            df = self._read(t)
+            if df is None:
+                continue
+            df.index = pd.to_datetime(df.index)
+            df = df[(df.index >= start_ts) & (df.index <= end_ts)]
+            if not df.empty:
+                out[t] = df
+        return out
+
+
+# =========================================================
+# 本地價格倉儲
+# =========================================================
+class PriceStore:
+    """
+    本地 OHLCV 倉儲 - 只下載缺少的區間
+
+    每檔股票存成一個欄式檔案 (Parquet,無 pyarrow 時退回 pickle),
+    內容為 ensure_ohlcv 標準化後的資料;另以 _index.json 記錄
+    每檔已查詢過的日期範圍,避免假日或停牌日重複下載。
+
+    Args:
+        root: 儲存目錄
+        provider: PriceProvider 實例 (預設 yfinance)
+    """
+
+    INDEX_FILE = "_index.json"
+
+    def __init__(self, root, provider=None):
+        self.root = root
+        self.provider = provider or YFinanceProvider()
+        self.ext = ".parquet" if _HAS_PARQUET else ".pkl"
+        self.failed = {}      # 最近一次 update 下載失敗的 {ticker: 原因}
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+
+    # ---------- 檔案讀寫 ----------
+    def _index_path(self):
+        return os.path.join(self.root, self.INDEX_FILE)
+
+    def _load_index(self):
+        path = self._index_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self):
+        tmp = self._index_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path())
+
+    def _path(self, ticker):
+        return os.path.join(self.root, f"{ticker}{self.ext}")
+
+    def _read(self, ticker):
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return None
+        if self.ext == ".parquet":
+            # 直接用 pyarrow 讀取,省去 pd.read_parquet 的額外開銷 (約快一倍)
+            if pq is not None:
+                return pq.ParquetFile(path).read().to_pandas()
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    def _write(self, ticker, df):
+        path = self._path(ticker)
+        tmp = path + ".tmp"
+        if self.ext == ".parquet":
+            df.to_parquet(tmp)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    # ---------- 缺口計算 ----------
+    def coverage(self, ticker):
+        """回傳已查詢過的 (start, end) Timestamp,無紀錄時回傳 None"""
+        span = self._index.get(ticker)
+        if not span:
+            return None
+        return _to_date(span[0]), _to_date(span[1])
+
+    def missing_ranges(self, ticker, start, end):
+        """
+        計算需要下載的日期區間
+
+        最後一天會重新下載 (盤中資料可能不完整),
+        因此往後補資料時從已存的結束日開始抓。
+
+        Returns:
+            list: [(start, end), ...] Timestamp 區間
+        """
+        start, end = _to_date(start), _to_date(end)
+        span = self.coverage(ticker)
+        if span is None:
+            return [(start, end)]
+
+        cov_start, cov_end = span
+        ranges = []
+        if start < cov_start:
+            ranges.append((start, cov_start - timedelta(days=1)))
+        if end > cov_end:
+            ranges.append((cov_end, end))
+        return ranges
+
+    # ---------- 主要介面 ----------
+    def update(self, tickers, start, end):
+        """
+        補齊多檔股票在 [start, end] 的資料
+
+        相同缺口的股票合併成一次 provider.fetch 呼叫。
+
+        下載成功的區間即使沒有任何 K 棒 (假日、上市前 / 下市後) 也會記錄,
+        之後不再重複下載;provider 拋出例外或資料格式錯誤的股票不記錄,
+        下次呼叫時重新下載。部分代號失敗 (FetchError) 時記在 self.failed,
+        其他例外在儲存已完成的範圍後往上拋出。
+
+        Returns:
+            list: 本次有下載的股票代號
+        """
+        groups = {}
+        for t in tickers:
+            for rng in self.missing_ranges(t, start, end):
+                groups.setdefault(rng, []).append(t)
+
+        self.failed = {}
+        fetched = set()
+        try:
+            for (rng_start, rng_end), group in groups.items():
+                failed = set()
+                try:
+                    with instrument.stage("download"):
+                        data = self.provider.fetch(group, _fmt(rng_start), _fmt(rng_end))
+                except FetchError as e:
+                    data = e.data
+                    failed = set(e.failed or group)
+                    self.failed.update((t, str(e)) for t in failed)
+                for t in group:
+                    if t in failed:
+                        continue
+                    new = data.get(t)
+                    if new is not None and not new.empty:
+                        try:
+                            with instrument.stage("ensure_ohlcv", t):
+                                new = ensure_ohlcv(new)
+                        except ValueError as e:
+                            self.failed[t] = str(e)
+                            continue
+                        self._merge(t, new)
+                        fetched.add(t)
+                    self._extend_coverage(t, rng_start, rng_end)
+        finally:
+            if groups:
+                self._save_index()
+        return sorted(fetched)
+
+    def _merge(self, ticker, new):
+        old = self._read(ticker)
+        if old is not None and not old.empty:
+            combined = pd.concat([old, new])
+            # 重疊日期以新下載的資料為準
+            combined = combined[~combined.index.duplicated(keep="last")]
+            new = combined.sort_index()
+        self._write(ticker, new)
+
+    def _extend_coverage(self, ticker, start, end):
+        span = self.coverage(ticker)
+        if span is not None:
+            start, end = min(start, span[0]), max(end, span[1])
+        self._index[ticker] = [_fmt(start), _fmt(end)]
+
+    def load(self, ticker, start, end=None):
+        """
+        讀取單檔股票資料 (必要時先補齊缺口)
+
+        Args:
+            ticker: 股票代號
+            start: 起始日
+            end: 結束日 (預設今天)
+
+        Returns:
+            DataFrame: 標準 OHLCV 資料,查無資料時回傳 None
+        """
+        return self.load_many([ticker], start, end).get(ticker)
+
+    def load_many(self, tickers, start, end=None):
+        """
+        讀取多檔股票資料 (必要時先補齊缺口)
+
+        Args:
+            tickers: 股票代號列表
+            start: 起始日
+            end: 結束日 (預設今天)
+
+        Returns:
+            dict: {ticker: DataFrame},查無資料的代號不會出現
+        """
+        end = end or datetime.today().strftime("%Y-%m-%d")
+        self.update(tickers, start, end)
+
+        start_ts, end_ts = _to_date(start), _to_date(end)
+        out = {}
+        for t in tickers:
+            df = self._read(t)
+            if df is None:
+                continue
+            df = df[(df.index >= start_ts) & (df.index <= end_ts)]
+            if not df.empty:
+                out[t] = df
+        return out
+
+    def tail(self, ticker, n_bars, end=None):
+        """
+        讀取本地已存的最後 n_bars 根 K 棒 (不下載)
+
+        Args:
+            ticker: 股票代號
+            n_bars: K 棒數
+            end: 截止日 (含),None 表示不限
+
+        Returns:
+            DataFrame: 標準 OHLCV 資料,無本地資料時回傳 None
+        """
+        df = self._read(ticker)
+        if df is None or df.empty:
+            return None
+        if end is not None:
+            df = df[df.index <= _to_date(end)]
+        return df.iloc[-n_bars:] if len(df) else None
@@ -0,0 +1,322 @@
+import math
+from collections import deque
+
+import pandas as pd
+
+# add_indicators 新增的欄位 (依計算順序)
+INDICATOR_COLS = [
+    "MA5", "MA10", "MA20", "MA60", "MA240",
+    "VOL_MA", "ATRp", "RSI", "K", "D", "MACD_Hist",
+    "OBV", "OBV_MA20",
+    "Is_Big_Vol", "BigVol_Low", "Is_Big_Red", "Gap_Up",
+    "SanYang", "SiHai",
+    "GapUp", "Gap_Support", "Breakout", "Wash", "BigVol_Confirmed",
+]
+
+NAN = float("nan")
+
+
+def _div(a, b):
+    """與 NumPy 浮點除法相同的結果 (除以 0 得 inf / NaN,不拋例外)"""
+    if b == 0:
+        if a != a or a == 0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+# =========================================================
+# 基本串流元件
+# =========================================================
+class RollingMean:
+    """
+    固定視窗移動平均 - O(1) 更新
+
+    與 pandas rolling(n).mean() 使用相同的 Kahan 補償加減法,
+    因此逐筆結果與批次計算一致。
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.window = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_ct = 0
+        self.prev_value = None
+
+    def update(self, val):
+        self.window.append(val)
+
+        if self.prev_value is None:
+            # 第一筆: pandas 以視窗起點初始化 prev_value
+            self.prev_value = val
+
+        if len(self.window) > self.n:
+            old = self.window.popleft()
+            if old == old:
+                self.nobs -= 1
+                y = -old - self.comp_remove
+                t = self.sum_x + y
+                self.comp_remove = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    self.neg_ct -= 1
+
+        if val == val:
+            self.nobs += 1
+            y = val - self.comp_add
+            t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.same_ct += 1
+            else:
+                self.same_ct = 1
+            self.prev_value = val
+
+        if self.nobs >= self.n and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.same_ct >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.0
+            return result
+        return NAN
+
+
+class RollingExtreme:
+    """
+    固定視窗最大 / 最小值 - 單調佇列,攤銷 O(1)
+
+    視窗內有 NaN 時 (有效筆數 < n) 回傳 NaN,同 pandas rolling(n)。
+    """
+
+    def __init__(self, n, mode="max"):
+        self.n = n
+        self.is_max = mode == "max"
+        self.queue = deque()   # (index, value),值單調
+        self.nan_idx = deque()
+        self.i = -1
+
+    def update(self, val):
+        self.i += 1
+        start = self.i - self.n + 1
+
+        while self.queue and self.queue[0][0] < start:
+            self.queue.popleft()
+        while self.nan_idx and self.nan_idx[0] < start:
+            self.nan_idx.popleft()
+
+        if val != val:
+            self.nan_idx.append(self.i)
+        else:
+            if self.is_max:
+                while self.queue and self.queue[-1][1] <= val:
+                    self.queue.pop()
+            else:
+                while self.queue and self.queue[-1][1] >= val:
+                    self.queue.pop()
+            self.queue.append((self.i, val))
+
+        if start < 0 or self.nan_idx:
+            return NAN
+        return self.queue[0][1]
+
+
+class EWMMean:
+    """
+    指數加權平均 - O(1) 更新
+
+    對應 pandas ewm(com/span).mean() 的預設設定
+    (adjust=True, ignore_na=False, min_periods=0)。
+    """
+
+    def __init__(self, com=None, span=None):
+        if com is not None:
+            alpha = 1.0 / (1.0 + com)
+        else:
+            alpha = 2.0 / (span + 1.0)
+        self.old_wt_factor = 1.0 - alpha
+        self.new_wt = 1.0
+        self.weighted = None
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, cur):
+        is_obs = cur == cur
+        self.nobs += int(is_obs)
+
+        if self.weighted is None:
+            self.weighted = cur
+        elif self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_obs:
+                # 常數序列時避免數值誤差
+                if self.weighted != cur:
+                    w = self.old_wt * self.weighted + self.new_wt * cur
+                    self.weighted = w / (self.old_wt + self.new_wt)
+                self.old_wt += self.new_wt
+        elif is_obs:
+            self.weighted = cur
+
+        return self.weighted if self.nobs >= 1 else NAN
+
+
+# =========================================================
+# 串流指標引擎
+# =========================================================
+class StreamingIndicators:
+    """
+    串流技術指標 - 每新增一根 K 棒只做 O(1) 更新
+
+    先以 seed() 載入歷史資料,之後每根新 K 棒呼叫 update(),
+    輸出欄位與 add_indicators 完全相同。物件可直接 pickle 保存狀態。
+
+    Args:
+        p: 參數字典
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.mas = {ma: RollingMean(p[ma]) for ma in ["MA5", "MA10", "MA20", "MA60", "MA240"] if p.get(ma)}
+        self.vol_ma = RollingMean(p["VOL_MA"])
+        self.atr = RollingMean(p["ATR_N"])
+        self.gain = RollingMean(p["RSI_N"])
+        self.loss = RollingMean(p["RSI_N"])
+        self.low_min = RollingExtreme(p["KD_N"], "min")
+        self.high_max = RollingExtreme(p["KD_N"], "max")
+        self.k = EWMMean(com=2)
+        self.d = EWMMean(com=2)
+        self.ema_fast = EWMMean(span=p["MACD_FAST"])
+        self.ema_slow = EWMMean(span=p["MACD_SLOW"])
+        self.macd_signal = EWMMean(span=p["MACD_SIGNAL"])
+        self.obv_ma = RollingMean(20)
+
+        self.prev_close = NAN
+        self.prev_high = NAN
+        self.obv = 0.0
+        self.bigvol_low = NAN
+        self.n_bars = 0
+        self.last_index = None
+
+    def update(self, bar, ts=None):
+        """
+        加入一根新 K 棒
+
+        Args:
+            bar: 含 Open/High/Low/Close/Volume 的 dict 或 Series
+            ts: K 棒時間 (選用)
+
+        Returns:
+            dict: 原始欄位 + 所有指標欄位
+        """
+        p = self.p
+        o, h, l, c, v = (float(bar[k]) for k in ("Open", "High", "Low", "Close", "Volume"))
+        row = dict(bar)
+
+        # 1. 均線系統
+        for ma, roll in self.mas.items():
+            row[ma] = roll.update(c)
+
+        # 2. 量能指標
+        vol_ma = self.vol_ma.update(v)
+        row["VOL_MA"] = vol_ma
+
+        # 3. 波動率指標 (True Range 取非 NaN 的最大值)
+        pc = self.prev_close
+        trs = [x for x in (h - l, abs(h - pc), abs(l - pc)) if x == x]
+        tr = max(trs) if trs else NAN
+        row["ATRp"] = self.atr.update(tr) / c
+
+        # 4. RSI
+        delta = c - pc
+        gain = delta if delta > 0 else 0.0
+        loss = -(delta if delta < 0 else 0.0)
+        rs = _div(self.gain.update(gain), self.loss.update(loss))
+        inv = _div(100.0, 1.0 + rs)
+        row["RSI"] = 100 - (inv if inv == inv else 50)
+
+        # 5. KD
+        low_min = self.low_min.update(l)
+        high_max = self.high_max.update(h)
+        rsv = _div(c - low_min, high_max - low_min) * 100
+        k = self.k.update(rsv)
+        row["K"] = k
+        row["D"] = self.d.update(k)
+
+        # 6. MACD
+        macd_line = self.ema_fast.update(c) - self.ema_slow.update(c)
+        row["MACD_Hist"] = macd_line - self.macd_signal.update(macd_line)
+
+        # 7. OBV
+        if delta == delta:
+            sign = (delta > 0) - (delta < 0)
+            step = sign * v
+            self.obv += step if step == step else 0.0
+        row["OBV"] = self.obv
+        row["OBV_MA20"] = self.obv_ma.update(self.obv)
+
+        # 8. 老王戰法核心指標 (與 NaN 比較一律為 False,同 pandas)
+        is_big_vol = v > vol_ma * p["BIGVOL_MULT"]
+        row["Is_Big_Vol"] = is_big_vol
+        if is_big_vol and l == l:
+            self.bigvol_low = l
+        row["BigVol_Low"] = self.bigvol_low
+
+        row["Is_Big_Red"] = _div(c - o, o) > p["BIG_RED_BODY_PCT"]
+        row["Gap_Up"] = l > self.prev_high
+
+        san_yang = (
+            c > row.get("MA5", NAN) and
+            c > row.get("MA10", NAN) and
+            c > row.get("MA20", NAN)
+        )
+        row["SanYang"] = san_yang
+        row["SiHai"] = san_yang and c > row.get("MA60", NAN)
+
+        # 9. 相容性欄位
+        row["GapUp"] = row["Gap_Up"]
+        row["Gap_Support"] = False
+        row["Breakout"] = False
+        row["Wash"] = False
+        row["BigVol_Confirmed"] = True
+
+        self.prev_close = c
+        self.prev_high = h
+        self.n_bars += 1
+        self.last_index = ts
+        return row
+
+    def seed(self, df):
+        """
+        以歷史資料初始化狀態
+
+        Args:
+            df: OHLCV DataFrame
+
+        Returns:
+            DataFrame: 歷史區間的指標 (與 add_indicators 相同)
+        """
+        rows = [self.update(bar, ts) for ts, bar in zip(df.index, df.to_dict("records"))]
+        return pd.DataFrame(rows, index=df.index)
+
+    def update_frame(self, df):
+        """
+        加入多根新 K 棒 (略過已處理過的日期)
+
+        Args:
+            df: 含新資料的 OHLCV DataFrame
+
+        Returns:
+            DataFrame: 新 K 棒的指標
+        """
+        if self.last_index is not None:
+            df = df[df.index > self.last_index]
+        return self.seed(df)
@@ -0,0 +1,240 @@
+import itertools
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .indicators import PARAM_KEYS as INDICATOR_KEYS, add_indicators
+from .rolling import RollingMemo
+from .signals import generate_signals
+from .backtest import backtest_fsm
+
+OHLCV_COLS = ["Open", "High", "Low", "Close", "Volume"]
+RESULT_COLS = ["total_return", "dd", "winrate", "profit_factor", "trades"]
+
+# 每個 worker 行程的共享狀態 (由 _init_worker 設定)
+_WORKER = {}
+_INDICATOR_MEMO_SIZE = 8
+
+
+# =========================================================
+# 參數組合產生
+# =========================================================
+def param_grid(space):
+    """
+    產生完整網格的參數組合
+
+    Args:
+        space: {參數名: [候選值, ...]}
+
+    Returns:
+        list: [{參數名: 值}, ...]
+    """
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def param_sample(space, n, seed=None):
+    """
+    隨機抽樣參數組合
+
+    Args:
+        space: {參數名: [候選值, ...] 或 (下限, 上限)}
+               tuple 代表連續區間 (兩端皆為整數時抽整數)
+        n: 抽樣組數
+        seed: 亂數種子
+
+    Returns:
+        list: [{參數名: 值}, ...]
+    """
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        combo = {}
+        for k, v in space.items():
+            if isinstance(v, tuple):
+                lo, hi = v
+                if isinstance(lo, int) and isinstance(hi, int):
+                    combo[k] = rng.randint(lo, hi)
+                else:
+                    combo[k] = rng.uniform(lo, hi)
+            else:
+                combo[k] = rng.choice(list(v))
+        out.append(combo)
+    return out
+
+
+# =========================================================
+# 共享 OHLCV (memmap,不經 pickle 傳給 worker)
+# =========================================================
+def _share_ohlcv(data, tmpdir):
+    """將所有股票的 OHLCV 串接寫成 .npy,worker 以 memmap 唯讀開啟"""
+    tickers = list(data)
+    slices = {}
+    offset = 0
+    for t in tickers:
+        slices[t] = (offset, offset + len(data[t]))
+        offset += len(data[t])
+
+    values = np.empty((offset, len(OHLCV_COLS)), dtype=float)
+    dates = np.empty(offset, dtype="datetime64[ns]")
+    for t in tickers:
+        a, b = slices[t]
+        values[a:b] = data[t][OHLCV_COLS].to_numpy(dtype=float)
+        dates[a:b] = data[t].index.values.astype("datetime64[ns]")
+
+    values_path = os.path.join(tmpdir, "ohlcv.npy")
+    dates_path = os.path.join(tmpdir, "dates.npy")
+    np.save(values_path, values)
+    np.save(dates_path, dates)
+    return values_path, dates_path, slices
+
+
+def _init_worker(values_path, dates_path, slices, base_p, stock_types):
+    _WORKER["values"] = np.load(values_path, mmap_mode="r")
+    _WORKER["dates"] = np.load(dates_path, mmap_mode="r")
+    _WORKER["slices"] = slices
+    _WORKER["base_p"] = base_p
+    _WORKER["stock_types"] = stock_types
+    _WORKER["memo"] = {}
+    _WORKER["rolling"] = {}
+
+
+def _worker_rolling(ticker):
+    """每檔股票一個 RollingMemo,不同指標參數共用相同視窗的滾動運算"""
+    memos = _WORKER["rolling"]
+    memo = memos.get(ticker)
+    if memo is None:
+        a, b = _WORKER["slices"][ticker]
+        ohlcv = pd.DataFrame(
+            np.array(_WORKER["values"][a:b]),
+            index=pd.DatetimeIndex(np.array(_WORKER["dates"][a:b])),
+            columns=OHLCV_COLS,
+        )
+        if len(memos) >= _INDICATOR_MEMO_SIZE:
+            memos.pop(next(iter(memos)))
+        memo = memos[ticker] = RollingMemo(ohlcv)
+    return memo
+
+
+def _worker_indicators(ticker, ind_items):
+    """同一檔股票、同一組指標參數只計算一次指標"""
+    memo = _WORKER["memo"]
+    key = (ticker, ind_items)
+    if key in memo:
+        return memo[key]
+
+    rolling = _worker_rolling(ticker)
+    p = dict(_WORKER["base_p"])
+    p.update(ind_items)
+    df = add_indicators(rolling.frame, p, memo=rolling)
+
+    if len(memo) >= _INDICATOR_MEMO_SIZE:
+        memo.pop(next(iter(memo)))
+    memo[key] = df
+    return df
+
+
+def _run_task(ticker, ind_items, overrides):
+    """單一任務: 一檔股票 × 一組指標參數 × 多組訊號/回測參數"""
+    df_ind = _worker_indicators(ticker, ind_items)
+    stock_type = _WORKER["stock_types"].get(ticker, "DEFAULT")
+
+    rows = []
+    for ov in overrides:
+        p = dict(_WORKER["base_p"])
+        p.update(ov)
+        df = generate_signals(df_ind, p, mode="OldWang", stock_type=stock_type)
+        res = backtest_fsm(df, p, stock_type=stock_type)
+
+        row = dict(ov)
+        row["ticker"] = ticker
+        for col in RESULT_COLS:
+            row[col] = res.get(col, np.nan)
+        rows.append(row)
+    return rows
+
+
+def _build_tasks(tickers, overrides, chunk_size):
+    """依 (股票, 指標參數子集) 分組,確保指標只算一次"""
+    groups = {}
+    for ov in overrides:
+        ind_items = tuple(sorted((k, v) for k, v in ov.items() if k in INDICATOR_KEYS))
+        groups.setdefault(ind_items, []).append(ov)
+
+    tasks = []
+    for t in tickers:
+        for ind_items, group in groups.items():
+            size = chunk_size or len(group)
+            for i in range(0, len(group), size):
+                tasks.append((t, ind_items, group[i:i + size]))
+    return tasks
+
+
+# =========================================================
+# 主要介面
+# =========================================================
+def iter_sweep(data, overrides, p=None, stock_types=None, max_workers=None, chunk_size=None):
+    """
+    參數掃描 - 逐批回傳結果
+
+    Args:
+        data: {ticker: OHLCV DataFrame} (ensure_ohlcv 格式)
+        overrides: 參數覆寫列表 (param_grid / param_sample 的輸出)
+        p: 基準參數字典 (預設 config.P)
+        stock_types: {ticker: 股票類型} (預設 config.TICKERS_CONFIG)
+        max_workers: 行程數 (1 = 在目前行程執行,None = CPU 核心數)
+        chunk_size: 每個任務包含的參數組數 (預設同一檔股票全部一起跑)
+
+    Yields:
+        dict: 一列結果 (參數..., ticker, total_return, dd, winrate, profit_factor, trades)
+    """
+    base_p = dict(p if p is not None else config.P)
+    stock_types = dict(stock_types if stock_types is not None else config.TICKERS_CONFIG)
+    tasks = _build_tasks(list(data), list(overrides), chunk_size)
+    if not tasks:
+        return
+
+    with tempfile.TemporaryDirectory(prefix="sweep_") as tmpdir:
+        init_args = _share_ohlcv(data, tmpdir) + (base_p, stock_types)
+
+        if max_workers == 1:
+            # 呼叫端提前停止迭代或任務拋出例外時,也要釋放 memmap 與指標快取
+            _init_worker(*init_args)
+            try:
+                for task in tasks:
+                    yield from _run_task(*task)
+            finally:
+                _WORKER.clear()
+            return
+
+        ex = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, initargs=init_args
+        )
+        try:
+            futures = [ex.submit(_run_task, *task) for task in tasks]
+            for fut in as_completed(futures):
+                yield from fut.result()
+        finally:
+            # 呼叫端提前停止迭代或任務失敗時,取消尚未開始的任務,不等它們跑完
+            ex.shutdown(wait=False, cancel_futures=True)
+
+
+def run_sweep(data, overrides, p=None, stock_types=None, max_workers=None, chunk_size=None):
+    """
+    參數掃描 - 回傳整理好的結果表
+
+    參數同 iter_sweep。
+
+    Returns:
+        DataFrame: 每列一組 (參數, 股票) 的回測結果
+    """
+    rows = list(iter_sweep(data, overrides, p, stock_types, max_workers, chunk_size))
+    keys = []
+    for ov in overrides:
+        keys.extend(k for k in ov if k not in keys)
+    return pd.DataFrame(rows, columns=keys + ["ticker"] + RESULT_COLS)
@@ -1,18 +1,67 @@
 import pandas as pd
 import numpy as np
 
-def ensure_schema(df, stage="signals"):
+# pipeline.allocate_frame 附加在 DataFrame 上的欄位位置 {欄位: (2D 陣列, 列)}
+# (不在 pandas 的 _metadata 中,copy / 切片產生的新表不會帶著它)
+_SLOTS_ATTR = "_column_slots"
+
+
+def bind_column_slots(df, slots):
+    """
+    記錄預先配置欄位的底層陣列位置,之後 set_column(inplace=True) 直接寫入
+
+    Args:
+        df: 包裝這些陣列 (不複製) 的 DataFrame
+        slots: {欄位: (2D ndarray, 列索引)}
+    """
+    object.__setattr__(df, _SLOTS_ATTR, slots)
+
+
+def set_column(df, col, values, inplace=False):
+    """
+    寫入欄位
+
+    inplace 且欄位由 pipeline.allocate_frame 預先配置時,直接寫進底層陣列;
+    pandas 3 的 copy-on-write 下 df.loc[:, col] = values 會換掉整個欄位陣列,
+    不會寫入預先配置的區塊。
+
+    Args:
+        df: 目標 DataFrame
+        col: 欄位名稱
+        values: Series / ndarray / 純量
+        inplace: 是否寫入預先配置的欄位
+    """
+    slots = df.__dict__.get(_SLOTS_ATTR) if inplace else None
+    if isinstance(values, pd.Series):
+        values = values.to_numpy() if inplace else values
+    if slots is not None and col in slots:
+        arr, row = slots[col]
+        if arr.dtype == object and getattr(values, "dtype", None) is not None \
+                and values.dtype.kind == "U":
+            # 原因欄位只有少數幾種值: 共用字串物件,避免每列各建一個 str
+            labels, codes = np.unique(values, return_inverse=True)
+            values = labels.astype(object)[codes]
+        arr[row] = values
+    elif inplace and col in df.columns:
+        df.loc[:, col] = values
+    else:
+        df[col] = values
+
+
+def ensure_schema(df, stage="signals", inplace=False):
     """
     確保 DataFrame 包含所有必要欄位
     
     Args:
         df: 輸入的 DataFrame
         stage: 處理階段 (用於未來擴展)
+        inplace: 直接修改 df 而不複製
     
     Returns:
         DataFrame: 補齊欄位後的資料
     """
-    df = df.copy()
+    if not inplace:
+        df = df.copy()
     
     # 定義所有可能用到的欄位,預設為 NaN 或 False
     base_cols = {
@@ -66,7 +115,7 @@ def ensure_schema(df, stage="signals"):
     # 確保布林值欄位正確型別
     bool_cols = ["Buy_Signal", "Sell_Signal", "Sell_Core", "Sell_StopLine", "Sell_Premature"]
     for c in bool_cols:
-        if c in df.columns:
+        if c in df.columns and df[c].dtype != bool:
             df[c] = df[c].fillna(False).astype(bool)
 
     return df
@@ -0,0 +1,217 @@
+# =========================================================
+# Walk-forward 最佳化 - 樣本內調參、樣本外驗證
+#
+# 1. 每組參數的指標 / 訊號只在完整歷史上算一次 (StagedPipeline 快取,
+#    指標相同的組合共用),各視窗直接切片使用;
+#    指標與訊號都只看過去資料,切片結果與「帶暖機資料的視窗」相同
+# 2. 每個視窗: 訓練區間回測所有組合 -> 取目標最佳者 -> 在測試區間回測
+# 3. 各視窗平行執行 (多行程),最後串接樣本外權益曲線
+# =========================================================
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .backtest import backtest_fsm
+from .pipeline import StagedPipeline
+from .utils import ensure_schema
+
+# backtest_fsm 至少需要的 K 棒數
+MIN_WINDOW_BARS = 100
+
+# 回測需要的欄位 (傳給 worker 前先裁切,減少序列化量)
+_BACKTEST_COLS = ["Close", "High", "Buy_Signal", "Sell_Signal", "Buy_Reason", "Sell_Reason_Raw"]
+
+# 每個 worker 行程的共享狀態 (由 _init_worker 設定)
+_WORKER = {}
+
+
+def walk_forward_windows(n_bars, train, test, step=None, start=0, anchored=False):
+    """
+    產生訓練 / 測試視窗 (列索引,左閉右開)
+
+    最後不足一個測試長度的尾段,若仍有 MIN_WINDOW_BARS 根則保留為較短的測試視窗。
+
+    Args:
+        n_bars: 資料總長度
+        train: 訓練視窗長度
+        test: 測試視窗長度
+        step: 視窗位移 (預設 = test,測試區間首尾相接)
+        start: 第一個訓練視窗的起點
+        anchored: True 時訓練起點固定在 start (擴張視窗)
+
+    Returns:
+        list: [(train_start, train_end, test_start, test_end), ...]
+
+    Raises:
+        ValueError: 視窗長度小於 MIN_WINDOW_BARS,或 step 小於 test (測試區間重疊)
+    """
+    if train < MIN_WINDOW_BARS or test < MIN_WINDOW_BARS:
+        raise ValueError(f"訓練 / 測試視窗至少需要 {MIN_WINDOW_BARS} 根 K 棒")
+    step = step or test
+    if step < test:
+        raise ValueError("step 不可小於 test,否則測試區間重疊無法串接")
+
+    windows = []
+    offset = start
+    while offset + train + MIN_WINDOW_BARS <= n_bars:
+        train_start = start if anchored else offset
+        test_start = offset + train
+        test_end = min(test_start + test, n_bars)
+        windows.append((train_start, test_start, test_start, test_end))
+        offset += step
+    return windows
+
+
+def _score(result, objective):
+    if callable(objective):
+        return objective(result)
+    return result.get(objective, np.nan)
+
+
+def _window_context(frames, config_keys, overrides, base_p, stock_type):
+    return {
+        "frames": frames,
+        "config_keys": config_keys,
+        "overrides": overrides,
+        "base_p": base_p,
+        "stock_type": stock_type,
+    }
+
+
+def _init_worker(*args):
+    _WORKER.update(_window_context(*args))
+
+
+def _run_window_worker(window, objective, min_trades):
+    """子行程入口 (讀取 _init_worker 建立的資料)"""
+    return _run_window(_WORKER, window, objective, min_trades)
+
+
+def _run_window(ctx, window, objective, min_trades):
+    """單一視窗: 訓練區間選出最佳組合,再於測試區間回測"""
+    train_start, train_end, test_start, test_end = window
+    frames = ctx["frames"]
+    config_keys = ctx["config_keys"]
+    overrides = ctx["overrides"]
+    base_p = ctx["base_p"]
+    stock_type = ctx["stock_type"]
+
+    best, best_score = None, -np.inf
+    for i, ov in enumerate(overrides):
+        p = dict(base_p, **ov)
+        df = frames[config_keys[i]].iloc[train_start:train_end]
+        res = backtest_fsm(df, p, stock_type=stock_type)
+        if res["trades"] < min_trades:
+            continue
+        score = _score(res, objective)
+        if best is None or score > best_score:
+            best, best_score = i, score
+
+    # 沒有組合達到最少交易筆數時,沿用第一組 (通常為基準參數)
+    chosen = 0 if best is None else best
+    p = dict(base_p, **overrides[chosen])
+    full = frames[config_keys[chosen]]
+    df = full.iloc[test_start:test_end]
+    res = backtest_fsm(df, p, stock_type=stock_type)
+
+    row = {
+        "train_start": full.index[train_start],
+        "train_end": full.index[train_end - 1],
+        "test_start": df.index[0],
+        "test_end": df.index[-1],
+        "config": chosen,
+        "params": overrides[chosen],
+        "train_score": best_score if best is not None else np.nan,
+        "test_return": res["total_return"],
+        "test_dd": res.get("dd", np.nan),
+        "test_trades": res["trades"],
+        "test_winrate": res["winrate"],
+    }
+    return row, res["df"]["Equity"].to_numpy()
+
+
+def walk_forward(ohlcv, overrides, p=None, stock_type="DEFAULT", train=500, test=125,
+                 step=None, start=0, anchored=False, objective="total_return",
+                 min_trades=1, max_workers=None):
+    """
+    Walk-forward 最佳化
+
+    Args:
+        ohlcv: 單檔 OHLCV DataFrame (ensure_ohlcv 格式)
+        overrides: 參數覆寫列表 (sweep.param_grid / param_sample 的輸出)
+        p: 基準參數字典 (預設 config.P)
+        stock_type: 股票類型
+        train: 訓練視窗長度 (K 棒)
+        test: 測試視窗長度 (K 棒)
+        step: 視窗位移 (預設 = test)
+        start: 第一個訓練視窗的起點
+        anchored: 是否固定訓練起點 (擴張視窗)
+        objective: 最佳化目標,回測結果的鍵 (如 "total_return"、"profit_factor")
+                   或 callable(result) -> float
+        min_trades: 訓練區間最少交易筆數 (不足的組合不列入比較)
+        max_workers: 行程數 (1 = 在目前行程執行,None = CPU 核心數)
+
+    Returns:
+        dict:
+            windows: 每個視窗一列 (日期、選中的參數、訓練分數、測試績效)
+            equity: 串接後的樣本外權益曲線 (Series)
+            total_return: 樣本外總報酬
+            configs: 參數組數
+
+    Raises:
+        ValueError: 參數列表為空或資料不足一個視窗
+    """
+    overrides = [dict(ov) for ov in overrides]
+    if not overrides:
+        raise ValueError("參數組合不可為空")
+    base_p = dict(p if p is not None else config.P)
+    windows = walk_forward_windows(len(ohlcv), train, test, step, start, anchored)
+    if not windows:
+        raise ValueError(f"資料長度 {len(ohlcv)} 不足一個訓練 + 測試視窗")
+
+    # 指標 / 訊號在完整歷史上各算一次,訊號參數相同的組合共用同一張表
+    # (快取只在本次呼叫內使用,資料鍵固定即可)
+    stages = StagedPipeline()
+    frames, config_keys = {}, []
+    for ov in overrides:
+        cfg = dict(base_p, **ov)
+        key = stages.keys("ohlcv", cfg, stock_type)["signals"]
+        if key not in frames:
+            df, _ = stages.run(ohlcv, cfg, stock_type, data_key="ohlcv", backtest=False)
+            frames[key] = ensure_schema(df[_BACKTEST_COLS])
+        config_keys.append(key)
+    init_args = (frames, config_keys, overrides, base_p, stock_type)
+
+    if max_workers == 1 or len(windows) == 1:
+        # 在目前行程執行時直接傳入資料,不經過行程全域狀態
+        ctx = _window_context(*init_args)
+        outputs = [_run_window(ctx, w, objective, min_trades) for w in windows]
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(windows))
+        outputs = [None] * len(windows)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=init_args
+        ) as ex:
+            futures = {ex.submit(_run_window_worker, w, objective, min_trades): i
+                       for i, w in enumerate(windows)}
+            for fut in as_completed(futures):
+                outputs[futures[fut]] = fut.result()
+
+    # 串接樣本外權益: 每段從前一段的期末淨值接續
+    # (每個測試視窗都從空手開始,視窗交界的持倉視同以收盤價結清,不另計費用)
+    rows, parts, level = [], [], 1.0
+    for (row, equity), (_, _, test_start, test_end) in zip(outputs, windows):
+        parts.append(pd.Series(equity * level, index=ohlcv.index[test_start:test_end]))
+        level *= equity[-1]
+        rows.append(row)
+
+    equity = pd.concat(parts)
+    return {
+        "windows": pd.DataFrame(rows),
+        "equity": equity,
+        "total_return": float(equity.iloc[-1] - 1),
+        "configs": len(overrides),
+    }
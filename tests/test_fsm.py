@@ -0,0 +1,111 @@
+# =========================================================
+# fsm.run_fsm 各引擎與逐日迴圈 (backtest._fsm_loop) 的逐位元比對
+# =========================================================
+import numpy as np
+import pytest
+
+from stock_risk_tool import fsm
+from stock_risk_tool.backtest import _fsm_loop, _fsm_transitions
+
+FEE_BUY = 0.001425
+FEE_SELL = 0.004425
+
+
+def _random_case(rng, n, density=None):
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    density = rng.uniform(0.01, 0.4) if density is None else density
+    buys = rng.random(n) < density
+    sells = rng.random(n) < density
+    cooldown = int(rng.integers(0, 10))
+    return closes, buys, sells, cooldown
+
+
+def _reference(closes, buys, sells, cooldown):
+    """逐日迴圈版的輸出,整理成 run_fsm 的格式"""
+    n = len(closes)
+    reasons = np.array(["R"] * n, dtype=object)
+    equity, pos_hist, trades, _, _ = _fsm_loop(
+        closes, buys, sells, reasons, reasons, FEE_BUY, FEE_SELL, cooldown
+    )
+    entry_idx, exit_idx = _fsm_transitions(pos_hist)
+    return equity, pos_hist, entry_idx, exit_idx, np.asarray(trades, dtype=float)
+
+
+# numba 有另外的測試 (未安裝時略過)
+BASE_ENGINES = [e for e in fsm.ENGINES if e != "numba"]
+
+
+def _assert_engines_equal(closes, buys, sells, cooldown, engines=BASE_ENGINES):
+    expected = _reference(closes, buys, sells, cooldown)
+    for engine in engines:
+        got = fsm.run_fsm(closes, buys, sells, FEE_BUY, FEE_SELL, cooldown, engine=engine)
+        for name, a, b in zip(("equity", "pos_hist", "entry_idx", "exit_idx", "net_ret"),
+                              got, expected):
+            assert np.array_equal(a, b), f"{engine}: {name} 不一致"
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_inputs(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(3, 400))
+    _assert_engines_equal(*_random_case(rng, n))
+
+
+@pytest.mark.parametrize("n", [1, 2])
+def test_short_series(n):
+    rng = np.random.default_rng(n)
+    for _ in range(20):
+        _assert_engines_equal(*_random_case(rng, n, density=0.8))
+
+
+def test_no_signals():
+    rng = np.random.default_rng(0)
+    closes, _, _, cooldown = _random_case(rng, 100)
+    none = np.zeros(100, dtype=bool)
+    _assert_engines_equal(closes, none, none, cooldown)
+    _assert_engines_equal(closes, none, np.ones(100, dtype=bool), cooldown)
+
+
+def test_position_open_at_end():
+    rng = np.random.default_rng(1)
+    closes, buys, sells, _ = _random_case(rng, 120, density=0.1)
+    buys[100] = True
+    sells[100:] = False
+    _assert_engines_equal(closes, buys, sells, 0)
+    pos_hist = fsm.run_fsm(closes, buys, sells, FEE_BUY, FEE_SELL, 0)[1]
+    assert pos_hist[-1] == 1
+
+
+def test_buy_and_sell_same_bar_with_cooldown():
+    rng = np.random.default_rng(2)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 60)))
+    flags = np.ones(60, dtype=bool)
+    for cooldown in (0, 1, 3, 7):
+        _assert_engines_equal(closes, flags, flags, cooldown)
+
+
+def test_numba_matches_loop():
+    pytest.importorskip("numba")
+    rng = np.random.default_rng(123)
+    for n in [1, 2, 3, 50, 300]:
+        for _ in range(20):
+            _assert_engines_equal(*_random_case(rng, n), engines=["numba"])
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 80)))
+    none = np.zeros(80, dtype=bool)
+    _assert_engines_equal(closes, none, none, 5, engines=["numba"])
+
+
+def test_numba_missing_warns(monkeypatch):
+    monkeypatch.setattr(fsm, "_HAS_NUMBA", False)
+    rng = np.random.default_rng(5)
+    closes, buys, sells, cooldown = _random_case(rng, 100)
+    with pytest.warns(RuntimeWarning):
+        got = fsm.run_fsm(closes, buys, sells, FEE_BUY, FEE_SELL, cooldown, engine="numba")
+    expected = fsm.run_fsm(closes, buys, sells, FEE_BUY, FEE_SELL, cooldown, engine="numpy")
+    for a, b in zip(got, expected):
+        assert np.array_equal(a, b)
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        fsm.run_fsm(np.ones(5), np.zeros(5), np.zeros(5), 0, 0, 0, engine="cuda")
@@ -0,0 +1,66 @@
+# =========================================================
+# 預先配置流程 (run_pipeline inplace=True): 寫入預先配置的陣列,不產生新區塊
+# =========================================================
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_risk_tool import config, pipeline
+
+
+def _ohlcv(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.lognormal(10, 0.5, n) * (1 + 3 * (rng.random(n) < 0.03))
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=pd.bdate_range("2020-01-01", periods=n),
+    )
+
+
+def _run_on_allocated(ohlcv, monkeypatch):
+    """執行 inplace 流程,並取得 allocate_frame 配置的陣列"""
+    allocated = []
+    original = pipeline.allocate_frame
+
+    def spy(frame):
+        df = original(frame)
+        allocated.append(df.__dict__["_column_slots"])
+        return df
+
+    monkeypatch.setattr(pipeline, "allocate_frame", spy)
+    df, _ = pipeline.run_pipeline(ohlcv, config.P, inplace=True, compact=False)
+    return df, allocated[0]
+
+
+def test_blocks_and_shared_memory(monkeypatch):
+    df, slots = _run_on_allocated(_ohlcv(800, 0), monkeypatch)
+    n_dtypes = len({np.dtype(dtype) for _, dtype, _ in pipeline.PIPELINE_COLUMNS})
+    assert df._mgr.nblocks == n_dtypes
+    for name, _, _ in pipeline.PIPELINE_COLUMNS:
+        arr, row = slots[name]
+        assert np.shares_memory(df[name].to_numpy(), arr), name
+        assert np.array_equal(df[name].to_numpy(), arr[row], equal_nan=arr.dtype.kind == "f")
+
+
+@pytest.mark.parametrize("backtest", [False, True])
+def test_inplace_matches_copy(backtest):
+    ohlcv = _ohlcv(600, 1)
+    a, _ = pipeline.run_pipeline(ohlcv, config.P, inplace=True, backtest=backtest, compact=False)
+    b, _ = pipeline.run_pipeline(ohlcv, config.P, inplace=False, backtest=backtest, compact=False)
+    for col in b.columns:
+        x, y = a[col].to_numpy(), b[col].to_numpy()
+        if x.dtype.kind == "f":
+            assert np.array_equal(x, y, equal_nan=True), col
+        else:
+            assert np.array_equal(x.astype(object), y.astype(object)), col
+
+
+def test_profile_reports_allocations():
+    prof = pipeline.profile_pipeline(_ohlcv(400, 2), config.P)
+    assert {"allocations", "column_allocations", "n_blocks"} <= set(prof.columns)
+    assert prof.loc["inplace", "n_blocks"] < prof.loc["copy", "n_blocks"]
+    assert prof.loc["inplace", "peak_bytes"] < prof.loc["copy", "peak_bytes"]
@@ -0,0 +1,59 @@
+# =========================================================
+# premature.py: 資料末端觀察期不完整的列不列入統計
+# =========================================================
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_risk_tool.premature import forward_return_matrix, premature_rates
+from stock_risk_tool.signals import detect_sell_before_rise
+
+HORIZONS = (1, 3, 5, 10)
+
+
+def _frame(n, seed, sell_frac=0.2):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    sells = rng.random(n) < sell_frac
+    return pd.DataFrame({
+        "Close": close,
+        "High": close * (1 + rng.uniform(0, 0.03, n)),
+        "Sell_Signal": sells,
+        "Sell_Reason_Raw": np.where(sells, "HARD_STOP", "NONE"),
+        "Buy_Signal": False,
+    })
+
+
+@pytest.mark.parametrize("use_high", [False, True])
+def test_tail_rows_are_nan(use_high):
+    df = _frame(120, 0)
+    n = len(df)
+    rise = forward_return_matrix(df, HORIZONS, use_high)
+    partial = forward_return_matrix(df, HORIZONS, use_high, partial=True)
+    for j, h in enumerate(HORIZONS):
+        _, expected = detect_sell_before_rise(df, h, use_high=use_high)
+        expected = expected.to_numpy()
+        # 完整觀察期的列與 detect_sell_before_rise 相同,最後 h 列為 NaN
+        assert np.array_equal(rise[:n - h, j], expected[:n - h], equal_nan=True)
+        assert np.isnan(rise[n - h:, j]).all()
+        assert np.array_equal(partial[:, j], expected, equal_nan=True)
+
+
+def test_horizon_longer_than_series():
+    df = _frame(4, 1)
+    rise = forward_return_matrix(df, (1, 10))
+    assert np.isnan(rise[:, 1]).all()
+    assert np.isnan(rise[-1, 0]) and not np.isnan(rise[:-1, 0]).any()
+
+
+def test_rates_exclude_truncated_horizons():
+    df = _frame(200, 2)
+    df.loc[df.index[-12:], ["Sell_Signal", "Sell_Reason_Raw"]] = [True, "HARD_STOP"]
+    stats = premature_rates({"A": df}, HORIZONS, thresholds=(0.02,))
+    sell_pos = np.flatnonzero(df["Sell_Signal"].to_numpy())
+    rise = forward_return_matrix(df, HORIZONS)
+    for j, h in enumerate(HORIZONS):
+        row = stats[(stats["reason"] == "ALL") & (stats["horizon"] == h)].iloc[0]
+        full = sell_pos[sell_pos <= len(df) - 1 - h]
+        assert row["sells"] == len(full)
+        assert row["premature"] == int((rise[full, j] >= 0.02).sum())
@@ -0,0 +1,88 @@
+# =========================================================
+# rolling.py 與 pandas rolling 的逐位元比對 (含 NaN 規則)
+# =========================================================
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_risk_tool.rolling import (
+    forward_max, forward_min, multi_forward_max, rolling_max, rolling_min,
+)
+from stock_risk_tool.signals import detect_sell_before_rise
+
+WINDOWS = [1, 2, 5, 20, 240]
+
+
+def _series(seed, n=600, nan_frac=0.05):
+    rng = np.random.default_rng(seed)
+    x = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    x[rng.random(n) < nan_frac] = np.nan
+    return x
+
+
+def _pandas_forward(x, w, min_periods, how):
+    s = pd.Series(x[::-1]).rolling(w, min_periods=min_periods)
+    return getattr(s, how)().to_numpy()[::-1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("w", WINDOWS)
+@pytest.mark.parametrize("min_periods", [None, 1, 3])
+def test_rolling_matches_pandas(seed, w, min_periods):
+    x = _series(seed)
+    if min_periods is not None and min_periods > w:
+        min_periods = w
+    s = pd.Series(x).rolling(w, min_periods=min_periods)
+    assert np.array_equal(rolling_max(x, w, min_periods), s.max().to_numpy(), equal_nan=True)
+    assert np.array_equal(rolling_min(x, w, min_periods), s.min().to_numpy(), equal_nan=True)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("w", WINDOWS)
+@pytest.mark.parametrize("min_periods", [1, 3])
+def test_forward_matches_pandas(seed, w, min_periods):
+    x = _series(seed)
+    min_periods = min(min_periods, w)
+    assert np.array_equal(forward_max(x, w, min_periods),
+                          _pandas_forward(x, w, min_periods, "max"), equal_nan=True)
+    assert np.array_equal(forward_min(x, w, min_periods),
+                          _pandas_forward(x, w, min_periods, "min"), equal_nan=True)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_multi_forward_max_matches_single(seed):
+    x = _series(seed)
+    out = multi_forward_max(x, WINDOWS)
+    assert out.shape == (len(x), len(WINDOWS))
+    for j, w in enumerate(WINDOWS):
+        assert np.array_equal(out[:, j], _pandas_forward(x, w, 1, "max"), equal_nan=True)
+        assert np.array_equal(out[:, j], forward_max(x, w), equal_nan=True)
+
+
+def test_all_nan_and_short_input():
+    x = np.full(10, np.nan)
+    for w in (1, 3, 20):
+        expected = pd.Series(x).rolling(w, min_periods=1).max().to_numpy()
+        assert np.array_equal(rolling_max(x, w, 1), expected, equal_nan=True)
+        assert np.array_equal(forward_max(x, w), expected, equal_nan=True)
+    short = np.array([3.0, np.nan, 1.0])
+    s = pd.Series(short).rolling(20, min_periods=1)
+    assert np.array_equal(rolling_max(short, 20, 1), s.max().to_numpy(), equal_nan=True)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("use_high", [False, True])
+def test_detect_sell_before_rise_list_mode(seed, use_high):
+    rng = np.random.default_rng(seed)
+    close = _series(seed, n=400)
+    df = pd.DataFrame({
+        "Close": close,
+        "High": close * (1 + rng.uniform(0, 0.03, len(close))),
+        "Sell_Signal": rng.random(len(close)) < 0.2,
+    })
+    lookaheads = [1, 3, 5, 10]
+    flags, rise = detect_sell_before_rise(df, lookaheads, 0.02, use_high=use_high)
+    for la in lookaheads:
+        flag_1, rise_1 = detect_sell_before_rise(df, la, 0.02, use_high=use_high)
+        assert np.array_equal(rise[la].to_numpy(), rise_1.to_numpy(), equal_nan=True)
+        assert np.array_equal(flags[la].to_numpy(), flag_1.to_numpy())
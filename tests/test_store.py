@@ -0,0 +1,91 @@
+# =========================================================
+# PriceStore 的區間紀錄: 沒有資料的區間不重複下載,下載失敗的區間下次重試
+# =========================================================
+import pandas as pd
+import pytest
+
+from stock_risk_tool.store import FetchError, PriceProvider, PriceStore
+
+
+def _bars(start, end):
+    idx = pd.bdate_range(start, end)
+    return pd.DataFrame(
+        {"Open": 10.0, "High": 11.0, "Low": 9.0, "Close": 10.5, "Volume": 1000.0},
+        index=idx,
+    )
+
+
+class CountingProvider(PriceProvider):
+    """記錄呼叫次數;listed 之前沒有資料,down=True 時模擬斷線"""
+
+    def __init__(self, listed=None):
+        self.calls = []
+        self.listed = pd.Timestamp(listed) if listed else None
+        self.down = False
+        self.failed = ()
+
+    def fetch(self, tickers, start, end):
+        self.calls.append((tuple(tickers), start, end))
+        if self.down:
+            raise ConnectionError("timeout")
+        out = {}
+        for t in tickers:
+            lo = max(pd.Timestamp(start), self.listed) if self.listed else pd.Timestamp(start)
+            df = _bars(lo, end)
+            if not df.empty:
+                out[t] = df
+        if self.failed:
+            raise FetchError("partial", failed=self.failed,
+                             data={t: df for t, df in out.items() if t not in self.failed})
+        return out
+
+
+def test_empty_range_is_recorded(tmp_path):
+    # 上市日之前的區間沒有任何 K 棒,下載成功後不應再重複下載
+    provider = CountingProvider(listed="2030-01-01")
+    store = PriceStore(str(tmp_path), provider)
+    assert store.load("2330.TW", "2020-01-02", "2020-06-30") is None
+    assert store.load("2330.TW", "2020-01-02", "2020-06-30") is None
+    assert len(provider.calls) == 1
+    assert store.coverage("2330.TW") == (pd.Timestamp("2020-01-02"), pd.Timestamp("2020-06-30"))
+
+
+def test_holiday_only_range_is_recorded(tmp_path):
+    provider = CountingProvider()
+    store = PriceStore(str(tmp_path), provider)
+    # 2022-01-01 / 01-02 為週末
+    assert store.load("2330.TW", "2022-01-01", "2022-01-02") is None
+    store.load("2330.TW", "2022-01-01", "2022-01-02")
+    assert len(provider.calls) == 1
+
+
+def test_provider_error_is_retried(tmp_path):
+    provider = CountingProvider()
+    provider.down = True
+    store = PriceStore(str(tmp_path), provider)
+    with pytest.raises(ConnectionError):
+        store.load("2330.TW", "2020-01-02", "2021-06-30")
+    assert store.coverage("2330.TW") is None
+
+    provider.down = False
+    df = store.load("2330.TW", "2020-01-02", "2021-06-30")
+    assert df is not None and len(df) == len(_bars("2020-01-02", "2021-06-30"))
+    assert len(provider.calls) == 2
+    store.load("2330.TW", "2020-01-02", "2021-06-30")
+    assert len(provider.calls) == 2
+
+
+def test_partial_failure(tmp_path):
+    provider = CountingProvider()
+    provider.failed = ("2303.TW",)
+    store = PriceStore(str(tmp_path), provider)
+    out = store.load_many(["2330.TW", "2303.TW"], "2021-01-04", "2021-03-31")
+    assert list(out) == ["2330.TW"]
+    assert list(store.failed) == ["2303.TW"]
+    assert store.coverage("2303.TW") is None
+
+    provider.failed = ()
+    out = store.load_many(["2330.TW", "2303.TW"], "2021-01-04", "2021-03-31")
+    assert sorted(out) == ["2303.TW", "2330.TW"]
+    assert provider.calls[-1][0] == ("2303.TW",)
+    assert store.failed == {}
@@ -0,0 +1,57 @@
+# =========================================================
+# StreamingIndicators 與 add_indicators 的逐欄比對
+# =========================================================
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_risk_tool import config
+from stock_risk_tool.indicators import add_indicators
+from stock_risk_tool.streaming import INDICATOR_COLS, StreamingIndicators
+
+
+def _ohlcv(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.lognormal(10, 0.5, n) * (1 + 3 * (rng.random(n) < 0.03))
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=pd.bdate_range("2021-01-01", periods=n),
+    )
+
+
+def _assert_columns_equal(got, expected):
+    for col in INDICATOR_COLS:
+        a = got[col].to_numpy(dtype=float)
+        b = expected[col].to_numpy(dtype=float)
+        assert np.array_equal(a, b, equal_nan=True), f"{col} 不一致"
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_seed_matches_add_indicators(seed):
+    df = _ohlcv(600, seed)
+    got = StreamingIndicators(config.P).seed(df)
+    _assert_columns_equal(got, add_indicators(df, config.P))
+
+
+def test_update_frame_matches_batch():
+    df = _ohlcv(600, 7)
+    stream = StreamingIndicators(config.P)
+    head = stream.seed(df.iloc[:450])
+    # 重疊的日期會被略過
+    tail = stream.update_frame(df.iloc[400:])
+    _assert_columns_equal(pd.concat([head, tail]), add_indicators(df, config.P))
+
+
+def test_nan_and_gap():
+    df = _ohlcv(600, 3)
+    # 停牌缺資料 (NaN 列) 與日期跳空
+    df.iloc[100:103] = np.nan
+    df.iloc[300, df.columns.get_loc("Volume")] = np.nan
+    df.iloc[420, df.columns.get_loc("High")] = np.nan
+    df = df.drop(df.index[200:230])
+    got = StreamingIndicators(config.P).seed(df)
+    _assert_columns_equal(got, add_indicators(df, config.P))